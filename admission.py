@@ -0,0 +1,205 @@
+import asyncio
+import math
+import threading
+import time
+import logging
+from collections import deque
+
+from metrics import LLM_QUEUE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Model calls allowed to run at the same time
+MAX_CONCURRENT = 4
+
+# Requests allowed to wait for a slot; more than this are rejected straight away
+MAX_QUEUE = 16
+
+# Seconds a request may wait for a slot before it is rejected
+QUEUE_TIMEOUT = 10.0
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request cannot be admitted; retry_after is a hint in whole seconds"""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Ticket:
+    """A granted slot; release it exactly once when the model call is finished"""
+
+    def __init__(self, controller):
+        self.controller = controller
+        self.acquired_at = time.perf_counter()
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.controller._release(time.perf_counter() - self.acquired_at)
+
+
+class AdmissionStats:
+    """Counters shared by the threaded and asyncio controllers"""
+
+    def __init__(self, max_concurrent, max_queue, queue_timeout):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.admitted = 0
+        self.rejected_full = 0
+        self.rejected_timeout = 0
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+        # Smoothed time a slot is held, used to estimate Retry-After
+        self.service_time = 1.0
+
+    def retry_after(self, waiting):
+        """Estimate how long until a new request would be served"""
+        rounds = (waiting + 1) / self.max_concurrent
+        return max(1, math.ceil(rounds * self.service_time))
+
+    def rejection(self, reason, waiting):
+        """Log a shed request and return the AdmissionRejected to raise for it"""
+        retry_after = self.retry_after(waiting)
+        logger.warning("Shed model request (%s): %d active, %d waiting, retry after %ds",
+                       reason, self.active, waiting, retry_after)
+        return AdmissionRejected(reason, retry_after)
+
+    def record_wait(self, waited):
+        LLM_QUEUE_SECONDS.observe(waited)
+        self.admitted += 1
+        self.queue_wait_total += waited
+        self.queue_wait_max = max(self.queue_wait_max, waited)
+
+    def record_release(self, held):
+        self.active -= 1
+        self.service_time = 0.8 * self.service_time + 0.2 * held
+
+    def snapshot(self, waiting):
+        return {
+            'active': self.active,
+            'waiting': waiting,
+            'max_concurrent': self.max_concurrent,
+            'max_queue': self.max_queue,
+            'admitted': self.admitted,
+            'rejected_full': self.rejected_full,
+            'rejected_timeout': self.rejected_timeout,
+            'queue_wait_avg_ms': round(self.queue_wait_total / self.admitted * 1000, 1) if self.admitted else 0.0,
+            'queue_wait_max_ms': round(self.queue_wait_max * 1000, 1),
+            'service_time_ms': round(self.service_time * 1000, 1),
+        }
+
+
+class AdmissionController:
+    """Bounded concurrency towards the model with a bounded, deadline-limited wait queue"""
+
+    def __init__(self, max_concurrent=MAX_CONCURRENT, max_queue=MAX_QUEUE, queue_timeout=QUEUE_TIMEOUT):
+        self.counters = AdmissionStats(max_concurrent, max_queue, queue_timeout)
+        self.lock = threading.Lock()
+        # Waiters are events; the priority lane is always served first
+        self.priority_lane = deque()
+        self.normal_lane = deque()
+
+    def acquire(self, priority=False):
+        """Wait for a slot and return a Ticket, or raise AdmissionRejected"""
+        counters = self.counters
+        start = time.perf_counter()
+        with self.lock:
+            waiting = len(self.priority_lane) + len(self.normal_lane)
+            if counters.active < counters.max_concurrent and waiting == 0:
+                counters.active += 1
+                counters.record_wait(0.0)
+                return Ticket(self)
+            if waiting >= counters.max_queue:
+                counters.rejected_full += 1
+                raise counters.rejection("queue full", waiting)
+            granted = threading.Event()
+            lane = self.priority_lane if priority else self.normal_lane
+            lane.append(granted)
+
+        if not granted.wait(counters.queue_timeout):
+            with self.lock:
+                # The slot may have been handed over just as the deadline passed
+                if not granted.is_set():
+                    lane.remove(granted)
+                    counters.rejected_timeout += 1
+                    waiting = len(self.priority_lane) + len(self.normal_lane)
+                    raise counters.rejection("queue timeout", waiting)
+
+        with self.lock:
+            counters.record_wait(time.perf_counter() - start)
+        return Ticket(self)
+
+    def stats(self):
+        """Return active, waiting, wait-time and rejection counters"""
+        with self.lock:
+            return self.counters.snapshot(len(self.priority_lane) + len(self.normal_lane))
+
+    def _release(self, held):
+        with self.lock:
+            self.counters.record_release(held)
+            # Hand the slot straight to the next waiter so nobody can jump the queue
+            lane = self.priority_lane or self.normal_lane
+            if lane:
+                self.counters.active += 1
+                lane.popleft().set()
+
+
+class AsyncAdmissionController:
+    """asyncio counterpart of AdmissionController for the ASGI app"""
+
+    def __init__(self, max_concurrent=MAX_CONCURRENT, max_queue=MAX_QUEUE, queue_timeout=QUEUE_TIMEOUT):
+        self.counters = AdmissionStats(max_concurrent, max_queue, queue_timeout)
+        self.priority_lane = deque()
+        self.normal_lane = deque()
+
+    async def acquire(self, priority=False):
+        """Wait for a slot and return a Ticket, or raise AdmissionRejected"""
+        counters = self.counters
+        start = time.perf_counter()
+        waiting = len(self.priority_lane) + len(self.normal_lane)
+        if counters.active < counters.max_concurrent and waiting == 0:
+            counters.active += 1
+            counters.record_wait(0.0)
+            return Ticket(self)
+        if waiting >= counters.max_queue:
+            counters.rejected_full += 1
+            raise counters.rejection("queue full", waiting)
+
+        granted = asyncio.get_running_loop().create_future()
+        lane = self.priority_lane if priority else self.normal_lane
+        lane.append(granted)
+        try:
+            await asyncio.wait_for(asyncio.shield(granted), counters.queue_timeout)
+        except asyncio.TimeoutError:
+            if not granted.done():
+                lane.remove(granted)
+                counters.rejected_timeout += 1
+                waiting = len(self.priority_lane) + len(self.normal_lane)
+                raise counters.rejection("queue timeout", waiting)
+        except asyncio.CancelledError:
+            # The client went away; give back a slot that was already handed over
+            if granted.done():
+                Ticket(self).release()
+            else:
+                lane.remove(granted)
+            raise
+
+        counters.record_wait(time.perf_counter() - start)
+        return Ticket(self)
+
+    def stats(self):
+        """Return active, waiting, wait-time and rejection counters"""
+        return self.counters.snapshot(len(self.priority_lane) + len(self.normal_lane))
+
+    def _release(self, held):
+        self.counters.record_release(held)
+        lane = self.priority_lane or self.normal_lane
+        if lane:
+            self.counters.active += 1
+            lane.popleft().set_result(True)
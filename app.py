@@ -1,84 +1,506 @@
-from flask import Flask, render_template, request, jsonify
-import speech_recognition as sr
-import pyttsx3
-import ollama
-import threading
+from flask import Flask, Request, render_template, request, jsonify, Response, stream_with_context, url_for, send_file, send_from_directory, abort, make_response
+from werkzeug.exceptions import RequestEntityTooLarge
 import os
+import io
+import re
+import json
+import time
+import uuid
 import logging
-
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+import threading
+import contextvars
+from datetime import datetime
+from urllib.parse import quote
+import click
+from speech_pipeline import SentencePipeline
+from tts import TTSWorker, PRIORITY_NORMAL
+from intents import IntentRouter
+from memory import ConversationMemory
+from singleflight import SingleFlight, request_key
+from admission import AdmissionController, AdmissionRejected
+from voice_turn import VoiceTurn, server_timing
+from model_warmup import ModelWarmer, KEEP_ALIVE, parse_keep_alive, full_model_name
+from ollama_pool import OllamaPool
+from assets import StaticAssets, build_assets, write_if_changed
+from transcripts import TranscriptStore, TRANSCRIPTS_DB
+from logs import configure_logging, start_background_logging, use_request_id, request_id
+from metrics import (REGISTRY, Gauge, STT_SECONDS, STT_FAILURES, LLM_FIRST_TOKEN_SECONDS, LLM_TOTAL_SECONDS, LLM_ERRORS,
+                     RESPONSES)
+
+# WebSocket support for streaming speech-to-text is optional
+try:
+    from flask_sock import Sock
+except ImportError:
+    Sock = None
+
+# Logging: level, json (one object per line) or text, and the longest message written
+LOG_LEVEL = os.environ.get("LISA_LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("LISA_LOG_FORMAT", "json")
+LOG_MAX_CHARS = int(os.environ.get("LISA_LOG_MAX_CHARS", "2000"))
+
+# Configure logging; once the server is up, records are formatted and written on a background thread
+configure_logging(level=LOG_LEVEL, json_format=LOG_FORMAT == "json", max_chars=LOG_MAX_CHARS)
 logger = logging.getLogger(__name__)
 
+# Speech recognition engine: google (network), sphinx or vosk (offline)
+STT_BACKEND = os.environ.get("LISA_STT_BACKEND", "google")
+
+# Recognition worker processes; "auto" uses one per core for the CPU-bound offline engines
+STT_WORKERS = os.environ.get("LISA_STT_WORKERS", "auto")
+if STT_WORKERS == "auto":
+    STT_WORKERS = 0 if STT_BACKEND == "google" else (os.cpu_count() or 1)
+STT_WORKERS = int(STT_WORKERS)
+STT_JOB_TIMEOUT = float(os.environ.get("LISA_STT_JOB_TIMEOUT", "30"))
+
+# Trim silence and split long recordings before recognition
+VAD_ENABLED = os.environ.get("LISA_VAD", "1") == "1"
+
+# Seconds a streaming speech-to-text socket may stay silent before it is finalized
+STT_STREAM_IDLE_TIMEOUT = float(os.environ.get("LISA_STT_STREAM_IDLE_TIMEOUT", "10"))
+
+# Largest request body accepted, which bounds the size of audio uploads
+MAX_UPLOAD_BYTES = int(os.environ.get("LISA_MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+
+class InMemoryRequest(Request):
+    """Request that parses file uploads into memory instead of spooling them to temp files"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        # MAX_CONTENT_LENGTH caps the body, so the buffer is bounded too
+        return io.BytesIO()
+
 # Initialize Flask app
 app = Flask(__name__)
-app.config['TEMPLATES_AUTO_RELOAD'] = True
-
-# Initialize the text-to-speech engine
-engine = pyttsx3.init()
-engine.setProperty("rate", 170)
-
-# Try to configure a female voice
-voices = engine.getProperty('voices')
-selected_voice = None
-
-for voice in voices:
-    if "samantha" in voice.name.lower():
-        selected_voice = voice
-        break
-
-if not selected_voice:
-    # Default to the first female voice if Samantha isn't found
-    for voice in voices:
-        if "female" in voice.name.lower() or "zira" in voice.name.lower():
-            selected_voice = voice
-            break
-
-if selected_voice:
-    engine.setProperty('voice', selected_voice.id)
-    logger.info(f"Using voice: {selected_voice.name}")
-else:
-    logger.info("No female voice found, using default voice.")
+app.request_class = InMemoryRequest
+# Templates are re-read on every render only in debug mode; otherwise they are compiled once
+app.config['TEMPLATES_AUTO_RELOAD'] = None
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES
+
+# Ollama model used for chat responses
+OLLAMA_MODEL = "llama3.2"
+
+# How long Ollama keeps the model in memory after each request ("30m", or -1 for forever)
+OLLAMA_KEEP_ALIVE = parse_keep_alive(os.environ.get("LISA_OLLAMA_KEEP_ALIVE", KEEP_ALIVE))
+
+# Ollama servers to spread model calls over, comma-separated; defaults to OLLAMA_HOST or the local server
+OLLAMA_HOSTS = [host.strip() for host in os.environ.get("LISA_OLLAMA_HOSTS", os.environ.get("OLLAMA_HOST", "")).split(',')
+                if host.strip()] or ["http://127.0.0.1:11434"]
+OLLAMA_RETRIES = int(os.environ.get("LISA_OLLAMA_RETRIES", "2"))
+OLLAMA_CONNECT_TIMEOUT = float(os.environ.get("LISA_OLLAMA_CONNECT_TIMEOUT", "2"))
+OLLAMA_READ_TIMEOUT = float(os.environ.get("LISA_OLLAMA_READ_TIMEOUT", "120"))
+OLLAMA_HEALTH_INTERVAL = float(os.environ.get("LISA_OLLAMA_HEALTH_INTERVAL", "10"))
+
+# Seconds between checks that the model is still loaded
+MODEL_CHECK_INTERVAL = float(os.environ.get("LISA_MODEL_CHECK_INTERVAL", "30"))
+
+# Optional semantic cache of answers to near-duplicate questions
+SEMANTIC_CACHE_ENABLED = os.environ.get("LISA_SEMANTIC_CACHE", "0") == "1"
+SEMANTIC_CACHE_THRESHOLD = float(os.environ.get("LISA_SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_TTL = int(os.environ.get("LISA_SEMANTIC_CACHE_TTL", "3600"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.environ.get("LISA_SEMANTIC_CACHE_MAX_ENTRIES", "1024"))
+EMBEDDING_MODEL = os.environ.get("LISA_EMBEDDING_MODEL", "nomic-embed-text")
+
+# Conversation memory limits
+SESSION_COOKIE = "lisa_session"
+MEMORY_TOKEN_BUDGET = int(os.environ.get("LISA_MEMORY_TOKEN_BUDGET", "1024"))
+MEMORY_MAX_SESSIONS = int(os.environ.get("LISA_MEMORY_MAX_SESSIONS", "1000"))
+MEMORY_IDLE_TIMEOUT = int(os.environ.get("LISA_MEMORY_IDLE_TIMEOUT", "1800"))
+
+# Conversation transcripts kept for analytics and replay; an empty LISA_TRANSCRIPTS_DB turns them off
+TRANSCRIPTS_PATH = os.environ.get("LISA_TRANSCRIPTS_DB", TRANSCRIPTS_DB)
+TRANSCRIPTS_BATCH_SIZE = int(os.environ.get("LISA_TRANSCRIPTS_BATCH_SIZE", "256"))
+TRANSCRIPTS_FLUSH_INTERVAL = float(os.environ.get("LISA_TRANSCRIPTS_FLUSH_INTERVAL", "1"))
+TRANSCRIPTS_MAX_PENDING = int(os.environ.get("LISA_TRANSCRIPTS_MAX_PENDING", "10000"))
+
+# Admission control towards the Ollama backend
+LLM_MAX_CONCURRENT = int(os.environ.get("LISA_LLM_MAX_CONCURRENT", "4"))
+LLM_MAX_QUEUE = int(os.environ.get("LISA_LLM_MAX_QUEUE", "16"))
+LLM_QUEUE_TIMEOUT = float(os.environ.get("LISA_LLM_QUEUE_TIMEOUT", "10"))
+# Prompts up to this many characters use the priority lane
+SHORT_PROMPT_CHARS = int(os.environ.get("LISA_SHORT_PROMPT_CHARS", "80"))
+
+# Fallback reply when the AI backend cannot be reached
+BACKEND_ERROR_RESPONSE = "I am having trouble connecting to my AI backend. Please try again later."
+
+# Greeting shown when the page loads
+GREETING = "Hi, I am Lisa. How can I help you?"
+
+# Canned answers that skip the model
+INTENTS_FILE = os.environ.get("LISA_INTENTS_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), 'intents.json'))
+intent_router = IntentRouter.from_file(INTENTS_FILE)
+
+# Phrases synthesized into the audio cache at startup
+PREWARM_PHRASES = [GREETING, BACKEND_ERROR_RESPONSE] + intent_router.static_responses()
+
+# The text-to-speech worker owns the pyttsx3 engine; it starts on first use or in warm_up()
+tts_worker = TTSWorker()
 
 # Function to speak text using pyttsx3
-def speak_text(text):
-    """Speak the provided text using the configured TTS engine"""
+def speak_text(text, priority=PRIORITY_NORMAL):
+    """Queue the provided text on the TTS worker"""
+    return tts_worker.say(text, priority)
+
+# Function to build a response payload for a complete answer
+def speech_payload(text):
+    """Point the browser at cached audio for text, or speak it on the server if there is none"""
+    key = tts_worker.cached_audio(text)
+    if key is not None:
+        return {'response': text, 'audio_url': url_for('cached_audio', key=key)}
+    speak_text(text)
+    return {'response': text}
+
+# Function to embed a prompt with the local embedding model
+def embed_prompt(text):
+    """Return the embedding vector for text"""
+    return ollama_pool.call(lambda client: client.embeddings(model=EMBEDDING_MODEL, prompt=text,
+                                                             keep_alive=OLLAMA_KEEP_ALIVE))['embedding']
+
+if SEMANTIC_CACHE_ENABLED:
+    from semantic_cache import SemanticCache
+    semantic_cache = SemanticCache(embed_prompt, threshold=SEMANTIC_CACHE_THRESHOLD,
+                                   ttl=SEMANTIC_CACHE_TTL, max_entries=SEMANTIC_CACHE_MAX_ENTRIES)
+else:
+    semantic_cache = None
+
+# Function to look up a previous answer to a similar question
+def lookup_cached_response(user_input):
+    """Return (cached answer or None, prompt vector or None)"""
+    if semantic_cache is None:
+        return None, None
     try:
-        engine.say(text)
-        engine.runAndWait()
-        return True
+        return semantic_cache.lookup(user_input)
     except Exception as e:
-        logger.error(f"Error in speak_text: {e}")
-        return False
-
-# Function to get AI response using Ollama
-def get_ai_response(user_input):
-    """Get AI response using Ollama or fallback responses"""
-    if "your name" in user_input.lower():
-        return "My name is Lisa."
-    elif "who developed you" in user_input.lower():
-        return "I was developed by Robo Miracle."
+        logger.error("Error in semantic cache lookup: %s", e)
+        return None, None
+
+# Function to remember an answer for similar questions
+def store_cached_response(vector, response):
+    """Add a model answer to the semantic cache"""
+    if semantic_cache is not None and vector is not None and response:
+        semantic_cache.store(vector, response)
+
+# Function to fold older turns into the rolling conversation summary
+def summarize_conversation(summary, turns):
+    """Return an updated summary that covers the previous summary and the given turns"""
+    transcript = "\n".join(f"User: {user_text}\nLisa: {assistant_text}" for user_text, assistant_text in turns)
+    prompt = ("Update the summary of this conversation in at most three sentences. "
+              "Keep names, facts and open questions.\n\n"
+              f"Current summary: {summary or 'none'}\n\nNew turns:\n{transcript}")
+    response = ollama_pool.call(lambda client: client.chat(model=OLLAMA_MODEL, messages=[{"role": "user", "content": prompt}],
+                                                           keep_alive=OLLAMA_KEEP_ALIVE))
+    return response['message']['content'].strip()
+
+conversation_memory = ConversationMemory(summarize_conversation, token_budget=MEMORY_TOKEN_BUDGET,
+                                         max_sessions=MEMORY_MAX_SESSIONS, idle_timeout=MEMORY_IDLE_TIMEOUT)
+
+# Turns are buffered and written to SQLite in batches by a background thread started on first use
+if TRANSCRIPTS_PATH:
+    transcript_store = TranscriptStore(TRANSCRIPTS_PATH, batch_size=TRANSCRIPTS_BATCH_SIZE,
+                                       flush_interval=TRANSCRIPTS_FLUSH_INTERVAL, max_pending=TRANSCRIPTS_MAX_PENDING)
+else:
+    transcript_store = None
+
+# Function to keep a finished exchange
+def record_turn(session_id, user_input, response, source):
+    """Add a turn to conversation memory and the transcript store, and count where the answer came from"""
+    conversation_memory.add_turn(session_id, user_input, response)
+    if transcript_store is not None:
+        transcript_store.record(session_id, user_input, response, source, request_id.get())
+    RESPONSES.labels(source).inc()
+
+# Function to read a point in time from a query string or the command line
+def parse_timestamp(value):
+    """Return Unix seconds for a number or an ISO 8601 date/time (local time unless it has an offset), or None"""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+# Function to read the caller's session id
+def current_session_id():
+    """Return the session id issued by the main page, or None"""
+    return request.cookies.get(SESSION_COOKIE)
+
+# Identical concurrent prompts share one upstream generation
+llm_flights = SingleFlight()
+
+# Limits how many requests may be waiting on the model at once
+llm_admission = AdmissionController(LLM_MAX_CONCURRENT, LLM_MAX_QUEUE, LLM_QUEUE_TIMEOUT)
+
+# Function to build the response for a request that could not be admitted
+def busy_response(rejection):
+    """Return a 429 telling the client when to retry"""
+    response = jsonify({'error': 'Lisa is busy right now. Please try again shortly.',
+                        'retry_after': rejection.retry_after})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(rejection.retry_after)
+    return response
+
+# Model calls go to the least busy healthy host; clients and their connection pools are created on first use
+ollama_pool = OllamaPool(OLLAMA_HOSTS, retries=OLLAMA_RETRIES, health_interval=OLLAMA_HEALTH_INTERVAL,
+                         connect_timeout=OLLAMA_CONNECT_TIMEOUT, read_timeout=OLLAMA_READ_TIMEOUT,
+                         keepalive_connections=LLM_MAX_CONCURRENT * 2)
+
+# Function to load the chat model on every host with a one-token generation
+def warm_model():
+    ollama_pool.broadcast(lambda client: client.generate(model=OLLAMA_MODEL, prompt="Hello", options={'num_predict': 1},
+                                                         keep_alive=OLLAMA_KEEP_ALIVE))
+
+# Function to check whether any Ollama host still has the chat model in memory
+def model_is_loaded():
+    return any(full_model_name(loaded.model) == full_model_name(OLLAMA_MODEL)
+               for running in ollama_pool.broadcast(lambda client: client.ps()) for loaded in running.models)
+
+# Tracks whether the model is warm; the readiness probe reports it
+model_warmer = ModelWarmer(warm_model, model_is_loaded, check_interval=MODEL_CHECK_INTERVAL)
+
+# Values read when /metrics is scraped
+Gauge('lisa_model_ready', "1 while the chat model is loaded", lambda: model_warmer.ready.is_set())
+Gauge('lisa_tts_queue_depth', "Utterances waiting for the text-to-speech engine", lambda: len(tts_worker.queue))
+Gauge('lisa_transcript_queue_depth', "Conversation turns waiting to be written",
+      lambda: len(transcript_store.pending) if transcript_store is not None else 0)
+
+# Function to answer the questions Lisa knows without asking the model
+def get_canned_response(user_input):
+    """Return a fixed answer for known questions, or None"""
+    return intent_router.respond(user_input)
+
+# Function to stream AI response tokens using Ollama
+def stream_ai_response(user_input, session_id=None):
+    """Return an iterator over the AI response in pieces as Ollama generates them.
+
+    A request that starts a new generation waits here for an admission slot and
+    raises AdmissionRejected, before anything is sent, if it gets none.
+    """
+    canned = get_canned_response(user_input)
+    if canned is not None:
+        record_turn(session_id, user_input, canned, 'intent')
+        return iter([canned])
+
+    vector = None
+    if not conversation_memory.has_history(session_id):
+        cached, vector = lookup_cached_response(user_input)
+        if cached is not None:
+            record_turn(session_id, user_input, cached, 'cache')
+            return iter([cached])
+
+    messages = conversation_memory.build_messages(session_id, user_input)
+    # Summing the prompt is skipped entirely when INFO is off
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("Prompt size: %d messages, ~%d tokens", len(messages), sum(len(m['content']) for m in messages) // 4)
+
+    def generate():
+        # A host that fails before answering is retried on another one
+        for chunk in ollama_pool.stream(lambda client: client.chat(model=OLLAMA_MODEL, messages=messages, stream=True,
+                                                                   keep_alive=OLLAMA_KEEP_ALIVE)):
+            content = chunk.get('message', {}).get('content', '')
+            if content:
+                yield content
+
+    start = time.perf_counter()
+    # Concurrent identical requests all read the token stream of one generation, which holds the only slot
+    tokens, leader = llm_flights.stream(request_key(OLLAMA_MODEL, messages), generate,
+                                        admit=lambda: llm_admission.acquire(priority=len(user_input) <= SHORT_PROMPT_CHARS))
+    if not leader:
+        logger.info("Joined an identical in-flight generation")
+
+    def relay():
+        first_token = True
+        parts = []
+        try:
+            for content in tokens:
+                if first_token:
+                    first_token = False
+                    LLM_FIRST_TOKEN_SECONDS.observe(time.perf_counter() - start)
+                    logger.info("Time to first token: %.0f ms", (time.perf_counter() - start) * 1000)
+                parts.append(content)
+                yield content
+            LLM_TOTAL_SECONDS.observe(time.perf_counter() - start)
+            logger.info("Ollama stream finished in %.0f ms", (time.perf_counter() - start) * 1000)
+            response = ''.join(parts)
+            if leader:
+                # Formatted on the log thread, and only when debug logging is on
+                logger.debug("Ollama response: %s", response)
+                store_cached_response(vector, response)
+            record_turn(session_id, user_input, response, 'model')
+        except Exception as e:
+            logger.error("Error in AI response stream: %s", e)
+            LLM_ERRORS.inc()
+            # Only fall back if nothing has been sent yet, otherwise keep the partial answer
+            if first_token:
+                yield BACKEND_ERROR_RESPONSE
+
+    return relay()
+
+# Speech recognition is set up on first use or in warm_up(), since loading a model is slow
+stt_backend = None
+stt_pool = None
+silence_trimmer = None
+stt_lock = threading.Lock()
+
+# Function to set up speech recognition
+def init_speech_recognition():
+    """Load the recognition model, either here or in each worker process, the first time it is needed"""
+    global stt_backend, stt_pool, silence_trimmer
+    with stt_lock:
+        if stt_backend is not None or stt_pool is not None:
+            return
+        if VAD_ENABLED:
+            from vad import SilenceTrimmer
+            silence_trimmer = SilenceTrimmer()
+        if STT_WORKERS > 0:
+            from stt_pool import RecognitionPool
+            stt_pool = RecognitionPool(STT_BACKEND, STT_WORKERS, job_timeout=STT_JOB_TIMEOUT)
+        else:
+            from recognizers import load_backend
+            stt_backend = load_backend(STT_BACKEND)
+
+# Function to recognize one stretch of audio with the pool or the in-process backend
+def recognize_audio(audio_data):
+    init_speech_recognition()
+    start = time.perf_counter()
+    try:
+        if stt_pool is not None:
+            return stt_pool.recognize(audio_data)
+        return stt_backend.recognize(audio_data)
+    finally:
+        STT_SECONDS.labels('recognize').observe(time.perf_counter() - start)
+
+# Function to transcribe recorded speech
+def transcribe_audio(audio_file):
+    """Return the text spoken in an audio file path or file-like object"""
+    import speech_recognition as sr
+    from recognizers import read_audio
+    init_speech_recognition()
+    start = time.perf_counter()
+    audio_data = read_audio(audio_file)
+    STT_SECONDS.labels('decode').observe(time.perf_counter() - start)
+    if silence_trimmer is None:
+        return recognize_audio(audio_data)
+
+    # Only the voiced parts are sent to the recognizer; all-silence uploads stop here
+    start = time.perf_counter()
+    segments = silence_trimmer.split(audio_data)
+    STT_SECONDS.labels('vad').observe(time.perf_counter() - start)
+    texts = []
+    for segment in segments:
+        try:
+            texts.append(recognize_audio(segment))
+        except sr.UnknownValueError:
+            continue
+    if not texts:
+        raise sr.UnknownValueError()
+    return " ".join(texts)
+
+# Streaming decodes in this process, so with a worker pool the model is loaded here on first use
+stt_stream_backend = None
+stt_stream_lock = threading.Lock()
+
+# Function to get the backend used by streaming speech-to-text
+def streaming_backend():
+    """Return the in-process recognizer, loading it the first time it is needed"""
+    global stt_stream_backend
+    init_speech_recognition()
+    with stt_stream_lock:
+        if stt_stream_backend is None:
+            from recognizers import load_backend
+            stt_stream_backend = stt_backend or load_backend(STT_BACKEND)
+    return stt_stream_backend
+
+# Function to report speech recognition metrics
+def speech_recognition_stats():
+    """Return pool or backend metrics plus silence trimming savings"""
+    if stt_pool is not None:
+        stats = stt_pool.stats()
+    elif stt_backend is not None:
+        stats = stt_backend.stats()
     else:
+        return {'backend': STT_BACKEND, 'loaded': False}
+    if silence_trimmer is not None:
+        stats['vad'] = silence_trimmer.stats()
+    return stats
+
+# Set once warm_up() has run; the first request runs it under servers that never call it
+warmed_up = False
+warm_up_lock = threading.Lock()
+
+# Function to load engines and caches ahead of the first request
+def warm_up():
+    """Load the chat model, start the TTS worker and load the speech recognizer in the background; runs once"""
+    global warmed_up
+    with warm_up_lock:
+        if warmed_up:
+            return
+        warmed_up = True
+    start_background_logging()
+    ollama_pool.start()
+    model_warmer.start()
+    tts_worker.start()
+    tts_worker.prewarm(PREWARM_PHRASES)
+
+    def load():
         try:
-            # Use the correct model name 'llama3.2'
-            response = ollama.chat(model="llama3.2", messages=[{"role": "user", "content": user_input}])
-            logger.info(f"Ollama Response: {response}")
-
-            # Handle the response format
-            if 'message' in response:
-                return response['message']['content']
-            elif 'content' in response:
-                return response['content']
-            else:
-                return "Received unexpected response format from Ollama."
+            import ollama
+            init_speech_recognition()
+            # Load a recognition model into every worker before the first upload arrives
+            if stt_pool is not None:
+                stt_pool.preload()
         except Exception as e:
-            logger.error(f"Error in AI response: {e}")
-            return "I am having trouble connecting to my AI backend. Please try again later."
+            logger.error("Warm-up failed: %s", e)
+
+    threading.Thread(target=load, name="warm-up", daemon=True).start()
+
+# Function to format a Server-Sent Event
+def sse_event(event, data):
+    """Encode a payload as a Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+# Give every request a correlation id for its log lines; one set by a proxy is kept
+@app.before_request
+def assign_request_id():
+    # Under gunicorn or any other WSGI server nothing calls warm_up(), so the first request does
+    warm_up()
+    use_request_id(request.headers.get('X-Request-ID'))
+
+# Return the correlation id so a client can quote it when reporting a problem
+@app.after_request
+def add_request_id_header(response):
+    response.headers['X-Request-ID'] = request_id.get()
+    return response
+
+# Fingerprinted names, precompressed variants and ETags for the files under static/
+static_assets = StaticAssets(app.static_folder)
+
+# Outside debug mode, pages link to the fingerprinted copies made by `flask --app app build-assets`
+@app.url_defaults
+def hashed_static_url(endpoint, values):
+    if endpoint == 'static' and not app.debug and 'filename' in values:
+        values['filename'] = static_assets.hashed_name(values['filename'])
+
+# Route for static files, replacing Flask's so hashed files are cached for good and the rest revalidated
+def serve_static(filename):
+    asset = static_assets.lookup(filename, request.accept_encodings)
+    if asset is None:
+        abort(404)
+    path, mimetype, encoding, etag, cache_control = asset
+    response = send_file(path, mimetype=mimetype, etag=etag, conditional=True)
+    response.headers['Cache-Control'] = cache_control
+    response.vary.add('Accept-Encoding')
+    if encoding is not None:
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+app.view_functions['static'] = serve_static
 
 # Route for the main page
 @app.route('/')
 def index():
-    return render_template('index.html')
+    response = make_response(render_template('index.html'))
+    # Issue a session id so conversation memory can follow this browser
+    if not current_session_id():
+        response.set_cookie(SESSION_COOKIE, uuid.uuid4().hex, httponly=True, samesite='Lax')
+    return response
 
 # API endpoint to get AI response
 @app.route('/api/response', methods=['POST'])
@@ -89,41 +511,247 @@ def api_response():
     if not user_input:
         return jsonify({'error': 'No message provided'}), 400
     
-    # Get AI response
-    response = get_ai_response(user_input)
+    # Canned answers are usually already synthesized, so let the browser play them
+    canned = get_canned_response(user_input)
+    if canned is not None:
+        record_turn(current_session_id(), user_input, canned, 'intent')
+        return jsonify(speech_payload(canned))
     
-    # Start a thread to speak the response (so it doesn't block the API response)
-    threading.Thread(target=speak_text, args=(response,)).start()
+    try:
+        tokens = stream_ai_response(user_input, current_session_id())
+    except AdmissionRejected as rejection:
+        return busy_response(rejection)
+    
+    # Get AI response, speaking each sentence as soon as it has been generated
+    pipeline = SentencePipeline(speak_text)
+    response = ''.join(pipeline.run(tokens))
     
     return jsonify({'response': response})
 
+# API endpoint to stream the AI response as Server-Sent Events
+@app.route('/api/response/stream', methods=['POST'])
+def api_response_stream():
+    data = request.json
+    user_input = data.get('message', '')
+
+    if not user_input:
+        return jsonify({'error': 'No message provided'}), 400
+
+    canned = get_canned_response(user_input)
+    session_id = current_session_id()
+
+    # A new generation takes its admission slot here, so a busy model is a 429 rather than a broken stream;
+    # the generation holds the slot until it finishes, even if this client disconnects
+    tokens = None
+    if canned is None:
+        try:
+            tokens = stream_ai_response(user_input, session_id)
+        except AdmissionRejected as rejection:
+            return busy_response(rejection)
+
+    def generate():
+        if canned is not None:
+            record_turn(session_id, user_input, canned, 'intent')
+            yield sse_event('token', {'token': canned})
+            yield sse_event('done', speech_payload(canned))
+            return
+
+        # Speak each sentence while the rest of the answer is still being generated
+        pipeline = SentencePipeline(speak_text)
+        parts = []
+        for token in pipeline.run(tokens):
+            parts.append(token)
+            yield sse_event('token', {'token': token})
+
+        yield sse_event('done', {'response': ''.join(parts)})
+
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers=headers)
+
+# API endpoint to stop speaking and drop queued speech
+@app.route('/api/tts/stop', methods=['POST'])
+def tts_stop():
+    tts_worker.flush()
+    return jsonify({'stopped': True})
+
+# API endpoint to synthesize text into the audio cache
+@app.route('/api/tts', methods=['POST'])
+def tts_render():
+    data = request.json
+    text = data.get('text', '')
+
+    if not text:
+        return jsonify({'error': 'No text provided'}), 400
+
+    key = tts_worker.render(text, timeout=30)
+    if key is None:
+        return jsonify({'error': 'Speech synthesis failed'}), 503
+    return jsonify({'audio_url': url_for('cached_audio', key=key)})
+
+# API endpoint serving cached speech audio
+@app.route('/api/audio/<key>.wav')
+def cached_audio(key):
+    if not re.fullmatch(r'[0-9a-f]{64}', key) or tts_worker.audio_cache.get(key) is None:
+        abort(404)
+    # Files are content-addressed, so they never change once written
+    return send_from_directory(tts_worker.audio_cache.directory, key + '.wav', mimetype='audio/wav', max_age=31536000)
+
+# API endpoint for text-to-speech queue metrics
+@app.route('/api/tts/stats')
+def tts_stats():
+    return jsonify(tts_worker.stats())
+
+# API endpoint for semantic cache metrics, used to tune the similarity threshold
+@app.route('/api/cache/stats')
+def cache_stats():
+    if semantic_cache is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(semantic_cache.stats(), enabled=True))
+
+# Prometheus metrics: per-stage latency histograms and counters
+@app.route('/metrics')
+def prometheus_metrics():
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+# Readiness probe: reports ready only once the model is loaded, so no traffic reaches a cold instance
+@app.route('/readyz')
+def readyz():
+    status = dict(model_warmer.status(), model=OLLAMA_MODEL)
+    return jsonify(status), 200 if status['ready'] else 503
+
+# API endpoint for the caller's own conversation, optionally limited to ?since=&until=
+@app.route('/api/transcripts')
+def transcripts():
+    if transcript_store is None:
+        return jsonify({'error': 'Transcripts are disabled'}), 404
+    try:
+        since, until = parse_timestamp(request.args.get('since')), parse_timestamp(request.args.get('until'))
+    except ValueError:
+        return jsonify({'error': 'since and until must be Unix seconds or ISO 8601 times'}), 400
+    session_id = current_session_id()
+    if not session_id:
+        return jsonify({'turns': []})
+    # The latest turns may still be in the write buffer; waiting for them is opt-in
+    if request.args.get('flush') == '1':
+        transcript_store.flush(timeout=2)
+    return jsonify({'turns': transcript_store.session(session_id, since, until)})
+
+# API endpoint for transcript writer metrics
+@app.route('/api/transcripts/stats')
+def transcripts_stats():
+    if transcript_store is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(transcript_store.stats(), enabled=True))
+
+# API endpoint for request coalescing and admission metrics
+@app.route('/api/llm/stats')
+def llm_stats():
+    return jsonify({'singleflight': llm_flights.stats(), 'admission': llm_admission.stats(), 'hosts': ollama_pool.stats()})
+
+# Function to map a speech recognition failure to an HTTP error
+def speech_error(e):
+    """Return (body, status, headers) for an exception raised by transcribe_audio"""
+    import speech_recognition as sr
+    from stt_pool import RecognitionBusy
+    if isinstance(e, sr.UnknownValueError):
+        STT_FAILURES.labels('no_speech').inc()
+        return {'error': 'Could not understand audio'}, 400, {}
+    if isinstance(e, RecognitionBusy):
+        logger.warning("Rejected speech recognition job: %s", e)
+        STT_FAILURES.labels('busy').inc()
+        return {'error': 'Speech recognition is busy, please retry'}, 503, {'Retry-After': '1'}
+    if isinstance(e, TimeoutError):
+        logger.error("Speech recognition timed out: %s", e)
+        STT_FAILURES.labels('timeout').inc()
+        return {'error': 'Speech recognition timed out'}, 504, {}
+    logger.error("Error in speech recognition: %s", e)
+    STT_FAILURES.labels('error').inc()
+    return {'error': str(e)}, 500, {}
+
 # API endpoint for speech-to-text (optional if you want to use server-side STT instead of browser)
 @app.route('/api/speech-to-text', methods=['POST'])
 def speech_to_text():
     if 'audio' not in request.files:
         return jsonify({'error': 'No audio file provided'}), 400
     
+    # The upload was parsed straight into memory, so recognition reads it from there
     audio_file = request.files['audio']
-    
-    # Save the file temporarily
-    temp_path = "temp_audio.wav"
-    audio_file.save(temp_path)                
+    audio_file.stream.seek(0)
     
     # Use speech recognition
-    recognizer = sr.Recognizer()
-    with sr.AudioFile(temp_path) as source:
-        audio_data = recognizer.record(source)
-        try:
-            text = recognizer.recognize_google(audio_data)
-            os.remove(temp_path)  # Clean up temp file
-            return jsonify({'text': text})
-        except sr.UnknownValueError:
-            os.remove(temp_path)  # Clean up temp file
-            return jsonify({'error': 'Could not understand audio'}), 400
-        except Exception as e:
-            os.remove(temp_path)  # Clean up temp file
-            logger.error(f"Error in speech recognition: {e}")
-            return jsonify({'error': str(e)}), 500
+    try:
+        text = transcribe_audio(audio_file.stream)
+        return jsonify({'text': text})
+    except Exception as e:
+        body, status, headers = speech_error(e)
+        return jsonify(body), status, headers
+
+# API endpoint for a whole voice interaction: audio in, spoken answer streamed back as WAV
+@app.route('/api/voice-turn', methods=['POST'])
+def voice_turn():
+    if 'audio' not in request.files:
+        return jsonify({'error': 'No audio file provided'}), 400
+    
+    audio_file = request.files['audio']
+    audio_file.stream.seek(0)
+    start = time.perf_counter()
+    try:
+        text = transcribe_audio(audio_file.stream)
+    except Exception as e:
+        body, status, headers = speech_error(e)
+        return jsonify(body), status, headers
+    stt_ms = (time.perf_counter() - start) * 1000
+    
+    try:
+        tokens = stream_ai_response(text, current_session_id())
+    except AdmissionRejected as rejection:
+        return busy_response(rejection)
+    
+    # The model keeps writing while earlier sentences are synthesized and sent
+    turn = VoiceTurn(tts_worker)
+    threading.Thread(target=contextvars.copy_context().run, args=(turn.run, tokens), name="voice-turn",
+                     daemon=True).start()
+    
+    # Headers go out with the first audio, so they carry the timing of everything before it
+    has_audio = turn.first_audio()
+    headers = {
+        'Server-Timing': server_timing(dict(stt=stt_ms, **turn.stages())),
+        'X-Transcript': quote(text),
+        'Cache-Control': 'no-cache',
+    }
+    if not has_audio:
+        # Speech synthesis is unavailable, so answer in text instead
+        turn.finished.wait()
+        return jsonify({'text': text, 'response': turn.response}), 200, headers
+    return Response(turn.audio(), mimetype='audio/wav', headers=headers)
+
+# WebSocket endpoint for streaming speech-to-text with interim transcripts
+if Sock is not None:
+    sock = Sock(app)
+
+    @sock.route('/api/speech-to-text/stream')
+    def speech_to_text_stream(ws):
+        from stt_stream import StreamingRecognition
+        stream = StreamingRecognition(streaming_backend())
+        while not stream.done:
+            message = ws.receive(timeout=STT_STREAM_IDLE_TIMEOUT)
+            if message is None:
+                break
+            for reply in stream.feed(message):
+                ws.send(json.dumps(reply))
+        ws.send(json.dumps(stream.finish()))
+else:
+    logger.info("flask-sock is not installed; streaming speech-to-text is disabled")
+
+# API endpoint for speech recognition latency
+@app.route('/api/stt/stats')
+def stt_stats():
+    return jsonify(speech_recognition_stats())
+
+# Error handler for uploads over the size limit
+@app.errorhandler(RequestEntityTooLarge)
+def request_too_large(e):
+    return jsonify({'error': f'Upload exceeds the {MAX_UPLOAD_BYTES} byte limit'}), 413
 
 # Create templates directory and HTML file
 def setup_templates():
@@ -137,9 +765,8 @@ def setup_templates():
     os.makedirs(os.path.join(static_dir, 'css'), exist_ok=True)
     os.makedirs(os.path.join(static_dir, 'js'), exist_ok=True)
     
-    # Create index.html
-    with open(os.path.join(templates_dir, 'index.html'), 'w') as f:
-        f.write("""<!DOCTYPE html>
+    # Create index.html; files are only rewritten when they change, so their mtimes and ETags stay put
+    write_if_changed(os.path.join(templates_dir, 'index.html'), """<!DOCTYPE html>
 <html lang="en">
 <head>
     <meta charset="UTF-8">
@@ -171,6 +798,13 @@ def setup_templates():
             
             <div class="status" id="status">Click the Speak button to start</div>
             
+            <div class="stt-option">
+                <label>
+                    <input type="checkbox" id="server-stt-toggle">
+                    Use server speech recognition
+                </label>
+            </div>
+            
             <div class="controls">
                 <div class="text-input">
                     <input type="text" id="text-message" placeholder="Type your message...">
@@ -205,8 +839,7 @@ def setup_templates():
 </html>""")
     
     # Create CSS file
-    with open(os.path.join(static_dir, 'css', 'styles.css'), 'w') as f:
-        f.write(""":root {
+    write_if_changed(os.path.join(static_dir, 'css', 'styles.css'), """:root {
     --primary-color: #007BFF;
     --accent-color: #00E5FF;
     --dark-color: #333;
@@ -304,6 +937,14 @@ body {
     border-top: 1px solid #e0e0e0;
 }
 
+.stt-option {
+    text-align: center;
+    padding: 0 10px 10px;
+    font-size: 13px;
+    color: var(--dark-color);
+    background-color: rgba(240, 240, 240, 0.8);
+}
+
 .controls {
     display: flex;
     gap: 10px;
@@ -443,10 +1084,12 @@ body {
 .visualizer-bar {
     background-color: var(--accent-color);
     width: 4px;
-    height: 10px;
+    height: 45px;
     margin: 0 2px;
     border-radius: 2px;
-    transition: height 0.2s ease;
+    /* Bars are scaled rather than resized, so redrawing them every frame needs no layout */
+    transform: scaleY(0.1);
+    will-change: transform;
 }
 
 /* Responsive design */
@@ -551,6 +1194,11 @@ body.dark-mode .status {
     border-top: 1px solid #3D3D3D;
 }
 
+body.dark-mode .stt-option {
+    background-color: rgba(45, 45, 45, 0.8);
+    color: #e0e0e0;
+}
+
 body.dark-mode .user-message {
     background-color: #455A64;
     color: #f0f0f0;
@@ -573,28 +1221,131 @@ body.dark-mode #text-message:focus {
 }""")
     
     # Create JavaScript file
-    with open(os.path.join(static_dir, 'js', 'app.js'), 'w') as f:
-        f.write("""// Initialize speech recognition
+    write_if_changed(os.path.join(static_dir, 'js', 'app.js'), """// Initialize speech recognition
 let recognition;
 let listeningActive = false;
+let serverStream = null;
+
+// Audio-level visualizer: one requestAnimationFrame loop reading a Web Audio AnalyserNode
+let visualizer = null;
+let visualizerFrame = 0;
+let visualizerToken = 0;
+const VISUALIZER_BARS = 15;
+const VISUALIZER_MIN_SCALE = 0.1;
+
+// Per-frame cost of the visualizer; read it with lisaVisualizerStats() in the console
+const visualizerStats = { frames: 0, totalMs: 0, maxMs: 0 };
+
+// Function to draw one visualizer frame from the microphone's spectrum
+function drawVisualizer() {
+    const start = performance.now();
+    const state = visualizer;
+    state.analyser.getByteFrequencyData(state.levels);
+    
+    for (let i = 0; i < state.bars.length; i++) {
+        const [first, last] = state.ranges[i];
+        let sum = 0;
+        for (let bin = first; bin < last; bin++) {
+            sum += state.levels[bin];
+        }
+        // Two decimals is finer than a pixel, and unchanged bars are not touched at all
+        const scale = Math.round(Math.max(VISUALIZER_MIN_SCALE, sum / (last - first) / 255) * 100) / 100;
+        if (scale !== state.scales[i]) {
+            state.scales[i] = scale;
+            state.bars[i].style.transform = `scaleY(${scale})`;
+        }
+    }
+    
+    const elapsed = performance.now() - start;
+    visualizerStats.frames++;
+    visualizerStats.totalMs += elapsed;
+    visualizerStats.maxMs = Math.max(visualizerStats.maxMs, elapsed);
+    visualizerFrame = requestAnimationFrame(drawVisualizer);
+}
 
-// Function to add visualizer effects
-function animateVisualizer(isActive) {
-    const bars = document.querySelectorAll('.visualizer-bar');
+// Function to start the visualizer on an audio source; ownedStream is released when it stops
+function startVisualizer(audioContext, source, ownedStream) {
+    stopVisualizer();
+    const analyser = audioContext.createAnalyser();
+    analyser.fftSize = 512;
+    analyser.smoothingTimeConstant = 0.7;
+    source.connect(analyser);
     
-    if (isActive) {
-        bars.forEach(bar => {
-            setInterval(() => {
-                const height = Math.floor(Math.random() * 40) + 5;
-                bar.style.height = `${height}px`;
-            }, 100);
-        });
-    } else {
-        bars.forEach(bar => {
-            bar.style.height = '5px';
-        });
+    // Speech energy sits below about 4 kHz, so the bars share the bins up to there
+    const bars = Array.from(document.querySelectorAll('.visualizer-bar'));
+    const usable = Math.min(analyser.frequencyBinCount, Math.ceil(4000 / (audioContext.sampleRate / analyser.fftSize)));
+    const ranges = bars.map((bar, i) => {
+        const first = 1 + Math.floor(i * (usable - 1) / bars.length);
+        return [first, Math.max(first + 1, 1 + Math.floor((i + 1) * (usable - 1) / bars.length))];
+    });
+    
+    visualizer = {
+        audioContext: audioContext,
+        source: source,
+        analyser: analyser,
+        ownedStream: ownedStream,
+        bars: bars,
+        ranges: ranges,
+        levels: new Uint8Array(analyser.frequencyBinCount),
+        scales: bars.map(() => 0)
+    };
+    visualizerFrame = requestAnimationFrame(drawVisualizer);
+}
+
+// Function to show the microphone level while the browser's own recognizer listens
+async function startMicrophoneVisualizer() {
+    stopVisualizer();
+    const token = visualizerToken;
+    if (!navigator.mediaDevices || !window.AudioContext) {
+        return;
+    }
+    let mediaStream;
+    try {
+        mediaStream = await navigator.mediaDevices.getUserMedia({ audio: true });
+    } catch (error) {
+        console.error('Visualizer has no microphone access:', error);
+        return;
+    }
+    // Listening may have stopped while the browser asked for permission
+    if (token !== visualizerToken) {
+        mediaStream.getTracks().forEach(track => track.stop());
+        return;
+    }
+    const audioContext = new AudioContext();
+    startVisualizer(audioContext, audioContext.createMediaStreamSource(mediaStream), mediaStream);
+}
+
+// Function to stop the visualizer loop and release anything it opened
+function stopVisualizer() {
+    visualizerToken++;
+    if (visualizerFrame) {
+        cancelAnimationFrame(visualizerFrame);
+        visualizerFrame = 0;
+    }
+    if (visualizer) {
+        visualizer.source.disconnect(visualizer.analyser);
+        if (visualizer.ownedStream) {
+            visualizer.ownedStream.getTracks().forEach(track => track.stop());
+            visualizer.audioContext.close();
+        }
+        visualizer = null;
     }
+    document.querySelectorAll('.visualizer-bar').forEach(bar => {
+        bar.style.transform = '';
+    });
+}
+
+// Function to report the visualizer's frame-time cost
+function visualizerFrameStats() {
+    const frames = visualizerStats.frames;
+    return {
+        running: visualizer !== null,
+        frames: frames,
+        avgMs: frames ? Number((visualizerStats.totalMs / frames).toFixed(3)) : 0,
+        maxMs: Number(visualizerStats.maxMs.toFixed(3))
+    };
 }
+window.lisaVisualizerStats = visualizerFrameStats;
 
 // Function to add a message to the chat log
 function addMessage(text, sender) {
@@ -605,6 +1356,7 @@ function addMessage(text, sender) {
     messageDiv.textContent = sender === 'user' ? `You: ${text}` : `Lisa: ${text}`;
     chatLog.appendChild(messageDiv);
     chatLog.scrollTop = chatLog.scrollHeight;
+    return messageDiv;
 }
 
 // Function to show typing indicator
@@ -626,12 +1378,38 @@ function removeTypingIndicator() {
     }
 }
 
-// Function to get AI response from server
+// Function to play cached speech audio served by the backend
+function playAudio(url) {
+    if (!url) {
+        return;
+    }
+    new Audio(url).play().catch(error => {
+        console.error('Error playing audio:', error);
+    });
+}
+
+// Function to parse a single Server-Sent Event block
+function parseSSEEvent(block) {
+    let type = 'message';
+    const dataLines = [];
+    block.split('\\n').forEach(line => {
+        if (line.startsWith('event:')) {
+            type = line.slice(6).trim();
+        } else if (line.startsWith('data:')) {
+            dataLines.push(line.slice(5).trim());
+        }
+    });
+    return { type: type, data: dataLines.length ? JSON.parse(dataLines.join('\\n')) : null };
+}
+
+// Function to get AI response from server, rendering tokens as they stream in
 async function getAIResponse(userInput) {
     showTypingIndicator();
+    let messageDiv = null;
+    let fullText = '';
     
     try {
-        const response = await fetch('/api/response', {
+        const response = await fetch('/api/response/stream', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
@@ -639,28 +1417,208 @@ async function getAIResponse(userInput) {
             body: JSON.stringify({ message: userInput }),
         });
         
+        if (response.status === 429) {
+            // The backend is at capacity; tell the user when to try again
+            const retryAfter = response.headers.get('Retry-After') || 'a few';
+            removeTypingIndicator();
+            const busyMessage = `I'm busy right now. Please try again in ${retryAfter} seconds.`;
+            addMessage(busyMessage, 'lisa');
+            return busyMessage;
+        }
+        
         if (!response.ok) {
             throw new Error(`Server responded with ${response.status}`);
         }
         
-        const data = await response.json();
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        const chatLog = document.getElementById('chat-log');
+        let buffer = '';
+        
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) {
+                break;
+            }
+            buffer += decoder.decode(value, { stream: true });
+            
+            let boundary;
+            while ((boundary = buffer.indexOf('\\n\\n')) !== -1) {
+                const event = parseSSEEvent(buffer.slice(0, boundary));
+                buffer = buffer.slice(boundary + 2);
+                
+                if (event.type === 'token') {
+                    fullText += event.data.token;
+                } else if (event.type === 'done') {
+                    fullText = event.data.response;
+                    playAudio(event.data.audio_url);
+                } else {
+                    continue;
+                }
+                
+                if (!messageDiv) {
+                    removeTypingIndicator();
+                    messageDiv = addMessage('', 'lisa');
+                }
+                messageDiv.textContent = `Lisa: ${fullText}`;
+                chatLog.scrollTop = chatLog.scrollHeight;
+            }
+        }
+        
         removeTypingIndicator();
-        return data.response;
+        if (!messageDiv) {
+            addMessage(fullText, 'lisa');
+        }
+        return fullText;
     } catch (error) {
         console.error('Error getting AI response:', error);
         removeTypingIndicator();
-        return "I'm having trouble connecting to my backend. Please try again later.";
+        const fallback = "I'm having trouble connecting to my backend. Please try again later.";
+        if (messageDiv) {
+            messageDiv.textContent = `Lisa: ${fullText} ${fallback}`;
+        } else {
+            addMessage(fallback, 'lisa');
+        }
+        return fallback;
+    }
+}
+
+// Function to handle a finished transcript; returns false if the conversation was stopped
+async function handleTranscript(text) {
+    addMessage(text, "user");
+    document.getElementById('status').textContent = "Processing...";
+    
+    if (text.toLowerCase().includes("stop")) {
+        stopConversation();
+        return false;
+    }
+    
+    await getAIResponse(text);
+    return true;
+}
+
+// Function to convert Web Audio samples to 16-bit PCM
+function floatTo16BitPCM(samples) {
+    const pcm = new Int16Array(samples.length);
+    for (let i = 0; i < samples.length; i++) {
+        const sample = Math.max(-1, Math.min(1, samples[i]));
+        pcm[i] = sample < 0 ? sample * 0x8000 : sample * 0x7FFF;
     }
+    return pcm.buffer;
+}
+
+// Function to release the microphone and socket used for server recognition
+function stopServerListening() {
+    if (!serverStream) {
+        return;
+    }
+    const stream = serverStream;
+    serverStream = null;
+    if (visualizer && visualizer.audioContext === stream.audioContext) {
+        stopVisualizer();
+    }
+    stream.processor.disconnect();
+    stream.mediaStream.getTracks().forEach(track => track.stop());
+    stream.audioContext.close();
+    if (stream.socket.readyState === WebSocket.OPEN) {
+        stream.socket.close();
+    }
+}
+
+// Function to stream microphone audio to the server and show interim transcripts
+async function startServerListening() {
+    let mediaStream;
+    try {
+        mediaStream = await navigator.mediaDevices.getUserMedia({ audio: { channelCount: 1, echoCancellation: true, noiseSuppression: true } });
+    } catch (error) {
+        console.error('Error accessing microphone:', error);
+        listeningActive = false;
+        document.getElementById('status').textContent = "Microphone access was denied.";
+        document.getElementById('speak-btn').classList.remove('pulse');
+        stopVisualizer();
+        return;
+    }
+    
+    // The server expects 16 kHz mono PCM; the browser resamples the microphone for us
+    const audioContext = new AudioContext({ sampleRate: 16000 });
+    const source = audioContext.createMediaStreamSource(mediaStream);
+    const processor = audioContext.createScriptProcessor(4096, 1, 1);
+    const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+    const socket = new WebSocket(`${protocol}//${window.location.host}/api/speech-to-text/stream`);
+    socket.binaryType = 'arraybuffer';
+    const stream = { socket: socket, audioContext: audioContext, mediaStream: mediaStream, processor: processor, finished: false };
+    serverStream = stream;
+    
+    processor.onaudioprocess = function(event) {
+        if (socket.readyState === WebSocket.OPEN) {
+            socket.send(floatTo16BitPCM(event.inputBuffer.getChannelData(0)));
+        }
+    };
+    source.connect(processor);
+    processor.connect(audioContext.destination);
+    startVisualizer(audioContext, source, null);
+    
+    socket.onopen = function() {
+        document.getElementById('status').textContent = "Listening...";
+    };
+    
+    socket.onmessage = async function(event) {
+        const message = JSON.parse(event.data);
+        if (message.partial) {
+            document.getElementById('status').textContent = `Hearing: ${message.partial}`;
+            return;
+        }
+        
+        // The server sends one final message per utterance
+        stream.finished = true;
+        stopServerListening();
+        if (message.error) {
+            document.getElementById('status').textContent = message.error;
+        } else if (!await handleTranscript(message.text)) {
+            return;
+        }
+        
+        if (listeningActive) {
+            setTimeout(() => {
+                if (listeningActive && !serverStream) {
+                    startServerListening();
+                }
+            }, 1000);
+        }
+    };
+    
+    socket.onclose = function() {
+        // Closed before a final transcript: the server is unreachable or does not support streaming
+        if (!stream.finished && serverStream === stream) {
+            stopServerListening();
+            listeningActive = false;
+            document.getElementById('status').textContent = "Server speech recognition is unavailable.";
+            document.getElementById('speak-btn').classList.remove('pulse');
+            stopVisualizer();
+        }
+    };
 }
 
 // Function to start voice recognition
 function startListening() {
-    if (!('webkitSpeechRecognition' in window) && !('SpeechRecognition' in window)) {
-        addMessage("Speech recognition is not supported in your browser.", "lisa");
+    const SpeechRecognition = window.SpeechRecognition || window.webkitSpeechRecognition;
+    const useServer = document.getElementById('server-stt-toggle').checked || !SpeechRecognition;
+    
+    if (useServer) {
+        if (!navigator.mediaDevices || !window.WebSocket) {
+            addMessage("Speech recognition is not supported in your browser.", "lisa");
+            return;
+        }
+        if (serverStream) {
+            return;
+        }
+        listeningActive = true;
+        document.getElementById('status').textContent = "Connecting...";
+        document.getElementById('speak-btn').classList.add('pulse');
+        startServerListening();
         return;
     }
     
-    const SpeechRecognition = window.SpeechRecognition || window.webkitSpeechRecognition;
     recognition = new SpeechRecognition();
     recognition.continuous = false;
     recognition.interimResults = false;
@@ -669,7 +1627,7 @@ function startListening() {
     listeningActive = true;
     document.getElementById('status').textContent = "Listening...";
     document.getElementById('speak-btn').classList.add('pulse');
-    animateVisualizer(true);
+    startMicrophoneVisualizer();
     
     recognition.onstart = function() {
         document.getElementById('status').textContent = "Listening...";
@@ -677,17 +1635,10 @@ function startListening() {
     
     recognition.onresult = async function(event) {
         const text = event.results[0][0].transcript;
-        addMessage(text, "user");
-        document.getElementById('status').textContent = "Processing...";
-        
-        if (text.toLowerCase().includes("stop")) {
-            stopConversation();
+        if (!await handleTranscript(text)) {
             return;
         }
         
-        const response = await getAIResponse(text);
-        addMessage(response, "lisa");
-        
         if (listeningActive) {
             document.getElementById('status').textContent = "Click the Speak button to start";
             document.getElementById('speak-btn').classList.remove('pulse');
@@ -704,7 +1655,7 @@ function startListening() {
     recognition.onerror = function(event) {
         document.getElementById('status').textContent = "Error occurred in recognition: " + event.error;
         document.getElementById('speak-btn').classList.remove('pulse');
-        animateVisualizer(false);
+        stopVisualizer();
     };
     
     recognition.onend = function() {
@@ -728,10 +1679,16 @@ function stopConversation() {
     if (recognition) {
         recognition.stop();
     }
+    stopServerListening();
+    
+    // Silence any speech that is still queued on the server
+    fetch('/api/tts/stop', { method: 'POST' }).catch(error => {
+        console.error('Error stopping speech:', error);
+    });
     
     document.getElementById('status').textContent = "Conversation stopped.";
     document.getElementById('speak-btn').classList.remove('pulse');
-    animateVisualizer(false);
+    stopVisualizer();
     
     addMessage("Goodbye! Conversation stopped.", "Lisa");
 }
@@ -750,8 +1707,7 @@ async function handleTextSubmit() {
             return;
         }
         
-        const response = await getAIResponse(userText);
-        addMessage(response, "Lisa");
+        await getAIResponse(userText);
     }
 }
 
@@ -781,7 +1737,7 @@ document.addEventListener('DOMContentLoaded', function() {
     // Create visualizer bars
     const visualizer = document.getElementById('visualizer');
     visualizer.innerHTML = '';
-    for (let i = 0; i < 15; i++) {
+    for (let i = 0; i < VISUALIZER_BARS; i++) {
         const bar = document.createElement('div');
         bar.classList.add('visualizer-bar');
         visualizer.appendChild(bar);
@@ -790,9 +1746,44 @@ document.addEventListener('DOMContentLoaded', function() {
     
     logger.info("Templates and static files created successfully.")
 
-if __name__ == "__main__":                      
-    # Set up the templates and static files
+# Command to regenerate the templates and static files: flask --app app setup-templates
+@app.cli.command('setup-templates')
+def setup_templates_command():
+    """Write templates/index.html and the files under static/"""
     setup_templates()
+
+# Command to fingerprint and precompress the static files for production: flask --app app build-assets
+@app.cli.command('build-assets')
+def build_assets_command():
+    """Write hashed, gzip- and brotli-compressed copies of the static files and static/manifest.json"""
+    for source, hashed in build_assets(app.static_folder).items():
+        print(f"{source} -> {hashed}")
+
+# Command to export stored conversations as JSON lines: flask --app app transcripts --since 2024-05-01
+@app.cli.command('transcripts')
+@click.option('--session', 'session_id', help="Only this session id")
+@click.option('--since', help="Start time, Unix seconds or ISO 8601")
+@click.option('--until', help="End time (exclusive), Unix seconds or ISO 8601")
+@click.option('--limit', type=int, default=1000, show_default=True)
+def transcripts_command(session_id, since, until, limit):
+    """Print the latest stored conversation turns, oldest first"""
+    if transcript_store is None:
+        raise click.ClickException("Transcripts are disabled (LISA_TRANSCRIPTS_DB is empty)")
+    try:
+        since, until = parse_timestamp(since), parse_timestamp(until)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+    if session_id:
+        turns = transcript_store.session(session_id, since, until, limit)
+    else:
+        turns = transcript_store.between(since, until, limit)
+    for turn in turns:
+        print(json.dumps(turn, ensure_ascii=False))
+
+if __name__ == "__main__":                      
+    # With the debug reloader, only the child process that serves requests warms up
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        warm_up()
     
     # Run the Flask app
     app.run(debug=True, port=5000)
\ No newline at end of file
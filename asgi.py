@@ -0,0 +1,481 @@
+"""Async variant of the Lisa web app for ASGI servers.
+
+Serves the same routes and JSON contract as app.py, but model calls go
+through ollama.AsyncClient so every in-flight conversation is a coroutine
+instead of a blocked worker thread. Run it with any ASGI server, e.g.
+
+    uvicorn asgi:app --port 5000
+"""
+import asyncio
+import io
+import json
+import re
+import time
+import uuid
+import logging
+from urllib.parse import quote
+from quart import Quart, render_template, request, websocket, jsonify, Response, url_for, send_file, send_from_directory, abort, make_response
+
+from app import (
+    OLLAMA_MODEL, OLLAMA_KEEP_ALIVE, EMBEDDING_MODEL, BACKEND_ERROR_RESPONSE, SESSION_COOKIE, MAX_UPLOAD_BYTES,
+    LLM_MAX_CONCURRENT, LLM_MAX_QUEUE, LLM_QUEUE_TIMEOUT, SHORT_PROMPT_CHARS,
+    STT_STREAM_IDLE_TIMEOUT, tts_worker, speak_text, semantic_cache, store_cached_response, conversation_memory,
+    model_warmer, ollama_pool, get_canned_response, transcribe_audio, streaming_backend, speech_error, speech_recognition_stats,
+    warm_up, sse_event, static_assets, record_turn, transcript_store, parse_timestamp,
+)
+from speech_pipeline import SentencePipeline
+from voice_turn import VoiceTurn, server_timing
+from metrics import REGISTRY, LLM_FIRST_TOKEN_SECONDS, LLM_TOTAL_SECONDS, LLM_ERRORS
+from singleflight import AsyncSingleFlight, request_key
+from admission import AsyncAdmissionController, AdmissionRejected
+from logs import start_background_logging, use_request_id, request_id
+
+logger = logging.getLogger(__name__)
+
+app = Quart(__name__)
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES
+
+# Identical concurrent prompts share one upstream generation
+llm_flights = AsyncSingleFlight()
+
+# Limits how many requests may be waiting on the model at once
+llm_admission = AsyncAdmissionController(LLM_MAX_CONCURRENT, LLM_MAX_QUEUE, LLM_QUEUE_TIMEOUT)
+
+
+# Function to build the response for a request that could not be admitted
+def busy_response(rejection):
+    """Return a 429 telling the client when to retry"""
+    body = {'error': 'Lisa is busy right now. Please try again shortly.', 'retry_after': rejection.retry_after}
+    return jsonify(body), 429, {'Retry-After': str(rejection.retry_after)}
+
+
+@app.before_serving
+async def start_warm_up():
+    # Engines and models load in the background so the server starts accepting connections at once
+    warm_up()
+
+
+# Give every request a correlation id for its log lines; tasks and to_thread() calls inherit it
+@app.before_request
+async def assign_request_id():
+    start_background_logging()
+    use_request_id(request.headers.get('X-Request-ID'))
+
+
+@app.before_websocket
+async def assign_websocket_request_id():
+    use_request_id(websocket.headers.get('X-Request-ID'))
+
+
+# Return the correlation id so a client can quote it when reporting a problem
+@app.after_request
+async def add_request_id_header(response):
+    response.headers['X-Request-ID'] = request_id.get()
+    return response
+
+
+# Function to build a response payload for a complete answer
+def speech_payload(text):
+    """Point the browser at cached audio for text, or queue it on the server TTS worker"""
+    key = tts_worker.cached_audio(text)
+    if key is not None:
+        return {'response': text, 'audio_url': url_for('cached_audio', key=key)}
+    speak_text(text)
+    return {'response': text}
+
+
+# Function to look up a previous answer to a similar question
+async def lookup_cached_response(user_input):
+    """Return (cached answer or None, prompt vector or None) without blocking the event loop"""
+    if semantic_cache is None:
+        return None, None
+    try:
+        start = time.perf_counter()
+        result = await ollama_pool.acall(lambda client: client.embeddings(model=EMBEDDING_MODEL, prompt=user_input,
+                                                                          keep_alive=OLLAMA_KEEP_ALIVE))
+        return semantic_cache.lookup_embedding(result['embedding'], time.perf_counter() - start)
+    except Exception as e:
+        logger.error("Error in semantic cache lookup: %s", e)
+        return None, None
+
+
+# Function to yield a complete answer as a one-piece stream
+async def single_chunk(text):
+    yield text
+
+
+# Function to stream AI response tokens using the async Ollama client
+async def stream_ai_response(user_input, session_id=None):
+    """Return an async iterator over the AI response in pieces as Ollama generates them.
+
+    A request that starts a new generation waits here for an admission slot and
+    raises AdmissionRejected, before anything is sent, if it gets none.
+    """
+    canned = get_canned_response(user_input)
+    if canned is not None:
+        record_turn(session_id, user_input, canned, 'intent')
+        return single_chunk(canned)
+
+    vector = None
+    if not conversation_memory.has_history(session_id):
+        cached, vector = await lookup_cached_response(user_input)
+        if cached is not None:
+            record_turn(session_id, user_input, cached, 'cache')
+            return single_chunk(cached)
+
+    messages = conversation_memory.build_messages(session_id, user_input)
+    async def generate():
+        # The pool's hosts each keep one AsyncClient, so connections stay open between requests
+        async for chunk in ollama_pool.astream(lambda client: client.chat(model=OLLAMA_MODEL, messages=messages,
+                                                                          stream=True, keep_alive=OLLAMA_KEEP_ALIVE)):
+            content = chunk.get('message', {}).get('content', '')
+            if content:
+                yield content
+
+    start = time.perf_counter()
+    # The shared generation holds the only slot; it is released when the upstream call ends, not when clients leave
+    tokens, leader = await llm_flights.stream(
+        request_key(OLLAMA_MODEL, messages), generate,
+        admit=lambda: llm_admission.acquire(priority=len(user_input) <= SHORT_PROMPT_CHARS))
+    if not leader:
+        logger.info("Joined an identical in-flight generation")
+
+    async def relay():
+        first_token = True
+        parts = []
+        try:
+            async for content in tokens:
+                if first_token:
+                    first_token = False
+                    LLM_FIRST_TOKEN_SECONDS.observe(time.perf_counter() - start)
+                    logger.info("Time to first token: %.0f ms", (time.perf_counter() - start) * 1000)
+                parts.append(content)
+                yield content
+            LLM_TOTAL_SECONDS.observe(time.perf_counter() - start)
+            logger.info("Ollama stream finished in %.0f ms", (time.perf_counter() - start) * 1000)
+            response = ''.join(parts)
+            if leader:
+                # Formatted on the log thread, and only when debug logging is on
+                logger.debug("Ollama response: %s", response)
+                store_cached_response(vector, response)
+            record_turn(session_id, user_input, response, 'model')
+        except Exception as e:
+            logger.error("Error in AI response stream: %s", e)
+            LLM_ERRORS.inc()
+            # Only fall back if nothing has been sent yet, otherwise keep the partial answer
+            if first_token:
+                yield BACKEND_ERROR_RESPONSE
+
+    return relay()
+
+
+# Outside debug mode, pages link to the fingerprinted copies made by `flask --app app build-assets`
+@app.url_defaults
+def hashed_static_url(endpoint, values):
+    if endpoint == 'static' and not app.debug and 'filename' in values:
+        values['filename'] = static_assets.hashed_name(values['filename'])
+
+
+# Route for static files, replacing Quart's so hashed files are cached for good and the rest revalidated
+async def serve_static(filename):
+    asset = static_assets.lookup(filename, request.accept_encodings)
+    if asset is None:
+        abort(404)
+    path, mimetype, encoding, etag, cache_control = asset
+    response = await send_file(path, mimetype=mimetype, add_etags=False)
+    response.set_etag(etag)
+    # send_file adds an Expires header from SEND_FILE_MAX_AGE_DEFAULT; Cache-Control alone decides
+    response.headers.pop('Expires', None)
+    response.headers['Cache-Control'] = cache_control
+    response.vary.add('Accept-Encoding')
+    if encoding is not None:
+        response.headers['Content-Encoding'] = encoding
+    return await response.make_conditional(request)
+
+app.view_functions['static'] = serve_static
+
+
+# Route for the main page
+@app.route('/')
+async def index():
+    response = await make_response(await render_template('index.html'))
+    if not request.cookies.get(SESSION_COOKIE):
+        response.set_cookie(SESSION_COOKIE, uuid.uuid4().hex, httponly=True, samesite='Lax')
+    return response
+
+
+# API endpoint to get AI response
+@app.route('/api/response', methods=['POST'])
+async def api_response():
+    data = await request.get_json()
+    user_input = data.get('message', '')
+
+    if not user_input:
+        return jsonify({'error': 'No message provided'}), 400
+
+    canned = get_canned_response(user_input)
+    if canned is not None:
+        record_turn(request.cookies.get(SESSION_COOKIE), user_input, canned, 'intent')
+        return jsonify(speech_payload(canned))
+
+    try:
+        tokens = await stream_ai_response(user_input, request.cookies.get(SESSION_COOKIE))
+    except AdmissionRejected as rejection:
+        return busy_response(rejection)
+
+    # Queueing on the TTS worker never blocks, so the pipeline runs inline
+    pipeline = SentencePipeline(speak_text)
+    parts = []
+    try:
+        async for token in tokens:
+            pipeline.feed(token)
+            parts.append(token)
+    finally:
+        pipeline.close()
+
+    return jsonify({'response': ''.join(parts)})
+
+
+# API endpoint to stream the AI response as Server-Sent Events
+@app.route('/api/response/stream', methods=['POST'])
+async def api_response_stream():
+    data = await request.get_json()
+    user_input = data.get('message', '')
+
+    if not user_input:
+        return jsonify({'error': 'No message provided'}), 400
+
+    canned = get_canned_response(user_input)
+    session_id = request.cookies.get(SESSION_COOKIE)
+    canned_payload = None
+    if canned is not None:
+        record_turn(session_id, user_input, canned, 'intent')
+        canned_payload = speech_payload(canned)
+
+    # A new generation takes its admission slot here, and holds it until it finishes even if
+    # this client disconnects before the body is read, so no slot can leak
+    tokens = None
+    if canned is None:
+        try:
+            tokens = await stream_ai_response(user_input, session_id)
+        except AdmissionRejected as rejection:
+            return busy_response(rejection)
+
+    async def generate():
+        if canned_payload is not None:
+            yield sse_event('token', {'token': canned})
+            yield sse_event('done', canned_payload)
+            return
+
+        pipeline = SentencePipeline(speak_text)
+        parts = []
+        try:
+            async for token in tokens:
+                pipeline.feed(token)
+                parts.append(token)
+                yield sse_event('token', {'token': token})
+        finally:
+            pipeline.close()
+
+        yield sse_event('done', {'response': ''.join(parts)})
+
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    response = Response(generate(), mimetype='text/event-stream', headers=headers)
+    response.timeout = None
+    return response
+
+
+# API endpoint to stop speaking and drop queued speech
+@app.route('/api/tts/stop', methods=['POST'])
+async def tts_stop():
+    tts_worker.flush()
+    return jsonify({'stopped': True})
+
+
+# API endpoint to synthesize text into the audio cache
+@app.route('/api/tts', methods=['POST'])
+async def tts_render():
+    data = await request.get_json()
+    text = data.get('text', '')
+
+    if not text:
+        return jsonify({'error': 'No text provided'}), 400
+
+    # Waiting on the TTS worker would block the event loop, so do it off-loop
+    key = await asyncio.to_thread(tts_worker.render, text, timeout=30)
+    if key is None:
+        return jsonify({'error': 'Speech synthesis failed'}), 503
+    return jsonify({'audio_url': url_for('cached_audio', key=key)})
+
+
+# API endpoint for text-to-speech queue metrics
+@app.route('/api/tts/stats')
+async def tts_stats():
+    return jsonify(tts_worker.stats())
+
+
+# API endpoint serving cached speech audio
+@app.route('/api/audio/<key>.wav')
+async def cached_audio(key):
+    if not re.fullmatch(r'[0-9a-f]{64}', key) or tts_worker.audio_cache.get(key) is None:
+        abort(404)
+    response = await send_from_directory(tts_worker.audio_cache.directory, key + '.wav', mimetype='audio/wav')
+    response.cache_control.max_age = 31536000
+    return response
+
+
+# API endpoint for semantic cache metrics
+@app.route('/api/cache/stats')
+async def cache_stats():
+    if semantic_cache is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(semantic_cache.stats(), enabled=True))
+
+
+# Prometheus metrics: per-stage latency histograms and counters
+@app.route('/metrics')
+async def prometheus_metrics():
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+
+# Readiness probe: reports ready only once the model is loaded, so no traffic reaches a cold instance
+@app.route('/readyz')
+async def readyz():
+    status = dict(model_warmer.status(), model=OLLAMA_MODEL)
+    return jsonify(status), 200 if status['ready'] else 503
+
+
+# API endpoint for the caller's own conversation, optionally limited to ?since=&until=
+@app.route('/api/transcripts')
+async def transcripts():
+    if transcript_store is None:
+        return jsonify({'error': 'Transcripts are disabled'}), 404
+    try:
+        since, until = parse_timestamp(request.args.get('since')), parse_timestamp(request.args.get('until'))
+    except ValueError:
+        return jsonify({'error': 'since and until must be Unix seconds or ISO 8601 times'}), 400
+    session_id = request.cookies.get(SESSION_COOKIE)
+    if not session_id:
+        return jsonify({'turns': []})
+    # The latest turns may still be in the write buffer; waiting for them is opt-in
+    if request.args.get('flush') == '1':
+        await asyncio.to_thread(transcript_store.flush, timeout=2)
+    turns = await asyncio.to_thread(transcript_store.session, session_id, since, until)
+    return jsonify({'turns': turns})
+
+
+# API endpoint for transcript writer metrics
+@app.route('/api/transcripts/stats')
+async def transcripts_stats():
+    if transcript_store is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(transcript_store.stats(), enabled=True))
+
+
+# API endpoint for request coalescing and admission metrics
+@app.route('/api/llm/stats')
+async def llm_stats():
+    return jsonify({'singleflight': llm_flights.stats(), 'admission': llm_admission.stats(), 'hosts': ollama_pool.stats()})
+
+
+# API endpoint for speech-to-text
+@app.route('/api/speech-to-text', methods=['POST'])
+async def speech_to_text():
+    files = await request.files
+    if 'audio' not in files:
+        return jsonify({'error': 'No audio file provided'}), 400
+
+    # Recognize from memory; a shared temp file would be clobbered by concurrent requests
+    audio = io.BytesIO(files['audio'].read())
+
+    try:
+        # Recognition is blocking library code, so it runs in the default executor
+        text = await asyncio.to_thread(transcribe_audio, audio)
+        return jsonify({'text': text})
+    except Exception as e:
+        body, status, headers = speech_error(e)
+        return jsonify(body), status, headers
+
+
+# API endpoint for a whole voice interaction: audio in, spoken answer streamed back as WAV
+@app.route('/api/voice-turn', methods=['POST'])
+async def voice_turn():
+    files = await request.files
+    if 'audio' not in files:
+        return jsonify({'error': 'No audio file provided'}), 400
+
+    audio = io.BytesIO(files['audio'].read())
+    start = time.perf_counter()
+    try:
+        text = await asyncio.to_thread(transcribe_audio, audio)
+    except Exception as e:
+        body, status, headers = speech_error(e)
+        return jsonify(body), status, headers
+    stt_ms = (time.perf_counter() - start) * 1000
+
+    try:
+        tokens = await stream_ai_response(text, request.cookies.get(SESSION_COOKIE))
+    except AdmissionRejected as rejection:
+        return busy_response(rejection)
+
+    # The model keeps writing while earlier sentences are synthesized and sent
+    turn = VoiceTurn(tts_worker)
+
+    async def produce():
+        try:
+            async for token in tokens:
+                turn.feed(token)
+        except Exception as e:
+            logger.error("Error generating voice answer: %s", e)
+        finally:
+            turn.finish()
+
+    producer = asyncio.create_task(produce())
+
+    # Headers go out with the first audio, so they carry the timing of everything before it
+    has_audio = await asyncio.to_thread(turn.first_audio)
+    headers = {
+        'Server-Timing': server_timing(dict(stt=stt_ms, **turn.stages())),
+        'X-Transcript': quote(text),
+        'Cache-Control': 'no-cache',
+    }
+    if not has_audio:
+        # Speech synthesis is unavailable, so answer in text instead
+        await producer
+        return jsonify({'text': text, 'response': turn.response}), 200, headers
+
+    async def body():
+        chunks = turn.audio()
+        while (chunk := await asyncio.to_thread(next, chunks, None)) is not None:
+            yield chunk
+
+    response = Response(body(), mimetype='audio/wav', headers=headers)
+    response.timeout = None
+    return response
+
+
+# WebSocket endpoint for streaming speech-to-text with interim transcripts
+@app.websocket('/api/speech-to-text/stream')
+async def speech_to_text_stream():
+    from stt_stream import StreamingRecognition
+    backend = await asyncio.to_thread(streaming_backend)
+    stream = StreamingRecognition(backend)
+    while not stream.done:
+        try:
+            message = await asyncio.wait_for(websocket.receive(), STT_STREAM_IDLE_TIMEOUT)
+        except asyncio.TimeoutError:
+            break
+        # Decoding is CPU-bound, so keep it off the event loop
+        for reply in await asyncio.to_thread(stream.feed, message):
+            await websocket.send(json.dumps(reply))
+    await websocket.send(json.dumps(await asyncio.to_thread(stream.finish)))
+
+
+# API endpoint for speech recognition latency
+@app.route('/api/stt/stats')
+async def stt_stats():
+    return jsonify(speech_recognition_stats())
+
+
+if __name__ == "__main__":
+    app.run(port=5000)
@@ -0,0 +1,161 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Directory the web UI's CSS and JavaScript are served from
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+
+# Maps each source file to its fingerprinted copy, e.g. "js/app.js" -> "js/app.0123456789ab.js"
+MANIFEST_FILE = 'manifest.json'
+
+# Files that get fingerprinted and precompressed
+ASSET_EXTENSIONS = ('.css', '.js', '.svg')
+
+# Hex digits of the content hash put into file names
+HASH_LENGTH = 12
+HASHED_NAME = re.compile(r"\.[0-9a-f]{%d}\.[^./]+$" % HASH_LENGTH)
+
+# A fingerprinted file never changes, so browsers may keep it for a year without asking again
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Anything else is revalidated with its ETag on every use
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+# Precompressed variants in order of preference: (Content-Encoding, file suffix)
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+# Function to write a file only when its contents change
+def write_if_changed(path, content):
+    """Write text or bytes to path unless it already holds exactly that; returns True if written.
+
+    Leaving unchanged files alone keeps their mtimes, so conditional requests keep hitting.
+    """
+    data = content.encode('utf-8') if isinstance(content, str) else content
+    try:
+        with open(path, 'rb') as f:
+            if f.read() == data:
+                return False
+    except FileNotFoundError:
+        pass
+    with open(path, 'wb') as f:
+        f.write(data)
+    return True
+
+
+# Function to fingerprint file contents
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+
+
+# Function to build the fingerprinted and precompressed copies of the static files
+def build_assets(static_dir=STATIC_DIR):
+    """Write name.<hash>.ext plus .gz (and .br with the brotli package) for every asset; returns the manifest"""
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+        logger.info("brotli is not installed; building gzip variants only")
+
+    manifest = {}
+    for root, _, files in os.walk(static_dir):
+        for name in sorted(files):
+            if not name.endswith(ASSET_EXTENSIONS) or HASHED_NAME.search(name):
+                continue
+            path = os.path.join(root, name)
+            with open(path, 'rb') as f:
+                data = f.read()
+            stem, extension = os.path.splitext(name)
+            hashed_path = os.path.join(root, f"{stem}.{content_hash(data)}{extension}")
+            write_if_changed(hashed_path, data)
+
+            # Only variants that are actually smaller are worth serving
+            variants = {'.gz': gzip.compress(data, compresslevel=9, mtime=0)}
+            if brotli is not None:
+                variants['.br'] = brotli.compress(data, quality=11)
+            for suffix, compressed in variants.items():
+                if len(compressed) < len(data):
+                    write_if_changed(hashed_path + suffix, compressed)
+
+            source = os.path.relpath(path, static_dir).replace(os.sep, '/')
+            manifest[source] = os.path.relpath(hashed_path, static_dir).replace(os.sep, '/')
+            sizes = ", ".join(f"{suffix[1:]} {len(compressed)}" for suffix, compressed in variants.items())
+            logger.info("Built %s (%d bytes; %s)", manifest[source], len(data), sizes)
+
+    # Copies from earlier builds are left in place so pages already open in a browser keep working
+    write_if_changed(os.path.join(static_dir, MANIFEST_FILE), json.dumps(manifest, indent=2, sort_keys=True) + "\n")
+    return manifest
+
+
+class StaticAssets:
+    """Resolves static files to fingerprinted names, precompressed variants, strong ETags and cache headers"""
+
+    def __init__(self, static_dir=STATIC_DIR):
+        self.static_dir = static_dir
+        self.lock = threading.Lock()
+        self.manifest = None
+        self.hashed = set()
+        # path -> (mtime_ns, size, etag), so files are only hashed again when they change
+        self.etags = {}
+
+    def load(self):
+        """Read the manifest written by build_assets(), or start without one"""
+        try:
+            with open(os.path.join(self.static_dir, MANIFEST_FILE), encoding='utf-8') as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            manifest = {}
+        except ValueError as e:
+            logger.error("Ignoring unreadable asset manifest: %s", e)
+            manifest = {}
+        with self.lock:
+            self.manifest = manifest
+            self.hashed = set(manifest.values())
+        return manifest
+
+    def hashed_name(self, filename):
+        """Return the fingerprinted name for a static file, or the name itself if it was not built"""
+        if self.manifest is None:
+            self.load()
+        return self.manifest.get(filename, filename)
+
+    def lookup(self, filename, accept_encodings):
+        """Return (path, mimetype, content encoding or None, etag, Cache-Control) for a request, or None"""
+        from werkzeug.security import safe_join
+        path = safe_join(self.static_dir, filename)
+        if path is None or not os.path.isfile(path):
+            return None
+        if self.manifest is None:
+            self.load()
+
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        immutable = filename in self.hashed
+        encoding = None
+        if immutable:
+            for name, suffix in ENCODINGS:
+                if accept_encodings[name] and os.path.isfile(path + suffix):
+                    path += suffix
+                    encoding = name
+                    break
+        cache_control = IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL
+        return path, mimetype, encoding, self.etag(path), cache_control
+
+    def etag(self, path):
+        """Return a strong ETag derived from the file's contents"""
+        stat = os.stat(path)
+        with self.lock:
+            cached = self.etags.get(path)
+        if cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+            return cached[2]
+        with open(path, 'rb') as f:
+            etag = content_hash(f.read())
+        with self.lock:
+            self.etags[path] = (stat.st_mtime_ns, stat.st_size, etag)
+        return etag
@@ -0,0 +1,161 @@
+import hashlib
+import os
+import threading
+import time
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Directory holding synthesized speech files
+AUDIO_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'audio_cache')
+
+# Total size the cache may grow to before the least recently used files are removed
+AUDIO_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# Model sentences spoken in voice turns are rarely heard twice, so they get their own
+# smaller cache and never push the prewarmed phrases out of the main one
+VOICE_TURN_CACHE_DIR = os.path.join(AUDIO_CACHE_DIR, 'voice_turns')
+VOICE_TURN_CACHE_MAX_BYTES = 16 * 1024 * 1024
+
+AUDIO_EXTENSION = '.wav'
+
+# Scratch files older than this are leftovers of a crash; younger ones may belong to another process
+STALE_TEMP_SECONDS = 300
+
+
+class AudioCache:
+    """Content-addressed, size-bounded LRU cache of synthesized speech files on disk.
+
+    The directory is created and indexed on first use, so constructing a cache
+    (at import, or in a worker process that never speaks) touches no files.
+    """
+
+    def __init__(self, directory=AUDIO_CACHE_DIR, max_bytes=AUDIO_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.loaded = False
+
+    @staticmethod
+    def make_key(text, voice_id, rate):
+        """Return the cache key for text spoken with a given voice and rate"""
+        material = f"{voice_id}\0{rate}\0{text.strip()}"
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def path(self, key):
+        """Return the file path an entry is stored at"""
+        return os.path.join(self.directory, key + AUDIO_EXTENSION)
+
+    def load(self):
+        """Create the directory and index the files already in it; later calls do nothing"""
+        with self.lock:
+            if not self.loaded:
+                os.makedirs(self.directory, exist_ok=True)
+                self._load()
+                self.loaded = True
+
+    def temp_path(self, key):
+        """Return a scratch path to synthesize into before the file is committed"""
+        if not self.loaded:
+            self.load()
+        return os.path.join(self.directory, f"{key}.{threading.get_ident()}.tmp{AUDIO_EXTENSION}")
+
+    def get(self, key):
+        """Return the path of a cached file and mark it as recently used, or None"""
+        if not self.loaded:
+            self.load()
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+        path = self.path(key)
+        try:
+            # Keep mtime in step with recency so the order survives a restart
+            os.utime(path)
+        except OSError:
+            with self.lock:
+                self._forget(key)
+            return None
+        return path
+
+    def contains(self, key):
+        """Check for an entry without counting a hit or a miss"""
+        if not self.loaded:
+            self.load()
+        with self.lock:
+            return key in self.entries
+
+    def put(self, key, source_path):
+        """Move a synthesized file into the cache and evict old entries if needed"""
+        if not self.loaded:
+            self.load()
+        size = os.path.getsize(source_path)
+        if size == 0 or size > self.max_bytes:
+            os.remove(source_path)
+            return None
+
+        path = self.path(key)
+        os.replace(source_path, path)
+        with self.lock:
+            self._forget(key)
+            self.entries[key] = size
+            self.total_bytes += size
+            self._evict()
+        return path
+
+    def stats(self):
+        """Return hit, miss and size counters"""
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    def _load(self):
+        # Rebuild the LRU order from what is already on disk, oldest first
+        files = []
+        now = time.time()
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith('.tmp' + AUDIO_EXTENSION):
+                try:
+                    if now - os.path.getmtime(path) > STALE_TEMP_SECONDS:
+                        os.remove(path)
+                except OSError:
+                    pass
+            elif name.endswith(AUDIO_EXTENSION):
+                stat = os.stat(path)
+                files.append((stat.st_mtime, name[:-len(AUDIO_EXTENSION)], stat.st_size))
+
+        for _, key, size in sorted(files):
+            self.entries[key] = size
+            self.total_bytes += size
+        self._evict()
+        logger.info("Audio cache loaded %d files (%d bytes)", len(self.entries), self.total_bytes)
+
+    def _forget(self, key):
+        size = self.entries.pop(key, None)
+        if size is not None:
+            self.total_bytes -= size
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and self.entries:
+            key, size = self.entries.popitem(last=False)
+            self.total_bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(self.path(key))
+            except OSError as e:
+                logger.error("Error removing cached audio %s: %s", key, e)
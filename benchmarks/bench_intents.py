@@ -0,0 +1,67 @@
+"""Compare the compiled intent router with the old chain of substring checks.
+
+Usage: python benchmarks/bench_intents.py
+"""
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from intents import Intent, IntentRouter
+
+RULE_COUNTS = [10, 100, 1000]
+WORDS = ["weather", "music", "timer", "alarm", "recipe", "news", "battery", "volume", "light", "order",
+         "refund", "shipping", "account", "password", "calendar", "reminder", "traffic", "joke", "score", "price"]
+
+# Typical inputs; most fall through to the model, which is the worst case for the chain
+INPUTS = [
+    "Can you explain how photosynthesis works in simple terms?",
+    "What's your name?",
+    "Tell me something interesting about the history of Rome",
+    "how do i reset my account password for the shop",
+    "Write a short poem about the sea at night",
+]
+
+
+# Function to generate synthetic intents
+def make_intents(count):
+    """Build count intents with three two-word phrases each"""
+    rng = random.Random(count)
+    intents = [Intent("name", ["your name"], "My name is Lisa.")]
+    for i in range(count - 1):
+        phrases = [f"{rng.choice(WORDS)} {rng.choice(WORDS)} {i}" for _ in range(3)]
+        intents.append(Intent(f"faq_{i}", phrases, f"Answer {i}."))
+    return intents
+
+
+# Function reproducing the original if/elif substring chain
+def chain_respond(intents, user_input):
+    """Check every phrase of every intent in order"""
+    for intent in intents:
+        for phrase in intent.phrases:
+            if phrase in user_input.lower():
+                return intent.response
+    return None
+
+
+def main():
+    print(f"{'rules':>6} {'chain us/op':>12} {'router us/op':>13} {'speedup':>8}")
+    for count in RULE_COUNTS:
+        intents = make_intents(count)
+        router = IntentRouter(intents)
+
+        # Both implementations must agree before their timings mean anything
+        for text in INPUTS:
+            assert chain_respond(intents, text) == router.respond(text), text
+
+        runs = 2000
+        chain = timeit.timeit(lambda: [chain_respond(intents, t) for t in INPUTS], number=runs)
+        routed = timeit.timeit(lambda: [router.respond(t) for t in INPUTS], number=runs)
+        ops = runs * len(INPUTS)
+        print(f"{count:>6} {chain / ops * 1e6:>12.2f} {routed / ops * 1e6:>13.2f} {chain / routed:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Measure what a log call costs the thread that makes it, with the old setup and the queued JSON one.
+
+Each case logs a model answer of --answer-chars characters to a file:
+the old way (a stream handler writing an eagerly formatted f-string) and
+through the queue handler (a lazily formatted, truncated JSON record
+written by a background thread). Only the time spent in the calling thread
+is counted, since that is what a request waits for.
+
+Usage: python benchmarks/bench_logging.py [--calls 20000] [--answer-chars 4000]
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from logs import JsonFormatter, QueueLogHandler, QUEUE_SIZE
+
+
+def per_call_us(logger, calls, log):
+    start = time.perf_counter()
+    for i in range(calls):
+        log(logger, i)
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--calls', type=int, default=20000)
+    parser.add_argument('--answer-chars', type=int, default=4000)
+    args = parser.parse_args()
+
+    answer = {'model': 'llama3.2', 'message': {'role': 'assistant', 'content': 'x' * args.answer_chars}}
+
+    with tempfile.TemporaryDirectory() as directory:
+        old = logging.FileHandler(os.path.join(directory, 'old.log'))
+        old.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+        new_output = logging.FileHandler(os.path.join(directory, 'new.log'))
+        new_output.setFormatter(JsonFormatter())
+        # Big enough that this run never drops records
+        queued = QueueLogHandler(new_output, max(QUEUE_SIZE, args.calls))
+        queued.start()
+
+        cases = [
+            ("sync, f-string at INFO", old, logging.INFO, lambda log, i: log.info(f"Ollama Response: {answer}")),
+            ("queued JSON, lazy at INFO", queued, logging.INFO, lambda log, i: log.info("Ollama response: %s", answer)),
+            ("queued JSON, lazy at DEBUG (off)", queued, logging.INFO,
+             lambda log, i: log.debug("Ollama response: %s", answer)),
+            ("queued JSON, short line", queued, logging.INFO, lambda log, i: log.info(f"Time to first token: {i} ms")),
+        ]
+        print(f"{'case':<34} {'us/call':>8}")
+        for name, handler, level, log in cases:
+            logger = logging.getLogger(f"bench.{len(name)}.{id(handler)}")
+            logger.propagate = False
+            logger.handlers = [handler]
+            logger.setLevel(level)
+            print(f"{name:<34} {per_call_us(logger, args.calls, log):>8.2f}")
+
+        start = time.perf_counter()
+        queued.stop()
+        print(f"background writer drained the rest in {(time.perf_counter() - start) * 1000:.0f} ms")
+        old.close()
+        new_output.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+"""Measure the cost of recording metrics, to keep instrumentation negligible next to the stages it times.
+
+Usage: python benchmarks/bench_metrics.py [--calls 200000] [--threads 4]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from metrics import Counter, Histogram, Registry
+
+
+def per_call_ns(fn, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - start) / calls * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--calls', type=int, default=200000)
+    parser.add_argument('--threads', type=int, default=4)
+    args = parser.parse_args()
+
+    registry = Registry()
+    histogram = Histogram('bench_seconds', "benchmark", registry=registry)
+    labelled = Histogram('bench_stage_seconds', "benchmark", ['stage'], registry=registry)
+    counter = Counter('bench_total', "benchmark", ['source'], registry=registry)
+    stage = labelled.labels('recognize')
+
+    baseline = per_call_ns(lambda: None, args.calls)
+    print(f"{'operation':>28} {'ns/call':>8}")
+    for label, fn in (('histogram observe', lambda: histogram.observe(0.3)),
+                      ('labelled observe (cached)', lambda: stage.observe(0.3)),
+                      ('labelled observe (lookup)', lambda: labelled.labels('recognize').observe(0.3)),
+                      ('counter labels + inc', lambda: counter.labels('model').inc())):
+        print(f"{label:>28} {per_call_ns(fn, args.calls) - baseline:>8.0f}")
+
+    # Contended recording from several threads at once
+    calls = args.calls // args.threads
+    threads = [threading.Thread(target=per_call_ns, args=(lambda: histogram.observe(0.3), calls))
+               for _ in range(args.threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    contended = (time.perf_counter() - start) / (calls * args.threads) * 1e9
+    print(f"{f'observe, {args.threads} threads':>28} {contended - baseline:>8.0f}")
+
+    start = time.perf_counter()
+    text = registry.render()
+    print(f"render: {(time.perf_counter() - start) * 1000:.2f} ms for {len(text.splitlines())} lines")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+"""Measure cold start time of the web app and check that importing it has no side effects.
+
+Each run imports the app in a fresh interpreter, then serves one request
+for the main page with the test client. Besides timings, the child
+reports which slow libraries were imported and which threads were
+started, since importing the app should do neither.
+
+Usage: python benchmarks/bench_startup.py [--module app] [--runs 5] [--budget-ms 800]
+
+Exits with status 1 when the median import time exceeds the budget or
+the import has side effects, so it can run in CI.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# Libraries that should only be imported when first needed
+LAZY_MODULES = ['ollama', 'speech_recognition', 'pyttsx3', 'numpy', 'pocketsphinx', 'vosk']
+
+CHILD = """
+import json, sys, threading, time
+start = time.perf_counter()
+module = __import__(sys.argv[1])
+imported = time.perf_counter()
+loaded = [name for name in json.loads(sys.argv[2]) if name in sys.modules]
+threads = [thread.name for thread in threading.enumerate() if thread is not threading.main_thread()]
+if sys.argv[1] == 'asgi':
+    import asyncio
+    async def first_request():
+        return (await module.app.test_client().get('/')).status_code
+    status = asyncio.run(first_request())
+else:
+    status = module.app.test_client().get('/').status_code
+served = time.perf_counter()
+print(json.dumps({'import_ms': (imported - start) * 1000, 'first_request_ms': (served - imported) * 1000,
+                  'status': status, 'loaded': loaded, 'threads': threads}))
+"""
+
+
+def run_once(module):
+    # Templates must already exist; starting the app no longer writes them
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+    result = subprocess.run([sys.executable, '-c', CHILD, module, json.dumps(LAZY_MODULES)], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--module', default='app', choices=['app', 'asgi'])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=800.0)
+    args = parser.parse_args()
+
+    results = [run_once(args.module) for _ in range(args.runs)]
+    import_ms = [r['import_ms'] for r in results]
+    request_ms = [r['first_request_ms'] for r in results]
+    print(f"{args.runs} cold starts of {args.module}")
+    print(f"{'':>14} {'median ms':>10} {'min ms':>8} {'max ms':>8}")
+    for label, values in (('import', import_ms), ('first request', request_ms)):
+        print(f"{label:>14} {statistics.median(values):>10.0f} {min(values):>8.0f} {max(values):>8.0f}")
+
+    loaded = sorted({name for r in results for name in r['loaded']})
+    threads = sorted({name for r in results for name in r['threads']})
+    statuses = sorted({r['status'] for r in results})
+    print(f"slow libraries imported eagerly: {', '.join(loaded) or 'none'}")
+    print(f"threads started on import: {', '.join(threads) or 'none'}")
+
+    ok = statistics.median(import_ms) <= args.budget_ms and not loaded and not threads and statuses == [200]
+    print("PASS" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""Compare speech recognition backends on a directory of WAV files.
+
+Each foo.wav may have a foo.txt next to it with the expected transcript;
+when present, the word error rate is reported too.
+
+Usage: python benchmarks/bench_stt_backends.py CORPUS_DIR [--backends sphinx vosk]
+"""
+import argparse
+import glob
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import speech_recognition as sr
+
+from recognizers import BACKENDS, load_backend, read_audio
+
+
+# Function to compute the word error rate of a hypothesis
+def word_error_rate(reference, hypothesis):
+    """Levenshtein distance over words divided by the reference length"""
+    ref = reference.lower().split()
+    hyp = hypothesis.lower().split()
+    previous = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        current = [i]
+        for j, hyp_word in enumerate(hyp, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref_word != hyp_word)))
+        previous = current
+    return previous[-1] / max(len(ref), 1)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('corpus')
+    parser.add_argument('--backends', nargs='+', default=sorted(BACKENDS))
+    args = parser.parse_args()
+
+    files = sorted(glob.glob(os.path.join(args.corpus, '*.wav')))
+    if not files:
+        print(f"No WAV files in {args.corpus}")
+        return 1
+    clips = [(path, read_audio(path)) for path in files]
+    audio_seconds = sum(len(audio.frame_data) / audio.sample_rate / audio.sample_width for _, audio in clips)
+
+    print(f"{len(clips)} clips, {audio_seconds:.1f}s of audio")
+    print(f"{'backend':>8} {'load ms':>8} {'avg ms':>8} {'p50 ms':>8} {'max ms':>8} {'RTF':>6} {'WER':>6}")
+    for name in args.backends:
+        try:
+            start = time.perf_counter()
+            backend = load_backend(name)
+            load_ms = (time.perf_counter() - start) * 1000
+        except Exception as e:
+            print(f"{name:>8} unavailable: {e}")
+            continue
+
+        latencies = []
+        errors = []
+        for path, audio in clips:
+            start = time.perf_counter()
+            try:
+                text = backend.recognize(audio)
+            except sr.UnknownValueError:
+                text = ""
+            except Exception as e:
+                print(f"{name:>8} failed on {os.path.basename(path)}: {e}")
+                text = ""
+            latencies.append((time.perf_counter() - start) * 1000)
+
+            reference_path = os.path.splitext(path)[0] + '.txt'
+            if os.path.exists(reference_path):
+                with open(reference_path, encoding='utf-8') as f:
+                    errors.append(word_error_rate(f.read(), text))
+
+        wer = f"{statistics.mean(errors):.2f}" if errors else "-"
+        rtf = sum(latencies) / 1000 / audio_seconds if audio_seconds else 0.0
+        print(f"{name:>8} {load_ms:>8.0f} {statistics.mean(latencies):>8.1f} {statistics.median(latencies):>8.1f} "
+              f"{max(latencies):>8.1f} {rtf:>6.2f} {wer:>6}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,76 @@
+"""Measure recognition throughput of the process pool as the worker count grows.
+
+Usage: python benchmarks/bench_stt_pool.py [CORPUS_DIR] [--backend sphinx] [--jobs 32]
+
+Without a corpus, one-second clips of synthetic noise are used, which is
+enough to exercise the decoder's CPU cost.
+"""
+import argparse
+import glob
+import os
+import random
+import struct
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import speech_recognition as sr
+
+from recognizers import read_audio
+from stt_pool import RecognitionPool
+
+SAMPLE_RATE = 16000
+
+
+# Function to build a clip of low-level noise
+def noise_clip(seconds, seed):
+    """Return AudioData with random 16-bit samples"""
+    rng = random.Random(seed)
+    samples = [rng.randint(-2000, 2000) for _ in range(int(SAMPLE_RATE * seconds))]
+    return sr.AudioData(struct.pack(f"<{len(samples)}h", *samples), SAMPLE_RATE, 2)
+
+
+def run(pool, clips, jobs):
+    def one(i):
+        try:
+            pool.recognize(clips[i % len(clips)])
+        except sr.UnknownValueError:
+            pass
+
+    start = time.perf_counter()
+    # Keep every worker busy without overflowing the bounded job queue
+    with ThreadPoolExecutor(max_workers=pool.max_pending) as threads:
+        list(threads.map(one, range(jobs)))
+    return jobs / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('corpus', nargs='?')
+    parser.add_argument('--backend', default='sphinx')
+    parser.add_argument('--jobs', type=int, default=32)
+    args = parser.parse_args()
+
+    if args.corpus:
+        clips = [read_audio(path) for path in sorted(glob.glob(os.path.join(args.corpus, '*.wav')))]
+    else:
+        clips = [noise_clip(1.0, seed) for seed in range(8)]
+
+    cores = os.cpu_count() or 1
+    counts = sorted({1, 2, 4, cores} & set(range(1, cores + 1)))
+    baseline = None
+    print(f"{'workers':>8} {'jobs/s':>8} {'speedup':>8}")
+    for workers in counts:
+        pool = RecognitionPool(args.backend, workers)
+        pool.preload()
+        throughput = run(pool, clips, args.jobs)
+        pool.shutdown()
+        baseline = baseline or throughput
+        print(f"{workers:>8} {throughput:>8.2f} {throughput / baseline:>7.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+"""Measure sustained transcript write throughput, and what storing a turn costs the request that makes it.
+
+Request threads store --turns conversation turns between them, first by
+committing each turn to SQLite themselves (what writing from api_response
+would do), then through TranscriptStore, which only buffers the turn and
+leaves the batched writes to its background thread. Throughput counts
+until every turn is on disk; the per-call figures are the time a request
+thread spends storing its turn. Finally the indexed queries by session and
+by time range are timed against the filled database.
+
+Usage: python benchmarks/bench_transcripts.py [--turns 50000] [--threads 8] [--sessions 500]
+"""
+import argparse
+import math
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from transcripts import TranscriptStore, BATCH_SIZE, SCHEMA
+
+ANSWER = "Paris is the capital of France. It is known for the Eiffel Tower and the Louvre. " * 3
+
+
+# Function to pick a nearest-rank percentile
+def percentile(sorted_values, fraction):
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+
+# Function to run the request threads and time each store call
+def run_threads(threads, turns, sessions, store_turn):
+    """Return (per-call seconds, wall seconds) for turns spread over threads"""
+    timings = [[] for _ in range(threads)]
+
+    def work(index):
+        calls = timings[index]
+        for i in range(index, turns, threads):
+            start = time.perf_counter()
+            store_turn(f"session-{i % sessions}", f"question {i}", ANSWER)
+            calls.append(time.perf_counter() - start)
+
+    workers = [threading.Thread(target=work, args=(index,)) for index in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return sorted(t for calls in timings for t in calls), time.perf_counter() - start
+
+
+def report(name, calls, elapsed, turns):
+    print(f"{name:<26} {turns / elapsed:>10.0f} {percentile(calls, 0.5) * 1e6:>9.1f} "
+          f"{percentile(calls, 0.99) * 1e6:>9.1f} {calls[-1] * 1e3:>9.2f}")
+
+
+# Function to store every turn with its own commit on the calling thread
+def per_turn_commits(path, args):
+    connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.executescript(SCHEMA)
+    lock = threading.Lock()
+
+    def store_turn(session_id, user_text, response):
+        with lock, connection:
+            connection.execute("INSERT INTO turns (created, session_id, request_id, source, user_text, response) "
+                               "VALUES (?, ?, ?, ?, ?, ?)", (time.time(), session_id, None, 'model', user_text, response))
+
+    calls, elapsed = run_threads(args.threads, args.turns, args.sessions, store_turn)
+    connection.close()
+    return calls, elapsed
+
+
+# Function to store every turn through the buffered, batching store
+def batched(path, args):
+    store = TranscriptStore(path, batch_size=args.batch_size, max_pending=args.turns)
+    calls, elapsed = run_threads(args.threads, args.turns, args.sessions,
+                                 lambda session_id, user_text, response: store.record(session_id, user_text, response, 'model'))
+    # Throughput only counts once everything is on disk
+    start = time.perf_counter()
+    store.flush()
+    elapsed += time.perf_counter() - start
+    stats = store.stats()
+    store.close()
+    return calls, elapsed, stats, store
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--turns', type=int, default=50000)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--sessions', type=int, default=500)
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"{args.turns} turns from {args.threads} threads")
+        print(f"{'case':<26} {'turns/s':>10} {'p50 us':>9} {'p99 us':>9} {'max ms':>9}")
+        calls, elapsed = per_turn_commits(os.path.join(directory, 'per_turn.db'), args)
+        report("commit per turn", calls, elapsed, args.turns)
+        calls, elapsed, stats, store = batched(os.path.join(directory, 'batched.db'), args)
+        report("TranscriptStore batched", calls, elapsed, args.turns)
+        print(f"  {stats['batches']} batches of {stats['batch_avg_rows']} turns, "
+              f"{stats['batch_avg_ms']} ms on average, {stats['dropped']} dropped, {stats['failed']} failed")
+
+        start = time.perf_counter()
+        history = store.session("session-7")
+        session_ms = (time.perf_counter() - start) * 1000
+        middle = history[len(history) // 2]['created']
+        start = time.perf_counter()
+        window = store.between(middle, middle + 0.01, limit=args.turns)
+        range_ms = (time.perf_counter() - start) * 1000
+        print(f"query by session: {len(history)} turns in {session_ms:.2f} ms; "
+              f"by time range: {len(window)} turns in {range_ms:.2f} ms")
+
+        connection = sqlite3.connect(store.path)
+        count = connection.execute("SELECT COUNT(*) FROM turns").fetchone()[0]
+        connection.close()
+    ok = count == args.turns and not stats['dropped'] and not stats['failed']
+    print(f"{count} of {args.turns} turns stored")
+    print("PASS" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
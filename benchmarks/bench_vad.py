@@ -0,0 +1,127 @@
+"""Measure how much audio silence trimming removes and what it does to recognition latency.
+
+Usage: python benchmarks/bench_vad.py [CORPUS_DIR] [--backend sphinx] [--save DIR]
+
+Without a corpus, synthetic fixtures are generated: bursts of speech-like
+harmonic sound surrounded by quiet room noise, plus a few clips of pure
+silence. --save writes them out as WAV files for reuse.
+"""
+import argparse
+import glob
+import os
+import statistics
+import sys
+import time
+import wave
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import numpy as np
+import speech_recognition as sr
+
+from recognizers import load_backend, read_audio
+from vad import SilenceTrimmer
+
+SAMPLE_RATE = 16000
+
+
+# Function to synthesize a speech-like signal
+def voiced(rng, seconds):
+    """Harmonics of a wandering pitch, gated at a syllable rate; white noise makes a poor stand-in"""
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    pitch = 120 + 30 * np.sin(2 * np.pi * 0.7 * t + rng.uniform(0, 6))
+    phase = 2 * np.pi * np.cumsum(pitch) / SAMPLE_RATE
+    signal = sum(np.sin(k * phase) / k for k in range(1, 12))
+    envelope = np.sqrt(np.clip(np.sin(2 * np.pi * 4 * t + rng.uniform(0, 6)), 0, None))
+    return 3000 * signal * envelope
+
+
+# Function to build one synthetic recording
+def fixture(rng, lead, speech, tail, bursts=1):
+    """Return AudioData with `bursts` stretches of speech between quiet room noise"""
+    parts = [np.zeros(int(lead * SAMPLE_RATE))]
+    for i in range(bursts):
+        if i:
+            parts.append(np.zeros(int(0.8 * SAMPLE_RATE)))
+        parts.append(voiced(rng, speech))
+    parts.append(np.zeros(int(tail * SAMPLE_RATE)))
+    samples = np.concatenate(parts)
+    samples += rng.normal(0, 60, len(samples))
+    return sr.AudioData(np.clip(samples, -32768, 32767).astype('<i2').tobytes(), SAMPLE_RATE, 2)
+
+
+def synthetic_corpus():
+    rng = np.random.default_rng(0)
+    clips = [(f"speech_{i:02d}", fixture(rng, rng.uniform(0.5, 2.0), rng.uniform(1.0, 3.0), rng.uniform(0.5, 2.5),
+                                         bursts=int(rng.integers(1, 4))))
+             for i in range(20)]
+    clips += [(f"silence_{i:02d}", fixture(rng, 2.0, 0.0, 1.0)) for i in range(4)]
+    return clips
+
+
+def save(clips, directory):
+    os.makedirs(directory, exist_ok=True)
+    for name, audio in clips:
+        with wave.open(os.path.join(directory, f"{name}.wav"), 'wb') as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(audio.sample_width)
+            wav.setframerate(audio.sample_rate)
+            wav.writeframes(audio.frame_data)
+
+
+def recognize(backend, audio):
+    try:
+        return backend.recognize(audio)
+    except sr.UnknownValueError:
+        return ""
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('corpus', nargs='?')
+    parser.add_argument('--backend', default='sphinx')
+    parser.add_argument('--save')
+    args = parser.parse_args()
+
+    if args.corpus:
+        clips = [(os.path.basename(path), read_audio(path))
+                 for path in sorted(glob.glob(os.path.join(args.corpus, '*.wav')))]
+    else:
+        clips = synthetic_corpus()
+    if args.save:
+        save(clips, args.save)
+
+    backend = load_backend(args.backend)
+    trimmer = SilenceTrimmer()
+    full_ms = []
+    trimmed_ms = []
+    vad_ms = []
+    rejected = 0
+    for name, audio in clips:
+        start = time.perf_counter()
+        recognize(backend, audio)
+        full_ms.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        segments = trimmer.split(audio)
+        vad_ms.append((time.perf_counter() - start) * 1000)
+        for segment in segments:
+            recognize(backend, segment)
+        trimmed_ms.append((time.perf_counter() - start) * 1000)
+        rejected += not segments
+
+    stats = trimmer.stats()
+    print(f"{len(clips)} clips, {stats['audio_seconds_in']:.1f}s of audio, "
+          f"{stats['audio_seconds_kept']:.1f}s kept ({stats['saved_ratio'] * 100:.0f}% saved), "
+          f"{rejected} rejected as silence")
+    print(f"VAD cost: avg {statistics.mean(vad_ms):.2f} ms, max {max(vad_ms):.2f} ms per clip")
+    print(f"{'':>10} {'avg ms':>8} {'p50 ms':>8} {'max ms':>8} {'total s':>8}")
+    for label, latencies in (('full', full_ms), ('trimmed', trimmed_ms)):
+        print(f"{label:>10} {statistics.mean(latencies):>8.1f} {statistics.median(latencies):>8.1f} "
+              f"{max(latencies):>8.1f} {sum(latencies) / 1000:>8.2f}")
+    print(f"latency change: {(sum(trimmed_ms) / sum(full_ms) - 1) * 100:+.0f}%")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
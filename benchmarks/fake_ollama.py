@@ -0,0 +1,154 @@
+"""A stand-in for the Ollama HTTP API that streams canned tokens at a configurable pace.
+
+It answers /api/chat (streaming and not), /api/generate, /api/embeddings,
+/api/embed, /api/ps and /api/version, enough for Lisa and the Python
+client. Point the app at it with OLLAMA_HOST=http://127.0.0.1:PORT.
+
+Usage: python benchmarks/fake_ollama.py [--port 11435] [--first-token-ms 200] [--tokens-per-second 40]
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Answer streamed for every prompt; several sentences so the speech pipeline has work to do
+ANSWER = ("Sure, here is a short answer. Lisa is a voice assistant that runs on your own machine. "
+          "It listens, thinks with a local model and speaks the reply. Is there anything else?")
+
+
+class FakeOllamaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, first_token_ms=200.0, tokens_per_second=40.0, answer=ANSWER, embedding_size=768):
+        super().__init__(address, FakeOllamaHandler)
+        self.first_token_ms = first_token_ms
+        self.tokens_per_second = tokens_per_second
+        self.tokens = [word + ' ' for word in answer.split(' ')]
+        self.embedding_size = embedding_size
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.loaded = set()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Serve on a background thread and return self"""
+        threading.Thread(target=self.serve_forever, name="fake-ollama", daemon=True).start()
+        return self
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path == '/api/version':
+            self._json({'version': '0.0.0-fake'})
+        elif self.path == '/api/ps':
+            with self.server.lock:
+                models = [{'model': name, 'name': name, 'size': 0, 'digest': ''} for name in sorted(self.server.loaded)]
+            self._json({'models': models})
+        else:
+            self._json({'error': 'not found'}, 404)
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length) or b'{}')
+        model = body.get('model', 'llama3.2')
+        model = model if ':' in model else f"{model}:latest"
+        with self.server.lock:
+            self.server.requests += 1
+            self.server.loaded.add(model)
+
+        if self.path == '/api/chat':
+            self._generate(body, lambda text, done: {'message': {'role': 'assistant', 'content': text}})
+        elif self.path == '/api/generate':
+            self._generate(body, lambda text, done: {'response': text})
+        elif self.path == '/api/embeddings':
+            self._json({'embedding': self._embedding(body.get('prompt', ''))})
+        elif self.path == '/api/embed':
+            inputs = body.get('input', '')
+            inputs = inputs if isinstance(inputs, list) else [inputs]
+            self._json({'model': model, 'embeddings': [self._embedding(text) for text in inputs]})
+        else:
+            self._json({'error': 'not found'}, 404)
+
+    def _generate(self, body, shape):
+        server = self.server
+        tokens = server.tokens
+        limit = (body.get('options') or {}).get('num_predict')
+        if limit:
+            tokens = tokens[:limit]
+        interval = 1.0 / server.tokens_per_second if server.tokens_per_second > 0 else 0.0
+        base = {'model': body.get('model', ''), 'created_at': datetime.now(timezone.utc).isoformat()}
+
+        if not body.get('stream', True):
+            time.sleep(server.first_token_ms / 1000 + interval * max(len(tokens) - 1, 0))
+            self._json(dict(base, done=True, done_reason='stop', **shape(''.join(tokens), True)))
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        time.sleep(server.first_token_ms / 1000)
+        try:
+            for i, token in enumerate(tokens):
+                if i:
+                    time.sleep(interval)
+                self._chunk(dict(base, done=False, **shape(token, False)))
+            self._chunk(dict(base, done=True, done_reason='stop', **shape('', True)))
+            self.wfile.write(b'0\r\n\r\n')
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def _chunk(self, payload):
+        data = json.dumps(payload).encode() + b'\n'
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b'\r\n')
+        self.wfile.flush()
+
+    def _json(self, payload, status=200):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _embedding(self, text):
+        # Deterministic, so identical prompts embed identically
+        seed = sum(text.encode()) or 1
+        return [((seed * (i + 1)) % 97) / 97.0 for i in range(self.server.embedding_size)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=11435)
+    parser.add_argument('--first-token-ms', type=float, default=200.0)
+    parser.add_argument('--tokens-per-second', type=float, default=40.0)
+    args = parser.parse_args()
+
+    server = FakeOllamaServer(('127.0.0.1', args.port), args.first_token_ms, args.tokens_per_second)
+    print(f"Fake Ollama listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,348 @@
+"""Drive open- and closed-loop load at the Flask app and report latency percentiles per endpoint.
+
+The app runs in-process behind a real threaded HTTP server, with the
+model replaced by fake_ollama.py (configurable first-token delay and token
+rate), speech synthesis by a null engine that writes silent WAVs, and
+recognition by a stand-in with a fixed delay, so results measure Lisa's
+own overhead and concurrency behaviour rather than the model's.
+
+Closed loop: --users clients each send a request, wait for the whole
+answer, then send the next. Open loop: requests arrive as a Poisson
+process at --rate per second whether or not earlier ones have finished;
+latency is measured from the scheduled arrival, so queueing is not hidden.
+
+Results are printed and saved as JSON, tagged with the git commit, so runs
+can be compared across commits with --compare.
+
+Usage: python benchmarks/loadtest.py [--endpoints response stream stt voice-turn] [--modes closed open]
+                                     [--duration 10] [--users 4] [--rate 5] [--first-token-ms 200]
+                                     [--tokens-per-second 40] [--ollama-hosts 1] [--fixtures DIR] [--output FILE] [--compare FILE]
+"""
+import argparse
+import glob
+import http.client
+import io
+import itertools
+import json
+import logging
+import math
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import wave
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+from fake_ollama import FakeOllamaServer
+
+SAMPLE_RATE = 16000
+
+ENDPOINTS = ('response', 'stream', 'stt', 'voice-turn')
+MODES = ('closed', 'open')
+
+# Topics for prompts; each request gets a unique one so nothing is coalesced or cached
+TOPICS = ["the history of tea", "how rainbows form", "why cats purr", "the tallest mountains",
+          "how bridges stay up", "what makes bread rise", "how bees communicate", "the speed of light"]
+
+
+class NullEngine:
+    """pyttsx3 look-alike that writes silent WAVs after a delay proportional to the text length"""
+
+    def __init__(self, seconds_per_char):
+        self.seconds_per_char = seconds_per_char
+        self.pending = []
+
+    def connect(self, name, callback):
+        pass
+
+    def getProperty(self, name):
+        return 'null-voice' if name == 'voice' else None
+
+    def setProperty(self, name, value):
+        pass
+
+    def stop(self):
+        pass
+
+    def say(self, text):
+        self.pending.append((text, None))
+
+    def save_to_file(self, text, path):
+        self.pending.append((text, path))
+
+    def runAndWait(self):
+        pending, self.pending = self.pending, []
+        for text, path in pending:
+            time.sleep(len(text) * self.seconds_per_char)
+            if path is not None:
+                # 10 ms of silence per character, roughly a real voice's pace
+                with wave.open(path, 'wb') as wav:
+                    wav.setnchannels(1)
+                    wav.setsampwidth(2)
+                    wav.setframerate(SAMPLE_RATE)
+                    wav.writeframes(bytes(len(text) * SAMPLE_RATE // 100 * 2))
+
+
+# Function to load or synthesize the WAV uploads
+def load_fixtures(directory):
+    """Return a list of WAV files as bytes, from a directory or generated speech-like clips"""
+    if directory:
+        paths = sorted(glob.glob(os.path.join(directory, '*.wav')))
+        if not paths:
+            raise SystemExit(f"No WAV files in {directory}")
+        return [open(path, 'rb').read() for path in paths]
+
+    import numpy as np
+    from bench_vad import fixture
+    rng = np.random.default_rng(0)
+    clips = []
+    for _ in range(8):
+        audio = fixture(rng, rng.uniform(0.2, 0.6), rng.uniform(1.0, 2.5), rng.uniform(0.2, 0.6))
+        buffer = io.BytesIO()
+        with wave.open(buffer, 'wb') as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(audio.sample_width)
+            wav.setframerate(audio.sample_rate)
+            wav.writeframes(audio.frame_data)
+        clips.append(buffer.getvalue())
+    return clips
+
+
+# Function to start Lisa with every external dependency replaced
+def start_app(args, ollama_urls, audio_dir):
+    """Import the app against the fake model hosts, install the stand-ins and serve it; returns the server"""
+    os.environ['LISA_OLLAMA_HOSTS'] = ','.join(ollama_urls)
+    os.environ['LISA_STT_WORKERS'] = '0'
+    os.environ['LISA_STT_BACKEND'] = 'google'
+    os.environ['LISA_TRANSCRIPTS_DB'] = os.path.join(audio_dir, 'transcripts.db')
+
+    import speech_recognition as sr
+    from werkzeug.serving import make_server
+
+    import app as lisa
+    import tts
+    from audio_cache import AudioCache
+
+    # Keep per-request logging from dominating the measurement. Werkzeug sets its own logger to INFO
+    # when it is unset and would still write an access line for every request
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+    transcripts = itertools.count()
+
+    def recognize(recognizer, audio_data, *_, **__):
+        time.sleep(args.stt_ms / 1000)
+        return f"tell me about {TOPICS[next(transcripts) % len(TOPICS)]} {uuid.uuid4().hex[:6]}"
+
+    sr.Recognizer.recognize_google = recognize
+    tts.init_engine = lambda *_, **__: NullEngine(args.tts_ms_per_char / 1000)
+    lisa.tts_worker.audio_cache = AudioCache(audio_dir)
+    lisa.tts_worker.voice_turn_cache = AudioCache(os.path.join(audio_dir, 'voice_turns'))
+
+    lisa.warm_up()
+    if not lisa.model_warmer.ready.wait(10):
+        raise SystemExit("The app did not become ready against the fake model")
+
+    server = make_server('127.0.0.1', 0, lisa.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="lisa-http", daemon=True).start()
+    return server
+
+
+# Function to encode a WAV upload as multipart/form-data
+def multipart(wav):
+    boundary = uuid.uuid4().hex
+    body = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"audio\"; filename=\"speech.wav\"\r\n"
+            f"Content-Type: audio/wav\r\n\r\n").encode() + wav + f"\r\n--{boundary}--\r\n".encode()
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+# Function to build the request for one call to an endpoint
+def build_request(endpoint, fixtures, i):
+    """Return (path, body, content type)"""
+    if endpoint in ('response', 'stream'):
+        prompt = f"Tell me about {TOPICS[i % len(TOPICS)]}, question {i} {uuid.uuid4().hex[:6]}"
+        path = '/api/response' if endpoint == 'response' else '/api/response/stream'
+        return path, json.dumps({'message': prompt}).encode(), 'application/json'
+    body, content_type = multipart(fixtures[i % len(fixtures)])
+    return ('/api/speech-to-text' if endpoint == 'stt' else '/api/voice-turn'), body, content_type
+
+
+# Function to send one request and time it
+def send(port, endpoint, fixtures, i, started=None):
+    """Return (status, first byte seconds, total seconds), timed from `started` if given"""
+    path, body, content_type = build_request(endpoint, fixtures, i)
+    start = started if started is not None else time.perf_counter()
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+    try:
+        connection.request('POST', path, body=body, headers={'Content-Type': content_type})
+        response = connection.getresponse()
+        # Streaming endpoints send their headers with the first token or the first audio
+        first_byte = time.perf_counter() - start
+        response.read()
+        return response.status, first_byte, time.perf_counter() - start
+    except Exception as e:
+        return type(e).__name__, None, time.perf_counter() - start
+    finally:
+        connection.close()
+
+
+# Function to keep a fixed number of clients busy
+def closed_loop(port, endpoint, fixtures, users, duration):
+    results = []
+    counter = itertools.count()
+    deadline = time.perf_counter() + duration
+
+    def user():
+        while time.perf_counter() < deadline:
+            results.append(send(port, endpoint, fixtures, next(counter)))
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=user, daemon=True) for _ in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, time.perf_counter() - start
+
+
+# Function to send requests at Poisson arrival times regardless of how fast they are answered
+def open_loop(port, endpoint, fixtures, rate, duration, seed=0):
+    rng = random.Random(seed)
+    futures = []
+    start = time.perf_counter()
+    arrival = start
+    # Enough threads that the sender never waits for a free one; latency includes any server-side queueing
+    with ThreadPoolExecutor(max_workers=256) as pool:
+        for i in itertools.count():
+            arrival += rng.expovariate(rate)
+            if arrival - start >= duration:
+                break
+            time.sleep(max(0.0, arrival - time.perf_counter()))
+            futures.append(pool.submit(send, port, endpoint, fixtures, i, arrival))
+        results = [future.result() for future in futures]
+    return results, time.perf_counter() - start
+
+
+# Function to pick a percentile from sorted samples
+def percentile(values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not values:
+        return None
+    return values[max(0, math.ceil(pct / 100 * len(values)) - 1)]
+
+
+def summarize(endpoint, mode, results, elapsed):
+    ok = sorted(total for status, _, total in results if status == 200)
+    first = sorted(first for status, first, _ in results if status == 200)
+    errors = Counter(str(status) for status, _, _ in results if status != 200)
+
+    def distribution(values):
+        if not values:
+            return {'p50': None, 'p95': None, 'p99': None, 'max': None}
+        return {
+            'p50': round(percentile(values, 50) * 1000, 1),
+            'p95': round(percentile(values, 95) * 1000, 1),
+            'p99': round(percentile(values, 99) * 1000, 1),
+            'max': round(values[-1] * 1000, 1),
+        }
+
+    return {
+        'endpoint': endpoint,
+        'mode': mode,
+        'requests': len(results),
+        'ok': len(ok),
+        'errors': dict(errors),
+        'seconds': round(elapsed, 2),
+        'rps': round(len(ok) / elapsed, 2) if elapsed else 0.0,
+        'latency_ms': distribution(ok),
+        'first_byte_ms': distribution(first),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_table(rows, baseline=None):
+    previous = {(row['endpoint'], row['mode']): row for row in (baseline or {}).get('results', [])}
+    print(f"{'endpoint':>11} {'mode':>6} {'reqs':>6} {'errors':>6} {'rps':>7} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'p99 ms':>8} {'ttfb p50':>9}" + (f" {'p95 vs base':>12}" if baseline else ""))
+    for row in rows:
+        latency = row['latency_ms']
+        cells = [f"{value if value is not None else '-':>8}" for value in (latency['p50'], latency['p95'], latency['p99'])]
+        line = (f"{row['endpoint']:>11} {row['mode']:>6} {row['requests']:>6} {row['requests'] - row['ok']:>6} "
+                f"{row['rps']:>7.2f} {' '.join(cells)} {row['first_byte_ms']['p50'] or '-':>9}")
+        old = previous.get((row['endpoint'], row['mode']))
+        if old and old['latency_ms']['p95'] and latency['p95']:
+            line += f" {(latency['p95'] / old['latency_ms']['p95'] - 1) * 100:>+11.0f}%"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--endpoints', nargs='+', choices=ENDPOINTS, default=list(ENDPOINTS))
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+    parser.add_argument('--duration', type=float, default=10.0, help="seconds per endpoint and mode")
+    parser.add_argument('--users', type=int, default=4, help="concurrent clients in closed-loop mode")
+    parser.add_argument('--rate', type=float, default=5.0, help="arrivals per second in open-loop mode")
+    parser.add_argument('--first-token-ms', type=float, default=200.0)
+    parser.add_argument('--tokens-per-second', type=float, default=40.0)
+    parser.add_argument('--ollama-hosts', type=int, default=1, help="fake model servers to spread calls over")
+    parser.add_argument('--stt-ms', type=float, default=50.0, help="stand-in recognizer delay")
+    parser.add_argument('--tts-ms-per-char', type=float, default=0.5, help="null speech engine cost")
+    parser.add_argument('--fixtures', help="directory of WAV files to upload instead of synthetic clips")
+    parser.add_argument('--output', default='loadtest-results.json')
+    parser.add_argument('--compare', help="earlier results file to compare p95 latency against")
+    args = parser.parse_args()
+
+    fake_hosts = [FakeOllamaServer(('127.0.0.1', 0), args.first_token_ms, args.tokens_per_second).start()
+                  for _ in range(args.ollama_hosts)]
+    fixtures = load_fixtures(args.fixtures)
+    with tempfile.TemporaryDirectory() as audio_dir:
+        server = start_app(args, [host.url for host in fake_hosts], audio_dir)
+        port = server.server_port
+
+        rows = []
+        for mode in args.modes:
+            for endpoint in args.endpoints:
+                if mode == 'closed':
+                    results, elapsed = closed_loop(port, endpoint, fixtures, args.users, args.duration)
+                else:
+                    results, elapsed = open_loop(port, endpoint, fixtures, args.rate, args.duration)
+                rows.append(summarize(endpoint, mode, results, elapsed))
+                print(f"  {mode:>6} {endpoint}: {rows[-1]['requests']} requests", file=sys.stderr)
+        server.shutdown()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_table(rows, baseline)
+
+    report = {
+        'commit': git_commit(),
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'config': vars(args),
+        'results': rows,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved results to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+"""Fire concurrent uploads at /api/speech-to-text and check each gets its own transcript.
+
+The recognizer is replaced by one that "transcribes" a WAV as its frame
+count, so every upload has a known, distinct expected answer and any
+cross-talk between requests shows up as a mismatch.
+
+Usage: python benchmarks/stress_speech_to_text.py [--requests 200] [--threads 16]
+"""
+import argparse
+import io
+import os
+import struct
+import sys
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import speech_recognition as sr
+
+import app as lisa
+
+SAMPLE_RATE = 16000
+LOUD = struct.pack('<h', 8000)
+QUIET = struct.pack('<h', -8000)
+
+
+# Function to build a WAV with a given number of frames
+def make_wav(frames):
+    """Return 16-bit mono WAV bytes of a loud square wave, so silence trimming keeps every frame"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes(b''.join(LOUD if (i // 40) % 2 else QUIET for i in range(frames)))
+    return buffer.getvalue()
+
+
+# Function standing in for the network recognizer
+def recognize_frame_count(recognizer, audio_data, *args, **kwargs):
+    """Transcribe audio as the number of frames it contains"""
+    # Simulate network latency so requests overlap
+    time.sleep(0.005)
+    return str(len(audio_data.frame_data) // audio_data.sample_width)
+
+
+def upload(client, frames):
+    data = {'audio': (io.BytesIO(make_wav(frames)), 'speech.wav')}
+    response = client.post('/api/speech-to-text', data=data, content_type='multipart/form-data')
+    return frames, response.status_code, response.get_json()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=16)
+    args = parser.parse_args()
+
+    sr.Recognizer.recognize_google = recognize_frame_count
+    client = lisa.app.test_client()
+
+    # Distinct lengths between 0.1 s and ~2 s of audio
+    lengths = [1600 + i * 151 for i in range(args.requests)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        results = list(pool.map(lambda frames: upload(client, frames), lengths))
+    elapsed = time.perf_counter() - start
+
+    mismatches = [(frames, status, body) for frames, status, body in results
+                  if status != 200 or body.get('text') != str(frames)]
+    print(f"{len(results)} uploads on {args.threads} threads in {elapsed:.2f}s "
+          f"({len(results) / elapsed:.0f} req/s), {len(mismatches)} mismatched")
+    for frames, status, body in mismatches[:10]:
+        print(f"  expected {frames}: HTTP {status} {body}")
+
+    # An oversized upload must be refused rather than buffered
+    too_big = upload(client, lisa.MAX_UPLOAD_BYTES // 2 + 1)
+    print(f"oversized upload: HTTP {too_big[1]}")
+
+    leftovers = [name for name in os.listdir('.') if name == 'temp_audio.wav']
+    ok = not mismatches and too_big[1] == 413 and not leftovers
+    print("PASS" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+import json
+import re
+import time
+import logging
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+# A canned answer and the phrases that trigger it
+Intent = namedtuple('Intent', ['name', 'phrases', 'response'])
+
+WORD = re.compile(r"[a-z0-9]+")
+
+
+# Function to normalize text before matching
+def normalize(text):
+    """Lowercase text, keep only words and pad it so phrases match on word boundaries"""
+    # Apostrophes are dropped first so "what's" and "whats" match the same phrase
+    return " " + " ".join(WORD.findall(text.lower().replace("'", ""))) + " "
+
+
+class IntentRouter:
+    """Match every intent phrase in a single pass using an Aho-Corasick automaton"""
+
+    def __init__(self, intents):
+        self.intents = list(intents)
+        # Node state: transitions, failure link and the best (earliest) intent ending here
+        self.goto = [{}]
+        self.fail = [0]
+        self.best = [None]
+        self._build()
+
+    @classmethod
+    def from_file(cls, path):
+        """Load intents from a JSON config file"""
+        with open(path, encoding='utf-8') as f:
+            config = json.load(f)
+        intents = [Intent(item['name'], item['phrases'], item['response']) for item in config['intents']]
+        router = cls(intents)
+        logger.info("Loaded %d intents from %s", len(intents), path)
+        return router
+
+    def match(self, text):
+        """Return the first configured intent with a phrase in text, or None"""
+        node = 0
+        best = None
+        goto, fail, found = self.goto, self.fail, self.best
+        for char in normalize(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if found[node] is not None and (best is None or found[node] < best):
+                best = found[node]
+        return self.intents[best] if best is not None else None
+
+    def respond(self, text):
+        """Return the canned answer for text, or None if no intent matches"""
+        intent = self.match(text)
+        if intent is None:
+            return None
+        if "{" not in intent.response:
+            return intent.response
+        now = time.localtime()
+        return intent.response.format(
+            time=time.strftime("%I:%M %p", now).lstrip("0"),
+            date=time.strftime("%A, %B %d, %Y", now),
+        )
+
+    def static_responses(self):
+        """Return the answers that never change, e.g. to pre-synthesize their audio"""
+        return [intent.response for intent in self.intents if "{" not in intent.response]
+
+    def _build(self):
+        # Trie of every phrase; earlier intents win when several match
+        for index, intent in enumerate(self.intents):
+            for phrase in intent.phrases:
+                node = 0
+                for char in normalize(phrase):
+                    if char not in self.goto[node]:
+                        self.goto.append({})
+                        self.fail.append(0)
+                        self.best.append(None)
+                        self.goto[node][char] = len(self.goto) - 1
+                    node = self.goto[node][char]
+                if self.best[node] is None or index < self.best[node]:
+                    self.best[node] = index
+
+        # Breadth-first pass to set failure links and inherit matches from suffixes
+        queue = list(self.goto[0].values())
+        while queue:
+            next_queue = []
+            for node in queue:
+                for char, child in self.goto[node].items():
+                    state = self.fail[node]
+                    while state and char not in self.goto[state]:
+                        state = self.fail[state]
+                    target = self.goto[state].get(char, 0)
+                    self.fail[child] = target if target != child else 0
+                    inherited = self.best[self.fail[child]]
+                    if inherited is not None and (self.best[child] is None or inherited < self.best[child]):
+                        self.best[child] = inherited
+                    next_queue.append(child)
+            queue = next_queue
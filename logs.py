@@ -0,0 +1,161 @@
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import re
+import threading
+import time
+import uuid
+
+from metrics import LOG_RECORDS_DROPPED
+
+# Correlation id of the request being handled; every log line it causes carries it
+request_id = contextvars.ContextVar('request_id', default=None)
+
+# An X-Request-ID from a proxy is reused only if it looks like an id rather than arbitrary text
+REQUEST_ID_PATTERN = re.compile(r"[A-Za-z0-9._-]{1,64}")
+
+# Records waiting for the writer thread; when full, new ones are dropped rather than blocking a request
+QUEUE_SIZE = 10000
+
+# Longest message or extra field written; the rest is cut off
+MAX_CHARS = 2000
+
+# Attributes every LogRecord has; anything else was passed with extra={...}
+STANDARD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime', 'request_id'}
+
+# Set once the writer thread has been asked to start
+background_started = False
+
+
+# Function to start the log context of a new request
+def use_request_id(incoming=None):
+    """Adopt a well-formed incoming id or make a new one, and return it"""
+    value = incoming if incoming and REQUEST_ID_PATTERN.fullmatch(incoming) else uuid.uuid4().hex[:16]
+    request_id.set(value)
+    return value
+
+
+# Function to shorten an oversized log payload
+def truncate(text, limit=MAX_CHARS):
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}... [{len(text) - limit} more chars]"
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamps records with the current request id; runs on the thread that logged them"""
+
+    def filter(self, record):
+        record.request_id = request_id.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line with the request id and any extra fields, all truncated"""
+
+    def __init__(self, max_chars=MAX_CHARS):
+        super().__init__()
+        self.max_chars = max_chars
+
+    def format(self, record):
+        entry = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': truncate(record.getMessage(), self.max_chars),
+        }
+        if getattr(record, 'request_id', None):
+            entry['request_id'] = record.request_id
+        for key, value in vars(record).items():
+            if key not in STANDARD_ATTRIBUTES:
+                entry[key] = value if value is None or isinstance(value, (bool, int, float)) else \
+                    truncate(str(value), self.max_chars)
+        if record.exc_info:
+            entry['exc'] = truncate(self.formatException(record.exc_info), self.max_chars * 4)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    """The human-readable format, with the request id and truncation"""
+
+    def __init__(self, max_chars=MAX_CHARS):
+        super().__init__('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+        self.max_chars = max_chars
+
+    def formatMessage(self, record):
+        record.message = truncate(record.message, self.max_chars)
+        if getattr(record, 'request_id', None):
+            record.message = f"[{record.request_id}] {record.message}"
+        return super().formatMessage(record)
+
+
+class QueueLogHandler(logging.handlers.QueueHandler):
+    """Hands records to a writer thread unformatted, so messages are built and written off the request path.
+
+    Arguments of %-style messages are formatted later on that thread, so pass
+    values that will not change afterwards. Until start() is called, and after
+    stop(), records are written straight away, so importing the app starts no thread.
+    """
+
+    def __init__(self, handler, queue_size=QUEUE_SIZE):
+        super().__init__(queue.Queue(queue_size))
+        self.handler = handler
+        self.listener = None
+        self.listener_lock = threading.Lock()
+        self.addFilter(RequestIdFilter())
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        if self.listener is None:
+            self.handler.handle(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+    def start(self):
+        """Start the writer thread if it is not already running"""
+        with self.listener_lock:
+            if self.listener is None:
+                self.listener = logging.handlers.QueueListener(self.queue, self.handler, respect_handler_level=True)
+                self.listener.start()
+                atexit.register(self.stop)
+
+    def stop(self):
+        """Write out everything still queued and stop the writer thread"""
+        with self.listener_lock:
+            listener, self.listener = self.listener, None
+        if listener is not None:
+            listener.stop()
+
+
+# Function to move log writing onto the background thread once the server is up
+def start_background_logging():
+    """Start the writer thread of the handler installed by configure_logging(), if any"""
+    global background_started
+    if background_started:
+        return
+    background_started = True
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, QueueLogHandler):
+            handler.start()
+
+
+# Function to route all logging through a background writer
+def configure_logging(level=logging.INFO, json_format=True, max_chars=MAX_CHARS, queue_size=QUEUE_SIZE):
+    """Like logging.basicConfig(): does nothing if the root logger already has handlers"""
+    root = logging.getLogger()
+    if root.handlers:
+        return None
+    output = logging.StreamHandler()
+    output.setFormatter(JsonFormatter(max_chars) if json_format else TextFormatter(max_chars))
+    handler = QueueLogHandler(output, queue_size)
+    root.addHandler(handler)
+    root.setLevel(level)
+    return handler
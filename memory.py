@@ -0,0 +1,155 @@
+import contextvars
+import threading
+import time
+import logging
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Tokens of recent turns sent with every prompt
+TOKEN_BUDGET = 1024
+
+# Tokens the rolling summary of older turns may use
+SUMMARY_TOKEN_BUDGET = 256
+
+# Maximum number of live sessions; the least recently used one is dropped beyond this
+MAX_SESSIONS = 1000
+
+# Seconds of inactivity after which a session is forgotten
+IDLE_TIMEOUT = 1800
+
+# Turns waiting for the summarizer are capped so a slow model cannot grow memory
+MAX_PENDING_TURNS = 16
+
+
+# Function to estimate the number of tokens in text
+def estimate_tokens(text):
+    """Rough token count (about four characters per token plus message overhead)"""
+    return len(text) // 4 + 4
+
+
+class Session:
+    """History of one conversation: recent turns plus a summary of everything older"""
+
+    def __init__(self):
+        self.turns = deque()
+        self.tokens = 0
+        self.summary = ""
+        self.pending = deque()
+        self.summarizing = False
+        self.last_used = time.monotonic()
+        self.lock = threading.Lock()
+
+
+class ConversationMemory:
+    """Per-session chat history trimmed to a token budget, with older turns summarized in the background"""
+
+    def __init__(self, summarize, token_budget=TOKEN_BUDGET, summary_budget=SUMMARY_TOKEN_BUDGET,
+                 max_sessions=MAX_SESSIONS, idle_timeout=IDLE_TIMEOUT):
+        self.summarize = summarize
+        self.token_budget = token_budget
+        self.summary_budget = summary_budget
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.sessions = OrderedDict()
+        self.lock = threading.Lock()
+        self.summarizer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="summarizer")
+        self.evicted = 0
+
+    def has_history(self, session_id):
+        """Check whether a session has any earlier turns"""
+        session = self._get(session_id, create=False)
+        if session is None:
+            return False
+        with session.lock:
+            return bool(session.turns or session.summary)
+
+    def build_messages(self, session_id, user_input):
+        """Return the chat messages for a new user turn: summary, recent turns, then the input"""
+        messages = []
+        session = self._get(session_id, create=False)
+        if session is not None:
+            with session.lock:
+                if session.summary:
+                    messages.append({"role": "system", "content": f"Summary of the conversation so far: {session.summary}"})
+                for user_text, assistant_text in session.turns:
+                    messages.append({"role": "user", "content": user_text})
+                    messages.append({"role": "assistant", "content": assistant_text})
+        messages.append({"role": "user", "content": user_input})
+        return messages
+
+    def add_turn(self, session_id, user_input, response):
+        """Record a finished turn and trim the session back under its token budget"""
+        if not session_id:
+            return
+        session = self._get(session_id, create=True)
+        with session.lock:
+            session.turns.append((user_input, response))
+            session.tokens += estimate_tokens(user_input) + estimate_tokens(response)
+
+            while session.tokens > self.token_budget and session.turns:
+                old = session.turns.popleft()
+                session.tokens -= estimate_tokens(old[0]) + estimate_tokens(old[1])
+                session.pending.append(old)
+                if len(session.pending) > MAX_PENDING_TURNS:
+                    session.pending.popleft()
+
+            if session.pending and not session.summarizing:
+                session.summarizing = True
+                self.summarizer.submit(contextvars.copy_context().run, self._summarize, session)
+
+    def stats(self):
+        """Return the number of live and evicted sessions"""
+        with self.lock:
+            return {'sessions': len(self.sessions), 'evicted': self.evicted}
+
+    def _get(self, session_id, create):
+        if not session_id:
+            return None
+        now = time.monotonic()
+        with self.lock:
+            # Sessions are kept in order of last use, so idle ones are at the front
+            while self.sessions:
+                oldest = next(iter(self.sessions.values()))
+                if now - oldest.last_used < self.idle_timeout and len(self.sessions) <= self.max_sessions:
+                    break
+                self.sessions.popitem(last=False)
+                self.evicted += 1
+
+            session = self.sessions.get(session_id)
+            if session is None:
+                if not create:
+                    return None
+                session = Session()
+                self.sessions[session_id] = session
+                if len(self.sessions) > self.max_sessions:
+                    self.sessions.popitem(last=False)
+                    self.evicted += 1
+            else:
+                self.sessions.move_to_end(session_id)
+            session.last_used = now
+            return session
+
+    def _summarize(self, session):
+        # Runs on the summarizer thread; the model call happens outside the session lock
+        while True:
+            with session.lock:
+                if not session.pending:
+                    session.summarizing = False
+                    return
+                turns = list(session.pending)
+                session.pending.clear()
+                summary = session.summary
+
+            try:
+                summary = self.summarize(summary, turns)
+            except Exception as e:
+                logger.error("Error summarizing conversation: %s", e)
+
+            # Keep the summary inside its own budget
+            max_chars = self.summary_budget * 4
+            if len(summary) > max_chars:
+                summary = summary[-max_chars:]
+            with session.lock:
+                session.summary = summary
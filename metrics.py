@@ -0,0 +1,196 @@
+import bisect
+import threading
+
+# Upper bounds in seconds, from fast in-memory steps to slow model calls
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+# Function to format label pairs for the exposition format
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs += [f'{name}="{value}"' for name, value in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Registry:
+    """Holds every metric so they can be rendered together in the Prometheus text format"""
+
+    def __init__(self):
+        self.metrics = []
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        with self.lock:
+            self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Return all metrics in the Prometheus text exposition format"""
+        with self.lock:
+            metrics = list(self.metrics)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.children = {}
+        self.lock = threading.Lock()
+        if not self.labelnames:
+            self.children[()] = self._new_child()
+        registry.register(self)
+
+    def labels(self, *values):
+        """Return the series for one combination of label values"""
+        child = self.children.get(values)
+        if child is None:
+            with self.lock:
+                child = self.children.setdefault(values, self._new_child())
+        return child
+
+    def _series(self):
+        with self.lock:
+            return sorted(self.children.items())
+
+
+class _CounterChild:
+    def __init__(self):
+        self.value = 0.0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    """Monotonically increasing count, e.g. of requests or cache hits"""
+
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self.children[()].inc(amount)
+
+    def samples(self):
+        return [f"{self.name}{_labels(self.labelnames, values)} {_number(child.value)}"
+                for values, child in self._series()]
+
+
+class _HistogramChild:
+    # Recording is a bisect and two additions under a per-series lock, cheap enough for every request
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        # One count per bucket plus +Inf; made cumulative only when rendered
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.bounds, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+
+
+class Histogram(_Metric):
+    """Distribution of durations in seconds"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS, registry=REGISTRY):
+        self.bounds = tuple(sorted(buckets))
+        super().__init__(name, help, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.bounds)
+
+    def observe(self, value):
+        self.children[()].observe(value)
+
+    def samples(self):
+        lines = []
+        for values, child in self._series():
+            with child.lock:
+                counts = list(child.counts)
+                total = child.sum
+            cumulative = 0
+            for bound, count in zip(self.bounds + (float('inf'),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float('inf') else _number(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, values, [('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, values)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, values)} {cumulative}")
+        return lines
+
+
+class Gauge(_Metric):
+    """Current value read from a callback when metrics are scraped, e.g. a queue depth"""
+
+    kind = 'gauge'
+
+    def __init__(self, name, help, read, registry=REGISTRY):
+        self.read = read
+        super().__init__(name, help, (), registry)
+
+    def _new_child(self):
+        return None
+
+    def samples(self):
+        try:
+            value = self.read()
+        except Exception:
+            return []
+        return [f"{self.name} {_number(value)}"]
+
+
+# Speech-to-text stages: decode (reading the upload), vad (silence trimming) and recognize
+STT_SECONDS = Histogram('lisa_stt_seconds', "Time spent in each speech-to-text stage", ['stage'])
+STT_FAILURES = Counter('lisa_stt_failures_total', "Speech-to-text requests that did not produce a transcript", ['reason'])
+
+# Model calls: waiting for an admission slot, time to first token and whole generation
+LLM_QUEUE_SECONDS = Histogram('lisa_llm_queue_seconds', "Time requests waited for a model slot")
+LLM_FIRST_TOKEN_SECONDS = Histogram('lisa_llm_first_token_seconds', "Time from sending a prompt to the first token")
+LLM_TOTAL_SECONDS = Histogram('lisa_llm_total_seconds', "Time from sending a prompt to the end of the answer")
+LLM_ERRORS = Counter('lisa_llm_errors_total', "Model calls that failed")
+
+# Ollama host pool: calls moved to another host and hosts taken out of rotation
+LLM_RETRIES = Counter('lisa_llm_retries_total', "Model calls retried on another host")
+LLM_EJECTIONS = Counter('lisa_llm_host_ejections_total', "Times a host was taken out of rotation", ['host'])
+
+# Log records dropped because the writer thread fell behind
+LOG_RECORDS_DROPPED = Counter('lisa_log_records_dropped_total', "Log records dropped because the log queue was full")
+
+# Conversation turns dropped because the transcript writer fell behind
+TRANSCRIPT_TURNS_DROPPED = Counter('lisa_transcript_turns_dropped_total',
+                                   "Conversation turns not stored because the transcript buffer was full")
+
+# Where answers came from: intent (canned), cache (semantic cache) or model
+RESPONSES = Counter('lisa_responses_total', "Answers by source", ['source'])
+
+# Text-to-speech: time queued behind other utterances and time in the engine
+TTS_QUEUE_SECONDS = Histogram('lisa_tts_queue_seconds', "Time utterances waited in the text-to-speech queue", ['kind'])
+TTS_SYNTHESIS_SECONDS = Histogram('lisa_tts_synthesis_seconds', "Time the engine spent speaking or rendering", ['kind'])
@@ -0,0 +1,112 @@
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# How long Ollama keeps the model loaded after each request
+KEEP_ALIVE = "30m"
+
+# Seconds between checks that the model is still loaded
+CHECK_INTERVAL = 30.0
+
+# Seconds to wait before retrying a failed warm-up
+RETRY_DELAY = 5.0
+
+
+# Function to parse a keep-alive setting
+def parse_keep_alive(value):
+    """Return a duration string such as "30m" unchanged and plain numbers (e.g. -1 for forever) as numbers"""
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+# Function to compare Ollama model names
+def full_model_name(name):
+    """Add the implicit ":latest" tag so "llama3.2" matches what Ollama reports"""
+    return name if ':' in name else f"{name}:latest"
+
+
+class ModelWarmer:
+    """Loads the chat model before traffic arrives, reloads it if Ollama unloads it, and reports readiness"""
+
+    def __init__(self, warm, is_loaded, check_interval=CHECK_INTERVAL, retry_delay=RETRY_DELAY):
+        self.warm = warm
+        self.is_loaded = is_loaded
+        self.check_interval = check_interval
+        self.retry_delay = retry_delay
+        self.ready = threading.Event()
+        self.stopped = threading.Event()
+        self.lock = threading.Lock()
+        self.thread = None
+
+        # Metrics
+        self.warmups = 0
+        self.failures = 0
+        self.unloads = 0
+        self.last_warm_ms = None
+        self.last_error = None
+
+    def start(self):
+        """Start warming in the background if it is not already running"""
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="model-warmer", daemon=True)
+                self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def status(self):
+        """Return readiness and warm-up metrics"""
+        with self.lock:
+            return {
+                'ready': self.ready.is_set(),
+                'warmups': self.warmups,
+                'failures': self.failures,
+                'unloads': self.unloads,
+                'last_warm_ms': round(self.last_warm_ms, 1) if self.last_warm_ms is not None else None,
+                'last_error': self.last_error,
+            }
+
+    def _warm_once(self):
+        start = time.perf_counter()
+        try:
+            self.warm()
+        except Exception as e:
+            logger.warning("Model warm-up failed: %s", e)
+            with self.lock:
+                self.failures += 1
+                self.last_error = str(e)
+            return False
+        elapsed = (time.perf_counter() - start) * 1000
+        with self.lock:
+            self.warmups += 1
+            self.last_warm_ms = elapsed
+            self.last_error = None
+        self.ready.set()
+        logger.info("Model warm after %.0f ms", elapsed)
+        return True
+
+    def _run(self):
+        while not self.stopped.is_set():
+            if not self.ready.is_set() and not self._warm_once():
+                self.stopped.wait(self.retry_delay)
+                continue
+
+            self.stopped.wait(self.check_interval)
+            try:
+                loaded = self.is_loaded()
+            except Exception as e:
+                logger.warning("Could not check whether the model is loaded: %s", e)
+                with self.lock:
+                    self.last_error = str(e)
+                loaded = False
+            if not loaded:
+                # Stop taking traffic until the model is back in memory
+                logger.warning("Model is no longer loaded, warming it up again")
+                with self.lock:
+                    self.unloads += 1
+                self.ready.clear()
@@ -0,0 +1,321 @@
+import itertools
+import threading
+import time
+import logging
+
+from metrics import LLM_RETRIES, LLM_EJECTIONS
+
+logger = logging.getLogger(__name__)
+
+# Other hosts a failed call is retried on
+RETRIES = 2
+
+# Seconds allowed to open a connection; a host that is down fails fast
+CONNECT_TIMEOUT = 2.0
+
+# Seconds allowed between bytes once connected; generation can pause while the model loads
+READ_TIMEOUT = 120.0
+
+# Idle connections kept open to each host, and for how long
+KEEPALIVE_CONNECTIONS = 8
+KEEPALIVE_EXPIRY = 60.0
+
+# Consecutive failures after which a host is taken out of rotation
+EJECT_AFTER_FAILURES = 3
+
+# Seconds an ejected host stays out before a health check may bring it back
+EJECT_SECONDS = 30.0
+
+# A host is ejected as slow when its smoothed time to first token is this many times the fastest
+# host's, and at least SLOW_FLOOR seconds, over at least SLOW_MIN_SAMPLES streamed answers.
+# Whole call() durations are left out: a long summary says nothing about the host being slow
+SLOW_FACTOR = 3.0
+SLOW_FLOOR = 1.0
+SLOW_MIN_SAMPLES = 5
+
+# Weight of the newest latency sample in the smoothed average
+LATENCY_SMOOTHING = 0.2
+
+# Seconds between background health checks
+HEALTH_INTERVAL = 10.0
+
+
+# Function to decide whether another host might succeed where this one failed
+def is_host_error(e):
+    """True for connection problems, timeouts, server errors and a model missing from that host"""
+    import httpx
+    import ollama
+    if isinstance(e, ollama.ResponseError):
+        return e.status_code >= 500 or e.status_code == 404
+    return isinstance(e, (OSError, httpx.TransportError))
+
+
+class OllamaHost:
+    """One Ollama server; its clients are created on first use and keep their connections open"""
+
+    def __init__(self, url, connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT,
+                 keepalive_connections=KEEPALIVE_CONNECTIONS):
+        self.url = url
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.keepalive_connections = keepalive_connections
+        self.lock = threading.Lock()
+        self.client = None
+        self.async_client = None
+
+        # Routing state, guarded by the pool's lock
+        self.outstanding = 0
+        self.latency = None
+        self.consecutive_failures = 0
+        self.ejected = False
+        self.ejected_until = 0.0
+
+        # Metrics
+        self.requests = 0
+        self.successes = 0
+        self.failures = 0
+        self.ejections = 0
+
+    def _client_options(self):
+        import httpx
+        return {
+            'timeout': httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+            'limits': httpx.Limits(max_keepalive_connections=self.keepalive_connections,
+                                   keepalive_expiry=KEEPALIVE_EXPIRY),
+        }
+
+    def get_client(self):
+        """Return the blocking client for this host"""
+        with self.lock:
+            if self.client is None:
+                import ollama
+                self.client = ollama.Client(host=self.url, **self._client_options())
+            return self.client
+
+    def get_async_client(self):
+        """Return the asyncio client for this host"""
+        with self.lock:
+            if self.async_client is None:
+                import ollama
+                self.async_client = ollama.AsyncClient(host=self.url, **self._client_options())
+            return self.async_client
+
+
+class OllamaPool:
+    """Sends each model call to the healthy host with the fewest calls in flight, retrying host failures elsewhere"""
+
+    def __init__(self, urls, retries=RETRIES, health_interval=HEALTH_INTERVAL, **host_options):
+        self.hosts = [OllamaHost(url, **host_options) for url in urls]
+        self.retries = min(retries, len(self.hosts) - 1)
+        self.health_interval = health_interval
+        self.lock = threading.Lock()
+        self.rotation = itertools.count()
+        self.stopped = threading.Event()
+        self.thread = None
+        self.retried = 0
+
+    def start(self):
+        """Start background health checks; a single host has nowhere else to send traffic, so needs none"""
+        with self.lock:
+            if self.thread is None and len(self.hosts) > 1:
+                self.thread = threading.Thread(target=self._check_health, name="ollama-health", daemon=True)
+                self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def call(self, request):
+        """Return request(client) run on the least busy host; host failures are retried on another one"""
+        tried = []
+        while True:
+            host = self._acquire(tried)
+            try:
+                result = request(host.get_client())
+            except Exception as e:
+                self._release(host, None, e)
+                if not self._should_retry(host, tried, e):
+                    raise
+                continue
+            self._release(host, None, None)
+            return result
+
+    def stream(self, request):
+        """Yield the chunks of request(client); a host that fails before the first chunk is retried elsewhere"""
+        tried = []
+        while True:
+            host = self._acquire(tried)
+            start = time.perf_counter()
+            first_chunk = None
+            error = None
+            try:
+                for chunk in request(host.get_client()):
+                    if first_chunk is None:
+                        first_chunk = time.perf_counter() - start
+                    yield chunk
+                return
+            except Exception as e:
+                error = e
+                # Once part of the answer has been sent, starting again elsewhere would repeat it
+                if first_chunk is not None or not self._should_retry(host, tried, e):
+                    raise
+            finally:
+                self._release(host, first_chunk, error)
+
+    async def acall(self, request):
+        """Async version of call(); request gets an ollama.AsyncClient and returns an awaitable"""
+        tried = []
+        while True:
+            host = self._acquire(tried)
+            try:
+                result = await request(host.get_async_client())
+            except Exception as e:
+                self._release(host, None, e)
+                if not self._should_retry(host, tried, e):
+                    raise
+                continue
+            self._release(host, None, None)
+            return result
+
+    async def astream(self, request):
+        """Async version of stream(); request gets an ollama.AsyncClient and returns an awaitable async iterator"""
+        tried = []
+        while True:
+            host = self._acquire(tried)
+            start = time.perf_counter()
+            first_chunk = None
+            error = None
+            try:
+                async for chunk in await request(host.get_async_client()):
+                    if first_chunk is None:
+                        first_chunk = time.perf_counter() - start
+                    yield chunk
+                return
+            except Exception as e:
+                error = e
+                if first_chunk is not None or not self._should_retry(host, tried, e):
+                    raise
+            finally:
+                self._release(host, first_chunk, error)
+
+    def broadcast(self, request):
+        """Run request(client) on every host in rotation; return the results, raising only if all failed"""
+        with self.lock:
+            targets = [host for host in self.hosts if not host.ejected]
+            # With every host ejected, try the one due back first, as _acquire does, rather than nothing
+            if not targets:
+                targets = [min(self.hosts, key=lambda host: host.ejected_until)]
+        results = []
+        error = None
+        for host in targets:
+            try:
+                results.append(request(host.get_client()))
+            except Exception as e:
+                logger.warning("Ollama host %s failed: %s", host.url, e)
+                error = e
+        if not results and error is not None:
+            raise error
+        return results
+
+    def stats(self):
+        """Return routing state and per-host metrics"""
+        now = time.monotonic()
+        with self.lock:
+            return {
+                'retries': self.retried,
+                'hosts': [{
+                    'url': host.url,
+                    'healthy': not host.ejected,
+                    'ejected_for_s': round(max(0.0, host.ejected_until - now), 1) if host.ejected else 0.0,
+                    'outstanding': host.outstanding,
+                    'requests': host.requests,
+                    'failures': host.failures,
+                    'ejections': host.ejections,
+                    'latency_ms': round(host.latency * 1000, 1) if host.latency is not None else None,
+                } for host in self.hosts],
+            }
+
+    def _acquire(self, exclude):
+        with self.lock:
+            candidates = [host for host in self.hosts if host not in exclude]
+            healthy = [host for host in candidates if not host.ejected]
+            # With every host ejected, keep trying the one due back first rather than failing outright
+            choices = healthy or [min(candidates, key=lambda host: host.ejected_until)]
+            # Rotate the tie-break so idle hosts share the load evenly
+            offset = next(self.rotation)
+            host = min(choices, key=lambda host: (host.outstanding, (self.hosts.index(host) - offset) % len(self.hosts)))
+            host.outstanding += 1
+            host.requests += 1
+            return host
+
+    def _release(self, host, latency, error):
+        with self.lock:
+            host.outstanding -= 1
+            if error is not None and not is_host_error(error):
+                # A bad request fails on any host, so it says nothing about this one's health
+                return
+            if error is not None:
+                host.failures += 1
+                host.consecutive_failures += 1
+                if not host.ejected and host.consecutive_failures >= EJECT_AFTER_FAILURES:
+                    self._eject(host, f"{host.consecutive_failures} failures in a row")
+                return
+            host.consecutive_failures = 0
+            if host.ejected:
+                # It answered while everything else was down
+                self._readmit(host)
+            if latency is not None:
+                host.successes += 1
+                host.latency = latency if host.latency is None else \
+                    (1 - LATENCY_SMOOTHING) * host.latency + LATENCY_SMOOTHING * latency
+                self._check_slow(host)
+
+    def _should_retry(self, host, tried, e):
+        tried.append(host)
+        if not is_host_error(e) or len(tried) > self.retries:
+            return False
+        with self.lock:
+            self.retried += 1
+        LLM_RETRIES.inc()
+        logger.warning("Ollama host %s failed (%s), retrying on another host", host.url, e)
+        return True
+
+    def _check_slow(self, host):
+        if host.successes < SLOW_MIN_SAMPLES:
+            return
+        others = [other.latency for other in self.hosts
+                  if other is not host and not other.ejected and other.latency is not None]
+        if others and host.latency > max(SLOW_FLOOR, SLOW_FACTOR * min(others)):
+            self._eject(host, f"smoothed latency {host.latency * 1000:.0f} ms vs {min(others) * 1000:.0f} ms")
+
+    def _eject(self, host, reason):
+        host.ejected = True
+        host.ejected_until = time.monotonic() + EJECT_SECONDS
+        host.ejections += 1
+        LLM_EJECTIONS.labels(host.url).inc()
+        logger.warning("Ejected Ollama host %s: %s", host.url, reason)
+
+    def _readmit(self, host):
+        host.ejected = False
+        host.consecutive_failures = 0
+        # Start from a clean slate so one old slow spell does not eject it again at once
+        host.latency = None
+        host.successes = 0
+        logger.info("Ollama host %s is back in rotation", host.url)
+
+    def _check_health(self):
+        while not self.stopped.wait(self.health_interval):
+            for host in self.hosts:
+                if host.ejected and time.monotonic() < host.ejected_until:
+                    continue
+                try:
+                    host.get_client().ps()
+                except Exception as e:
+                    with self.lock:
+                        if host.ejected:
+                            host.ejected_until = time.monotonic() + EJECT_SECONDS
+                        else:
+                            self._eject(host, f"health check failed: {e}")
+                    continue
+                with self.lock:
+                    if host.ejected:
+                        self._readmit(host)
@@ -0,0 +1,231 @@
+import abc
+import json
+import os
+import threading
+import time
+import logging
+import speech_recognition as sr
+
+logger = logging.getLogger(__name__)
+
+# Sample format every offline engine is fed
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2
+
+# Used only to read audio files; record() keeps no state between calls
+_reader = sr.Recognizer()
+
+
+# Function to read an audio file into speech_recognition's AudioData
+def read_audio(audio_file):
+    """Load a WAV/AIFF/FLAC path or file-like object"""
+    with sr.AudioFile(audio_file) as source:
+        return _reader.record(source)
+
+
+class StreamingSession:
+    """Incremental recognition of one utterance fed as 16 kHz, 16-bit mono PCM chunks.
+
+    The generic version decodes the last PARTIAL_WINDOW seconds every
+    PARTIAL_INTERVAL seconds of new audio, so each interim transcript costs the
+    same however long the utterance gets. Backends without interim_results only
+    decode once, in finish(); engines with native incremental decoding override it.
+    """
+
+    PARTIAL_INTERVAL = 1.0
+    PARTIAL_WINDOW = 6.0
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.buffer = bytearray()
+        self.decoded_bytes = 0
+
+    def accept(self, pcm):
+        """Add audio and return an updated interim transcript, or None if there is nothing new"""
+        self.buffer.extend(pcm)
+        if not self.backend.interim_results:
+            return None
+        if len(self.buffer) - self.decoded_bytes < self.PARTIAL_INTERVAL * SAMPLE_RATE * SAMPLE_WIDTH:
+            return None
+        self.decoded_bytes = len(self.buffer)
+        window = int(self.PARTIAL_WINDOW * SAMPLE_RATE) * SAMPLE_WIDTH
+        try:
+            text = self.backend.transcribe(sr.AudioData(bytes(self.buffer[-window:]), SAMPLE_RATE, SAMPLE_WIDTH))
+        except sr.UnknownValueError:
+            return None
+        # Only the end of a long utterance was decoded
+        return "... " + text if len(self.buffer) > window else text
+
+    def finish(self):
+        """Return the final transcript, raising sr.UnknownValueError if nothing was said"""
+        return self.backend.recognize(sr.AudioData(bytes(self.buffer), SAMPLE_RATE, SAMPLE_WIDTH))
+
+
+class RecognizerBackend(abc.ABC):
+    """Base class for speech recognition engines; subclasses load their model once in load()"""
+
+    name = None
+
+    # Whether streaming sessions decode interim transcripts while audio arrives
+    interim_results = True
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.failures = 0
+        self.time_total = 0.0
+        self.time_max = 0.0
+
+    def load(self):
+        """Load models or check dependencies; called once at process start"""
+
+    @abc.abstractmethod
+    def transcribe(self, audio_data):
+        """Return the text in audio_data, raising sr.UnknownValueError if there is none"""
+
+    def create_session(self):
+        """Return a StreamingSession for one utterance"""
+        return StreamingSession(self)
+
+    def recognize(self, audio_data):
+        """Transcribe while recording per-request latency"""
+        start = time.perf_counter()
+        try:
+            return self.transcribe(audio_data)
+        except Exception:
+            with self.lock:
+                self.failures += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                self.calls += 1
+                self.time_total += elapsed
+                self.time_max = max(self.time_max, elapsed)
+            logger.info("%s recognition took %.0f ms", self.name, elapsed * 1000)
+
+    def stats(self):
+        """Return call counts and recognition latency"""
+        with self.lock:
+            return {
+                'backend': self.name,
+                'calls': self.calls,
+                'failures': self.failures,
+                'latency_avg_ms': round(self.time_total / self.calls * 1000, 1) if self.calls else 0.0,
+                'latency_max_ms': round(self.time_max * 1000, 1),
+            }
+
+
+class GoogleBackend(RecognizerBackend):
+    """Google Web Speech API (needs network access)"""
+
+    name = 'google'
+
+    # Every decode is a network request, so a stream is only sent once it has ended
+    interim_results = False
+
+    def load(self):
+        self.recognizer = sr.Recognizer()
+
+    def transcribe(self, audio_data):
+        return self.recognizer.recognize_google(audio_data)
+
+
+class SphinxBackend(RecognizerBackend):
+    """Offline CMU PocketSphinx with its decoder created once"""
+
+    name = 'sphinx'
+
+    def load(self):
+        from pocketsphinx import Decoder
+        # recognize_sphinx() builds a new decoder (and reloads the model) on every call
+        self.decoder = Decoder(samprate=SAMPLE_RATE)
+
+    def transcribe(self, audio_data):
+        raw = audio_data.get_raw_data(convert_rate=SAMPLE_RATE, convert_width=SAMPLE_WIDTH)
+        # The decoder is stateful, so utterances are decoded one at a time
+        with self.lock:
+            self.decoder.start_utt()
+            self.decoder.process_raw(raw, full_utt=True)
+            self.decoder.end_utt()
+            hypothesis = self.decoder.hyp()
+        if hypothesis is None or not hypothesis.hypstr:
+            raise sr.UnknownValueError()
+        return hypothesis.hypstr
+
+
+class VoskBackend(RecognizerBackend):
+    """Offline Vosk (Kaldi) with the model loaded once and shared by all requests"""
+
+    name = 'vosk'
+
+    def __init__(self, model_path=None):
+        super().__init__()
+        self.model_path = model_path or os.environ.get("LISA_VOSK_MODEL", "models/vosk")
+
+    def load(self):
+        import vosk
+        vosk.SetLogLevel(-1)
+        self.vosk = vosk
+        self.model = vosk.Model(self.model_path)
+
+    def create_session(self):
+        return VoskStreamingSession(self)
+
+    def transcribe(self, audio_data):
+        raw = audio_data.get_raw_data(convert_rate=SAMPLE_RATE, convert_width=SAMPLE_WIDTH)
+        # The model is thread-safe; the per-utterance recognizer is cheap to create
+        recognizer = self.vosk.KaldiRecognizer(self.model, SAMPLE_RATE)
+        recognizer.AcceptWaveform(raw)
+        text = json.loads(recognizer.FinalResult()).get('text', '')
+        if not text:
+            raise sr.UnknownValueError()
+        return text
+
+
+class VoskStreamingSession(StreamingSession):
+    """Native incremental decoding with Vosk partial results"""
+
+    def __init__(self, backend):
+        super().__init__(backend)
+        self.recognizer = backend.vosk.KaldiRecognizer(backend.model, SAMPLE_RATE)
+        self.segments = []
+        self.start = time.perf_counter()
+
+    def accept(self, pcm):
+        if self.recognizer.AcceptWaveform(bytes(pcm)):
+            # Vosk found a pause; keep the finished segment and start a new one
+            text = json.loads(self.recognizer.Result()).get('text', '')
+            if text:
+                self.segments.append(text)
+            return " ".join(self.segments) or None
+        partial = json.loads(self.recognizer.PartialResult()).get('partial', '')
+        return " ".join(self.segments + [partial]).strip() or None
+
+    def finish(self):
+        text = json.loads(self.recognizer.FinalResult()).get('text', '')
+        if text:
+            self.segments.append(text)
+        elapsed = time.perf_counter() - self.start
+        with self.backend.lock:
+            self.backend.calls += 1
+            self.backend.time_total += elapsed
+            self.backend.time_max = max(self.backend.time_max, elapsed)
+        if not self.segments:
+            raise sr.UnknownValueError()
+        return " ".join(self.segments)
+
+
+BACKENDS = {backend.name: backend for backend in (GoogleBackend, SphinxBackend, VoskBackend)}
+
+
+# Function to create and load the configured recognizer backend
+def load_backend(name):
+    """Instantiate a backend by name and load its model"""
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown speech recognition backend '{name}', choose one of {sorted(BACKENDS)}")
+    backend = BACKENDS[name]()
+    start = time.perf_counter()
+    backend.load()
+    logger.info("Loaded %s speech recognition backend in %.0f ms", name, (time.perf_counter() - start) * 1000)
+    return backend
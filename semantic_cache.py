@@ -0,0 +1,130 @@
+import threading
+import time
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Minimum cosine similarity for a cached answer to be reused
+SIMILARITY_THRESHOLD = 0.92
+
+# Seconds a cached answer stays valid
+CACHE_TTL = 3600
+
+# Maximum number of cached answers
+MAX_ENTRIES = 1024
+
+
+class SemanticCache:
+    """Answer cache keyed by prompt embeddings, searched with one matrix-vector product"""
+
+    def __init__(self, embed, threshold=SIMILARITY_THRESHOLD, ttl=CACHE_TTL, max_entries=MAX_ENTRIES):
+        self.embed = embed
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+
+        # Rows are unit vectors, so a dot product is the cosine similarity.
+        # The matrix is allocated once the embedding size is known.
+        self.vectors = None
+        self.responses = [None] * max_entries
+        self.stored_at = np.zeros(max_entries)
+        self.valid = np.zeros(max_entries, dtype=bool)
+
+        # Metrics
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.embed_time_total = 0.0
+        self.search_time_total = 0.0
+
+    def lookup(self, prompt):
+        """Return (cached response or None, prompt vector) for a prompt"""
+        start = time.perf_counter()
+        embedding = self.embed(prompt)
+        return self.lookup_embedding(embedding, time.perf_counter() - start)
+
+    def lookup_embedding(self, embedding, embed_time=0.0):
+        """Like lookup(), for an embedding the caller computed itself (e.g. with an async client)"""
+        vector = self._normalize(embedding)
+        start = time.perf_counter()
+        with self.lock:
+            self.embed_time_total += embed_time
+            response = self._search(vector)
+            self.search_time_total += time.perf_counter() - start
+            if response is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return response, vector
+
+    def store(self, vector, response):
+        """Cache a response under the vector returned by lookup()"""
+        with self.lock:
+            if self.vectors is None:
+                self.vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+            elif vector.shape[0] != self.vectors.shape[1]:
+                logger.warning("Embedding size changed, clearing semantic cache")
+                self.vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+                self.valid[:] = False
+
+            free = np.flatnonzero(~self.valid)
+            if free.size:
+                slot = free[0]
+            else:
+                # Replace the oldest entry
+                slot = int(np.argmin(self.stored_at))
+                self.evictions += 1
+
+            self.vectors[slot] = vector
+            self.responses[slot] = response
+            self.stored_at[slot] = time.time()
+            self.valid[slot] = True
+
+    def clear(self):
+        """Drop every cached response"""
+        with self.lock:
+            self.valid[:] = False
+            self.responses = [None] * self.max_entries
+
+    def stats(self):
+        """Return hit rate and lookup latency metrics"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': int(self.valid.sum()),
+                'max_entries': self.max_entries,
+                'threshold': self.threshold,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'expired': self.expired,
+                'evictions': self.evictions,
+                'embed_time_avg_ms': round(self.embed_time_total / lookups * 1000, 2) if lookups else 0.0,
+                'search_time_avg_ms': round(self.search_time_total / lookups * 1000, 3) if lookups else 0.0,
+            }
+
+    def _search(self, vector):
+        # Must be called with the lock held
+        if self.vectors is None or vector.shape[0] != self.vectors.shape[1]:
+            return None
+
+        stale = self.valid & (self.stored_at < time.time() - self.ttl)
+        if stale.any():
+            self.expired += int(stale.sum())
+            self.valid &= ~stale
+
+        similarities = self.vectors @ vector
+        similarities[~self.valid] = -1.0
+        best = int(np.argmax(similarities))
+        if similarities[best] >= self.threshold:
+            return self.responses[best]
+        return None
+
+    @staticmethod
+    def _normalize(embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
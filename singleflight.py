@@ -0,0 +1,183 @@
+import asyncio
+import contextvars
+import json
+import re
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+WHITESPACE = re.compile(r"\s+")
+
+
+# Function to build the coalescing key for a model request
+def request_key(model, messages):
+    """Key a chat request by model and normalized messages, so trivially different prompts coalesce"""
+    normalized = [(m['role'], WHITESPACE.sub(" ", m['content']).strip().lower()) for m in messages]
+    return model + "\0" + json.dumps(normalized)
+
+
+class Flight:
+    """One upstream generation that any number of identical requests are reading"""
+
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.condition = threading.Condition()
+
+
+class SingleFlight:
+    """Share one upstream call between concurrent identical requests"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.flights = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    def stream(self, key, generate, admit=None):
+        """Return (iterator over the shared chunks, True if this call started the generation).
+
+        Only a call that starts a generation calls admit(), which returns a ticket or
+        raises; the flight holds the ticket until the upstream call has finished, so
+        followers and disconnected clients never change how many generations run.
+        """
+        ticket = None
+        if admit is not None:
+            with self.lock:
+                running = key in self.flights
+            if not running:
+                ticket = admit()
+
+        with self.lock:
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = Flight()
+                self.flights[key] = flight
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+
+        if not leader and ticket is not None:
+            # The same generation started while this call waited for a slot
+            ticket.release()
+        if leader:
+            # The upstream is drained on its own thread so a disconnecting client
+            # cannot stall everyone else waiting on the same answer
+            # Log lines from the generation carry the leader's request id
+            threading.Thread(target=contextvars.copy_context().run, args=(self._pump, key, flight, generate, ticket),
+                             daemon=True).start()
+        return self._follow(flight), leader
+
+    def stats(self):
+        """Return in-flight and coalesced request counts"""
+        with self.lock:
+            return {'in_flight': len(self.flights), 'leaders': self.leaders, 'coalesced': self.coalesced}
+
+    def _pump(self, key, flight, generate, ticket):
+        try:
+            for chunk in generate():
+                with flight.condition:
+                    flight.chunks.append(chunk)
+                    flight.condition.notify_all()
+        except Exception as e:
+            flight.error = e
+        finally:
+            if ticket is not None:
+                ticket.release()
+            with self.lock:
+                self.flights.pop(key, None)
+            with flight.condition:
+                flight.done = True
+                flight.condition.notify_all()
+
+    def _follow(self, flight):
+        index = 0
+        while True:
+            with flight.condition:
+                while index >= len(flight.chunks) and not flight.done:
+                    flight.condition.wait()
+                chunks = flight.chunks[index:]
+                finished = flight.done
+            index += len(chunks)
+            yield from chunks
+            if finished and index >= len(flight.chunks):
+                if flight.error is not None:
+                    raise flight.error
+                return
+
+
+class AsyncFlight:
+    """One upstream async generation shared by identical requests on the same event loop"""
+
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.changed = asyncio.Event()
+
+
+class AsyncSingleFlight:
+    """asyncio counterpart of SingleFlight for the ASGI app"""
+
+    def __init__(self):
+        self.flights = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def stream(self, key, generate, admit=None):
+        """Return (async iterator over the shared chunks, True if this call started the generation).
+
+        admit is an async callable with the same role as in SingleFlight.stream().
+        """
+        ticket = None
+        if admit is not None and key not in self.flights:
+            ticket = await admit()
+        flight = self.flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = AsyncFlight()
+            self.flights[key] = flight
+            self.leaders += 1
+            asyncio.get_running_loop().create_task(self._pump(key, flight, generate, ticket))
+        else:
+            self.coalesced += 1
+            if ticket is not None:
+                ticket.release()
+        return self._follow(flight), leader
+
+    def stats(self):
+        """Return in-flight and coalesced request counts"""
+        return {'in_flight': len(self.flights), 'leaders': self.leaders, 'coalesced': self.coalesced}
+
+    async def _pump(self, key, flight, generate, ticket):
+        try:
+            async for chunk in generate():
+                flight.chunks.append(chunk)
+                flight.changed.set()
+        except Exception as e:
+            flight.error = e
+        finally:
+            if ticket is not None:
+                ticket.release()
+            self.flights.pop(key, None)
+            flight.done = True
+            flight.changed.set()
+
+    async def _follow(self, flight):
+        index = 0
+        while True:
+            while index < len(flight.chunks):
+                yield flight.chunks[index]
+                index += 1
+            if flight.done:
+                if flight.error is not None:
+                    raise flight.error
+                return
+            flight.changed.clear()
+            # Re-check after clearing so a chunk appended in between is not missed
+            if index < len(flight.chunks) or flight.done:
+                continue
+            await flight.changed.wait()
@@ -0,0 +1,68 @@
+import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+# A sentence ends at terminal punctuation followed by whitespace, or at a line break
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+|\n+')
+
+# Fragments shorter than this are held back and joined with the next sentence
+MIN_SENTENCE_CHARS = 20
+
+
+class SentencePipeline:
+    """Cut streamed LLM text into sentences and hand each one to speak while generation continues.
+
+    speak is called on the thread that feeds the text, so it should only queue
+    the work (as TTSWorker.say and render_async do), not synthesize.
+    """
+
+    def __init__(self, speak, min_chars=MIN_SENTENCE_CHARS):
+        self.speak = speak
+        self.min_chars = min_chars
+        self.buffer = ""
+        # Short fragments (e.g. "Sure." or "1.") waiting to be joined with the next sentence
+        self.pending = ""
+        self.closed = False
+
+    def feed(self, text):
+        """Add generated text and hand over every sentence that is now complete"""
+        self.buffer += text
+        while True:
+            match = SENTENCE_BOUNDARY.search(self.buffer)
+            if not match:
+                break
+            sentence = self.buffer[:match.start()].strip()
+            self.buffer = self.buffer[match.end():]
+            if not sentence:
+                continue
+            self.pending = f"{self.pending} {sentence}".strip()
+            if len(self.pending) >= self.min_chars:
+                self._emit(self.pending)
+                self.pending = ""
+
+    def close(self):
+        """Hand over whatever text is left"""
+        if self.closed:
+            return
+        self.closed = True
+        remainder = f"{self.pending} {self.buffer.strip()}".strip()
+        self.pending = ""
+        self.buffer = ""
+        if remainder:
+            self._emit(remainder)
+
+    def run(self, tokens):
+        """Pass tokens through unchanged while feeding them to the speaker"""
+        try:
+            for token in tokens:
+                self.feed(token)
+                yield token
+        finally:
+            self.close()
+
+    def _emit(self, sentence):
+        try:
+            self.speak(sentence)
+        except Exception as e:
+            logger.error("Error speaking sentence: %s", e)
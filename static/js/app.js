@@ -1,25 +1,129 @@
 // Initialize speech recognition
 let recognition;
 let listeningActive = false;
+let serverStream = null;
 
-// Function to add visualizer effects
-function animateVisualizer(isActive) {
-    const bars = document.querySelectorAll('.visualizer-bar');
+// Audio-level visualizer: one requestAnimationFrame loop reading a Web Audio AnalyserNode
+let visualizer = null;
+let visualizerFrame = 0;
+let visualizerToken = 0;
+const VISUALIZER_BARS = 15;
+const VISUALIZER_MIN_SCALE = 0.1;
+
+// Per-frame cost of the visualizer; read it with lisaVisualizerStats() in the console
+const visualizerStats = { frames: 0, totalMs: 0, maxMs: 0 };
+
+// Function to draw one visualizer frame from the microphone's spectrum
+function drawVisualizer() {
+    const start = performance.now();
+    const state = visualizer;
+    state.analyser.getByteFrequencyData(state.levels);
     
-    if (isActive) {
-        bars.forEach(bar => {
-            setInterval(() => {
-                const height = Math.floor(Math.random() * 40) + 5;
-                bar.style.height = `${height}px`;
-            }, 100);
-        });
-    } else {
-        bars.forEach(bar => {
-            bar.style.height = '5px';
-        });
+    for (let i = 0; i < state.bars.length; i++) {
+        const [first, last] = state.ranges[i];
+        let sum = 0;
+        for (let bin = first; bin < last; bin++) {
+            sum += state.levels[bin];
+        }
+        // Two decimals is finer than a pixel, and unchanged bars are not touched at all
+        const scale = Math.round(Math.max(VISUALIZER_MIN_SCALE, sum / (last - first) / 255) * 100) / 100;
+        if (scale !== state.scales[i]) {
+            state.scales[i] = scale;
+            state.bars[i].style.transform = `scaleY(${scale})`;
+        }
+    }
+    
+    const elapsed = performance.now() - start;
+    visualizerStats.frames++;
+    visualizerStats.totalMs += elapsed;
+    visualizerStats.maxMs = Math.max(visualizerStats.maxMs, elapsed);
+    visualizerFrame = requestAnimationFrame(drawVisualizer);
+}
+
+// Function to start the visualizer on an audio source; ownedStream is released when it stops
+function startVisualizer(audioContext, source, ownedStream) {
+    stopVisualizer();
+    const analyser = audioContext.createAnalyser();
+    analyser.fftSize = 512;
+    analyser.smoothingTimeConstant = 0.7;
+    source.connect(analyser);
+    
+    // Speech energy sits below about 4 kHz, so the bars share the bins up to there
+    const bars = Array.from(document.querySelectorAll('.visualizer-bar'));
+    const usable = Math.min(analyser.frequencyBinCount, Math.ceil(4000 / (audioContext.sampleRate / analyser.fftSize)));
+    const ranges = bars.map((bar, i) => {
+        const first = 1 + Math.floor(i * (usable - 1) / bars.length);
+        return [first, Math.max(first + 1, 1 + Math.floor((i + 1) * (usable - 1) / bars.length))];
+    });
+    
+    visualizer = {
+        audioContext: audioContext,
+        source: source,
+        analyser: analyser,
+        ownedStream: ownedStream,
+        bars: bars,
+        ranges: ranges,
+        levels: new Uint8Array(analyser.frequencyBinCount),
+        scales: bars.map(() => 0)
+    };
+    visualizerFrame = requestAnimationFrame(drawVisualizer);
+}
+
+// Function to show the microphone level while the browser's own recognizer listens
+async function startMicrophoneVisualizer() {
+    stopVisualizer();
+    const token = visualizerToken;
+    if (!navigator.mediaDevices || !window.AudioContext) {
+        return;
+    }
+    let mediaStream;
+    try {
+        mediaStream = await navigator.mediaDevices.getUserMedia({ audio: true });
+    } catch (error) {
+        console.error('Visualizer has no microphone access:', error);
+        return;
+    }
+    // Listening may have stopped while the browser asked for permission
+    if (token !== visualizerToken) {
+        mediaStream.getTracks().forEach(track => track.stop());
+        return;
+    }
+    const audioContext = new AudioContext();
+    startVisualizer(audioContext, audioContext.createMediaStreamSource(mediaStream), mediaStream);
+}
+
+// Function to stop the visualizer loop and release anything it opened
+function stopVisualizer() {
+    visualizerToken++;
+    if (visualizerFrame) {
+        cancelAnimationFrame(visualizerFrame);
+        visualizerFrame = 0;
+    }
+    if (visualizer) {
+        visualizer.source.disconnect(visualizer.analyser);
+        if (visualizer.ownedStream) {
+            visualizer.ownedStream.getTracks().forEach(track => track.stop());
+            visualizer.audioContext.close();
+        }
+        visualizer = null;
     }
+    document.querySelectorAll('.visualizer-bar').forEach(bar => {
+        bar.style.transform = '';
+    });
 }
 
+// Function to report the visualizer's frame-time cost
+function visualizerFrameStats() {
+    const frames = visualizerStats.frames;
+    return {
+        running: visualizer !== null,
+        frames: frames,
+        avgMs: frames ? Number((visualizerStats.totalMs / frames).toFixed(3)) : 0,
+        maxMs: Number(visualizerStats.maxMs.toFixed(3))
+    };
+}
+window.lisaVisualizerStats = visualizerFrameStats;
+
 // Function to add a message to the chat log
 function addMessage(text, sender) {
     const chatLog = document.getElementById('chat-log');
@@ -29,6 +133,7 @@ function addMessage(text, sender) {
     messageDiv.textContent = sender === 'user' ? `You: ${text}` : `Lisa: ${text}`;
     chatLog.appendChild(messageDiv);
     chatLog.scrollTop = chatLog.scrollHeight;
+    return messageDiv;
 }
 
 // Function to show typing indicator
@@ -50,12 +155,38 @@ function removeTypingIndicator() {
     }
 }
 
-// Function to get AI response from server
+// Function to play cached speech audio served by the backend
+function playAudio(url) {
+    if (!url) {
+        return;
+    }
+    new Audio(url).play().catch(error => {
+        console.error('Error playing audio:', error);
+    });
+}
+
+// Function to parse a single Server-Sent Event block
+function parseSSEEvent(block) {
+    let type = 'message';
+    const dataLines = [];
+    block.split('\n').forEach(line => {
+        if (line.startsWith('event:')) {
+            type = line.slice(6).trim();
+        } else if (line.startsWith('data:')) {
+            dataLines.push(line.slice(5).trim());
+        }
+    });
+    return { type: type, data: dataLines.length ? JSON.parse(dataLines.join('\n')) : null };
+}
+
+// Function to get AI response from server, rendering tokens as they stream in
 async function getAIResponse(userInput) {
     showTypingIndicator();
+    let messageDiv = null;
+    let fullText = '';
     
     try {
-        const response = await fetch('/api/response', {
+        const response = await fetch('/api/response/stream', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
@@ -63,28 +194,208 @@ async function getAIResponse(userInput) {
             body: JSON.stringify({ message: userInput }),
         });
         
+        if (response.status === 429) {
+            // The backend is at capacity; tell the user when to try again
+            const retryAfter = response.headers.get('Retry-After') || 'a few';
+            removeTypingIndicator();
+            const busyMessage = `I'm busy right now. Please try again in ${retryAfter} seconds.`;
+            addMessage(busyMessage, 'lisa');
+            return busyMessage;
+        }
+        
         if (!response.ok) {
             throw new Error(`Server responded with ${response.status}`);
         }
         
-        const data = await response.json();
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        const chatLog = document.getElementById('chat-log');
+        let buffer = '';
+        
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) {
+                break;
+            }
+            buffer += decoder.decode(value, { stream: true });
+            
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const event = parseSSEEvent(buffer.slice(0, boundary));
+                buffer = buffer.slice(boundary + 2);
+                
+                if (event.type === 'token') {
+                    fullText += event.data.token;
+                } else if (event.type === 'done') {
+                    fullText = event.data.response;
+                    playAudio(event.data.audio_url);
+                } else {
+                    continue;
+                }
+                
+                if (!messageDiv) {
+                    removeTypingIndicator();
+                    messageDiv = addMessage('', 'lisa');
+                }
+                messageDiv.textContent = `Lisa: ${fullText}`;
+                chatLog.scrollTop = chatLog.scrollHeight;
+            }
+        }
+        
         removeTypingIndicator();
-        return data.response;
+        if (!messageDiv) {
+            addMessage(fullText, 'lisa');
+        }
+        return fullText;
     } catch (error) {
         console.error('Error getting AI response:', error);
         removeTypingIndicator();
-        return "I'm having trouble connecting to my backend. Please try again later.";
+        const fallback = "I'm having trouble connecting to my backend. Please try again later.";
+        if (messageDiv) {
+            messageDiv.textContent = `Lisa: ${fullText} ${fallback}`;
+        } else {
+            addMessage(fallback, 'lisa');
+        }
+        return fallback;
     }
 }
 
+// Function to handle a finished transcript; returns false if the conversation was stopped
+async function handleTranscript(text) {
+    addMessage(text, "user");
+    document.getElementById('status').textContent = "Processing...";
+    
+    if (text.toLowerCase().includes("stop")) {
+        stopConversation();
+        return false;
+    }
+    
+    await getAIResponse(text);
+    return true;
+}
+
+// Function to convert Web Audio samples to 16-bit PCM
+function floatTo16BitPCM(samples) {
+    const pcm = new Int16Array(samples.length);
+    for (let i = 0; i < samples.length; i++) {
+        const sample = Math.max(-1, Math.min(1, samples[i]));
+        pcm[i] = sample < 0 ? sample * 0x8000 : sample * 0x7FFF;
+    }
+    return pcm.buffer;
+}
+
+// Function to release the microphone and socket used for server recognition
+function stopServerListening() {
+    if (!serverStream) {
+        return;
+    }
+    const stream = serverStream;
+    serverStream = null;
+    if (visualizer && visualizer.audioContext === stream.audioContext) {
+        stopVisualizer();
+    }
+    stream.processor.disconnect();
+    stream.mediaStream.getTracks().forEach(track => track.stop());
+    stream.audioContext.close();
+    if (stream.socket.readyState === WebSocket.OPEN) {
+        stream.socket.close();
+    }
+}
+
+// Function to stream microphone audio to the server and show interim transcripts
+async function startServerListening() {
+    let mediaStream;
+    try {
+        mediaStream = await navigator.mediaDevices.getUserMedia({ audio: { channelCount: 1, echoCancellation: true, noiseSuppression: true } });
+    } catch (error) {
+        console.error('Error accessing microphone:', error);
+        listeningActive = false;
+        document.getElementById('status').textContent = "Microphone access was denied.";
+        document.getElementById('speak-btn').classList.remove('pulse');
+        stopVisualizer();
+        return;
+    }
+    
+    // The server expects 16 kHz mono PCM; the browser resamples the microphone for us
+    const audioContext = new AudioContext({ sampleRate: 16000 });
+    const source = audioContext.createMediaStreamSource(mediaStream);
+    const processor = audioContext.createScriptProcessor(4096, 1, 1);
+    const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+    const socket = new WebSocket(`${protocol}//${window.location.host}/api/speech-to-text/stream`);
+    socket.binaryType = 'arraybuffer';
+    const stream = { socket: socket, audioContext: audioContext, mediaStream: mediaStream, processor: processor, finished: false };
+    serverStream = stream;
+    
+    processor.onaudioprocess = function(event) {
+        if (socket.readyState === WebSocket.OPEN) {
+            socket.send(floatTo16BitPCM(event.inputBuffer.getChannelData(0)));
+        }
+    };
+    source.connect(processor);
+    processor.connect(audioContext.destination);
+    startVisualizer(audioContext, source, null);
+    
+    socket.onopen = function() {
+        document.getElementById('status').textContent = "Listening...";
+    };
+    
+    socket.onmessage = async function(event) {
+        const message = JSON.parse(event.data);
+        if (message.partial) {
+            document.getElementById('status').textContent = `Hearing: ${message.partial}`;
+            return;
+        }
+        
+        // The server sends one final message per utterance
+        stream.finished = true;
+        stopServerListening();
+        if (message.error) {
+            document.getElementById('status').textContent = message.error;
+        } else if (!await handleTranscript(message.text)) {
+            return;
+        }
+        
+        if (listeningActive) {
+            setTimeout(() => {
+                if (listeningActive && !serverStream) {
+                    startServerListening();
+                }
+            }, 1000);
+        }
+    };
+    
+    socket.onclose = function() {
+        // Closed before a final transcript: the server is unreachable or does not support streaming
+        if (!stream.finished && serverStream === stream) {
+            stopServerListening();
+            listeningActive = false;
+            document.getElementById('status').textContent = "Server speech recognition is unavailable.";
+            document.getElementById('speak-btn').classList.remove('pulse');
+            stopVisualizer();
+        }
+    };
+}
+
 // Function to start voice recognition
 function startListening() {
-    if (!('webkitSpeechRecognition' in window) && !('SpeechRecognition' in window)) {
-        addMessage("Speech recognition is not supported in your browser.", "lisa");
+    const SpeechRecognition = window.SpeechRecognition || window.webkitSpeechRecognition;
+    const useServer = document.getElementById('server-stt-toggle').checked || !SpeechRecognition;
+    
+    if (useServer) {
+        if (!navigator.mediaDevices || !window.WebSocket) {
+            addMessage("Speech recognition is not supported in your browser.", "lisa");
+            return;
+        }
+        if (serverStream) {
+            return;
+        }
+        listeningActive = true;
+        document.getElementById('status').textContent = "Connecting...";
+        document.getElementById('speak-btn').classList.add('pulse');
+        startServerListening();
         return;
     }
     
-    const SpeechRecognition = window.SpeechRecognition || window.webkitSpeechRecognition;
     recognition = new SpeechRecognition();
     recognition.continuous = false;
     recognition.interimResults = false;
@@ -93,7 +404,7 @@ function startListening() {
     listeningActive = true;
     document.getElementById('status').textContent = "Listening...";
     document.getElementById('speak-btn').classList.add('pulse');
-    animateVisualizer(true);
+    startMicrophoneVisualizer();
     
     recognition.onstart = function() {
         document.getElementById('status').textContent = "Listening...";
@@ -101,17 +412,10 @@ function startListening() {
     
     recognition.onresult = async function(event) {
         const text = event.results[0][0].transcript;
-        addMessage(text, "user");
-        document.getElementById('status').textContent = "Processing...";
-        
-        if (text.toLowerCase().includes("stop")) {
-            stopConversation();
+        if (!await handleTranscript(text)) {
             return;
         }
         
-        const response = await getAIResponse(text);
-        addMessage(response, "lisa");
-        
         if (listeningActive) {
             document.getElementById('status').textContent = "Click the Speak button to start";
             document.getElementById('speak-btn').classList.remove('pulse');
@@ -128,7 +432,7 @@ function startListening() {
     recognition.onerror = function(event) {
         document.getElementById('status').textContent = "Error occurred in recognition: " + event.error;
         document.getElementById('speak-btn').classList.remove('pulse');
-        animateVisualizer(false);
+        stopVisualizer();
     };
     
     recognition.onend = function() {
@@ -152,10 +456,16 @@ function stopConversation() {
     if (recognition) {
         recognition.stop();
     }
+    stopServerListening();
+    
+    // Silence any speech that is still queued on the server
+    fetch('/api/tts/stop', { method: 'POST' }).catch(error => {
+        console.error('Error stopping speech:', error);
+    });
     
     document.getElementById('status').textContent = "Conversation stopped.";
     document.getElementById('speak-btn').classList.remove('pulse');
-    animateVisualizer(false);
+    stopVisualizer();
     
     addMessage("Goodbye! Conversation stopped.", "Lisa");
 }
@@ -174,8 +484,7 @@ async function handleTextSubmit() {
             return;
         }
         
-        const response = await getAIResponse(userText);
-        addMessage(response, "Lisa");
+        await getAIResponse(userText);
     }
 }
 
@@ -205,7 +514,7 @@ document.addEventListener('DOMContentLoaded', function() {
     // Create visualizer bars
     const visualizer = document.getElementById('visualizer');
     visualizer.innerHTML = '';
-    for (let i = 0; i < 15; i++) {
+    for (let i = 0; i < VISUALIZER_BARS; i++) {
         const bar = document.createElement('div');
         bar.classList.add('visualizer-bar');
         visualizer.appendChild(bar);
@@ -0,0 +1,138 @@
+import multiprocessing
+import os
+import threading
+import time
+import logging
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+import speech_recognition as sr
+
+from recognizers import load_backend
+
+logger = logging.getLogger(__name__)
+
+# Seconds a single recognition job may take
+JOB_TIMEOUT = 30.0
+
+# Jobs allowed to be queued or running per worker process
+JOBS_PER_WORKER = 4
+
+# Recognizer owned by each worker process
+_worker_backend = None
+
+
+class RecognitionBusy(Exception):
+    """Raised when the recognition job queue is full"""
+
+
+# Function run once in every worker process
+def _init_worker(backend_name):
+    """Load one copy of the model into this worker"""
+    global _worker_backend
+    _worker_backend = load_backend(backend_name)
+
+
+# Function run in a worker process for every job
+def _recognize(frame_data, sample_rate, sample_width):
+    """Transcribe raw PCM with the worker's preloaded model"""
+    return _worker_backend.recognize(sr.AudioData(frame_data, sample_rate, sample_width))
+
+
+# Function used to force workers to start
+def _ping(_):
+    return os.getpid()
+
+
+class RecognitionPool:
+    """Runs CPU-bound recognition in worker processes so uploads are not serialized by the GIL"""
+
+    def __init__(self, backend_name, workers=None, jobs_per_worker=JOBS_PER_WORKER, job_timeout=JOB_TIMEOUT):
+        self.backend_name = backend_name
+        self.workers = workers or os.cpu_count() or 1
+        self.job_timeout = job_timeout
+        self.max_pending = self.workers * jobs_per_worker
+        self.slots = threading.BoundedSemaphore(self.max_pending)
+        self.lock = threading.Lock()
+        # Spawned workers do not inherit the parent's threads or locks
+        self.executor = ProcessPoolExecutor(max_workers=self.workers,
+                                            mp_context=multiprocessing.get_context('spawn'),
+                                            initializer=_init_worker, initargs=(backend_name,))
+
+        # Metrics
+        self.pending = 0
+        self.calls = 0
+        self.failures = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.time_total = 0.0
+        self.time_max = 0.0
+
+    def preload(self):
+        """Start every worker now so the first requests do not pay for model loading"""
+        start = time.perf_counter()
+        pids = set(self.executor.map(_ping, range(self.workers * 2)))
+        logger.info("Started %d %s recognition workers in %.0f ms", len(pids), self.backend_name,
+                    (time.perf_counter() - start) * 1000)
+
+    def recognize(self, audio_data):
+        """Transcribe audio in a worker; raises RecognitionBusy, TimeoutError or sr.UnknownValueError"""
+        if not self.slots.acquire(blocking=False):
+            with self.lock:
+                self.rejected += 1
+            raise RecognitionBusy(f"{self.max_pending} recognition jobs already pending")
+
+        start = time.perf_counter()
+        with self.lock:
+            self.pending += 1
+        try:
+            # Only the raw PCM bytes cross the process boundary
+            future = self.executor.submit(_recognize, audio_data.frame_data, audio_data.sample_rate,
+                                          audio_data.sample_width)
+        except Exception:
+            self._finish()
+            raise
+        # The slot is held until the worker is really done, even if the caller gave up
+        future.add_done_callback(lambda _: self._finish())
+
+        try:
+            return future.result(timeout=self.job_timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            with self.lock:
+                self.timeouts += 1
+            raise TimeoutError(f"Speech recognition took longer than {self.job_timeout:.0f}s")
+        except sr.UnknownValueError:
+            raise
+        except Exception:
+            with self.lock:
+                self.failures += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                self.calls += 1
+                self.time_total += elapsed
+                self.time_max = max(self.time_max, elapsed)
+
+    def stats(self):
+        """Return job queue and latency metrics"""
+        with self.lock:
+            return {
+                'backend': self.backend_name,
+                'workers': self.workers,
+                'pending': self.pending,
+                'max_pending': self.max_pending,
+                'calls': self.calls,
+                'failures': self.failures,
+                'rejected': self.rejected,
+                'timeouts': self.timeouts,
+                'latency_avg_ms': round(self.time_total / self.calls * 1000, 1) if self.calls else 0.0,
+                'latency_max_ms': round(self.time_max * 1000, 1),
+            }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _finish(self):
+        with self.lock:
+            self.pending -= 1
+        self.slots.release()
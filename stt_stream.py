@@ -0,0 +1,104 @@
+import json
+import time
+import logging
+import numpy as np
+import speech_recognition as sr
+
+from recognizers import SAMPLE_RATE, SAMPLE_WIDTH
+from vad import frame_rms
+
+logger = logging.getLogger(__name__)
+
+# Chunks quieter than this RMS (16-bit samples) count as silence
+SILENCE_RMS = 500
+
+# Seconds of silence after speech that end the utterance
+END_OF_SPEECH_SILENCE = 0.8
+
+# Longest utterance accepted on one stream, in seconds
+MAX_UTTERANCE_SECONDS = 30.0
+
+
+# Function to measure the loudness of a PCM chunk
+def chunk_rms(pcm):
+    """Root mean square of 16-bit little-endian mono samples"""
+    samples = np.frombuffer(pcm, dtype='<i2')
+    if len(samples) == 0:
+        return 0.0
+    return float(frame_rms(samples, len(samples))[0])
+
+
+class EndOfSpeechDetector:
+    """Energy-based detector that fires once speech is followed by enough silence"""
+
+    def __init__(self, silence_rms=SILENCE_RMS, end_silence=END_OF_SPEECH_SILENCE):
+        self.silence_rms = silence_rms
+        self.end_silence = end_silence
+        self.heard_speech = False
+        self.silence = 0.0
+
+    def feed(self, pcm):
+        """Return True when the speaker has stopped talking"""
+        seconds = len(pcm) / (SAMPLE_RATE * SAMPLE_WIDTH)
+        if chunk_rms(pcm) >= self.silence_rms:
+            self.heard_speech = True
+            self.silence = 0.0
+        else:
+            self.silence += seconds
+        return self.heard_speech and self.silence >= self.end_silence
+
+
+class StreamingRecognition:
+    """Protocol state for one WebSocket utterance, independent of the web framework.
+
+    Clients send binary frames of 16 kHz, 16-bit mono PCM and may send the text
+    message {"event": "end"} to finish early; the server answers with
+    {"partial": ...} messages and one final {"text": ...} or {"error": ...}.
+    """
+
+    def __init__(self, backend, max_seconds=MAX_UTTERANCE_SECONDS):
+        self.session = backend.create_session()
+        self.detector = EndOfSpeechDetector()
+        self.max_bytes = int(max_seconds * SAMPLE_RATE * SAMPLE_WIDTH)
+        self.received = 0
+        self.partial = None
+        self.done = False
+        self.start = time.perf_counter()
+
+    def feed(self, message):
+        """Handle one client message and return the messages to send back"""
+        if isinstance(message, str):
+            try:
+                event = json.loads(message).get('event')
+            except (ValueError, AttributeError):
+                event = None
+            if event == 'end':
+                self.done = True
+            return []
+
+        # A stray odd byte would shift every following sample
+        pcm = message[:len(message) - len(message) % SAMPLE_WIDTH]
+        self.received += len(pcm)
+        replies = []
+        partial = self.session.accept(pcm)
+        if partial and partial != self.partial:
+            self.partial = partial
+            replies.append({'partial': partial})
+        if self.detector.feed(pcm) or self.received >= self.max_bytes:
+            self.done = True
+        return replies
+
+    def finish(self):
+        """Return the final message for the utterance"""
+        self.done = True
+        try:
+            text = self.session.finish()
+        except sr.UnknownValueError:
+            return {'error': 'Could not understand audio'}
+        except Exception as e:
+            logger.error("Error in streaming speech recognition: %s", e)
+            return {'error': str(e)}
+        audio_seconds = self.received / (SAMPLE_RATE * SAMPLE_WIDTH)
+        logger.info("Streamed %.1fs of audio, final transcript %.0f ms after the first chunk",
+                    audio_seconds, (time.perf_counter() - self.start) * 1000)
+        return {'text': text}
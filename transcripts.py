@@ -0,0 +1,241 @@
+import atexit
+import os
+import sqlite3
+import threading
+import time
+import logging
+from collections import deque
+
+from metrics import TRANSCRIPT_TURNS_DROPPED
+
+logger = logging.getLogger(__name__)
+
+# Database file the conversation transcripts are kept in
+TRANSCRIPTS_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'transcripts.db')
+
+# Turns written per transaction; one commit per turn would make the disk the bottleneck
+BATCH_SIZE = 256
+
+# Seconds a turn may wait for its batch to fill before it is written anyway
+FLUSH_INTERVAL = 1.0
+
+# Turns waiting for the writer; when full, new ones are dropped rather than blocking a request
+MAX_PENDING = 10000
+
+# Seconds allowed at shutdown to write out what is still waiting
+CLOSE_TIMEOUT = 5.0
+
+# Most rows a query returns
+QUERY_LIMIT = 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS turns (
+    id INTEGER PRIMARY KEY,
+    created REAL NOT NULL,
+    session_id TEXT,
+    request_id TEXT,
+    source TEXT NOT NULL,
+    user_text TEXT NOT NULL,
+    response TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS turns_session ON turns (session_id, created);
+CREATE INDEX IF NOT EXISTS turns_created ON turns (created);
+"""
+
+COLUMNS = ('id', 'created', 'session_id', 'request_id', 'source', 'user_text', 'response')
+
+
+class TranscriptStore:
+    """Conversation turns kept in SQLite, written in batches by a background thread.
+
+    record() only appends to an in-memory buffer, so answering a request never
+    waits for the disk. The writer thread starts on the first record(), so
+    importing the app starts no thread, and whatever is still buffered is
+    written at exit. The database runs in WAL mode, so queries read while
+    the writer commits. Each thread that queries keeps its own read-only
+    connection, and the table is created only by the first connection.
+    """
+
+    def __init__(self, path=TRANSCRIPTS_DB, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL,
+                 max_pending=MAX_PENDING):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.pending = deque()
+        self.condition = threading.Condition()
+        self.thread = None
+        self.closing = False
+        self.writing = False
+        self.flush_waiters = 0
+        self.schema_lock = threading.Lock()
+        self.schema_ready = False
+        self.readers = threading.local()
+
+        # Metrics
+        self.recorded = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+        self.write_time_total = 0.0
+        self.write_time_max = 0.0
+
+    def record(self, session_id, user_text, response, source, request_id=None):
+        """Queue one turn for writing; returns False if the buffer was full and it was dropped"""
+        row = (time.time(), session_id, request_id, source, user_text, response)
+        with self.condition:
+            if self.closing or len(self.pending) >= self.max_pending:
+                self.dropped += 1
+                TRANSCRIPT_TURNS_DROPPED.inc()
+                return False
+            self.pending.append(row)
+            self.recorded += 1
+            if self.thread is None:
+                self._start()
+            if len(self.pending) >= self.batch_size:
+                self.condition.notify_all()
+        return True
+
+    def flush(self, timeout=None):
+        """Wait until every turn recorded so far has been written; returns False on timeout"""
+        with self.condition:
+            if self.thread is None:
+                return not self.pending
+            # The writer stops waiting for a full batch while anyone is waiting here
+            self.flush_waiters += 1
+            self.condition.notify_all()
+            try:
+                return self.condition.wait_for(lambda: not self.pending and not self.writing, timeout)
+            finally:
+                self.flush_waiters -= 1
+
+    def close(self, timeout=CLOSE_TIMEOUT):
+        """Write out what is still buffered and stop the writer thread"""
+        with self.condition:
+            self.closing = True
+            thread = self.thread
+            self.condition.notify_all()
+        if thread is not None:
+            thread.join(timeout)
+            if thread.is_alive():
+                logger.warning("Transcript writer did not finish within %ss; %d turns were not written",
+                               timeout, len(self.pending))
+
+    def session(self, session_id, since=None, until=None, limit=QUERY_LIMIT):
+        """Return the latest turns of one conversation, oldest first, optionally within a time range"""
+        return self._query(["session_id = ?"], [session_id], since, until, limit)
+
+    def between(self, since=None, until=None, limit=QUERY_LIMIT):
+        """Return the latest turns of every conversation within a time range, oldest first"""
+        return self._query([], [], since, until, limit)
+
+    def stats(self):
+        """Return buffer depth, write counts and batch write latency"""
+        with self.condition:
+            return {
+                'path': self.path,
+                'pending': len(self.pending),
+                'recorded': self.recorded,
+                'written': self.written,
+                'dropped': self.dropped,
+                'failed': self.failed,
+                'batches': self.batches,
+                'batch_avg_rows': round(self.written / self.batches, 1) if self.batches else 0.0,
+                'batch_avg_ms': round(self.write_time_total / self.batches * 1000, 2) if self.batches else 0.0,
+                'batch_max_ms': round(self.write_time_max * 1000, 2),
+            }
+
+    def connect(self):
+        """Open a connection to the database; the first one creates the table and indexes if needed"""
+        connection = sqlite3.connect(self.path, timeout=10)
+        with self.schema_lock:
+            if not self.schema_ready:
+                # WAL lets readers run during a write; the mode is stored in the file, so once is enough
+                connection.execute("PRAGMA journal_mode=WAL")
+                connection.executescript(SCHEMA)
+                self.schema_ready = True
+        # NORMAL only syncs at checkpoints, which WAL keeps consistent
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def _reader(self):
+        # Opened once per querying thread and kept, so a query costs no connection setup
+        connection = getattr(self.readers, 'connection', None)
+        if connection is None:
+            connection = self.connect()
+            connection.execute("PRAGMA query_only=ON")
+            self.readers.connection = connection
+        return connection
+
+    def _start(self):
+        self.thread = threading.Thread(target=self._write_batches, name="transcript-writer", daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def _next_batch(self):
+        with self.condition:
+            while not self.pending and not self.closing:
+                self.condition.wait()
+            # Give a batch time to fill, unless it is already full or someone is waiting for it
+            deadline = time.monotonic() + self.flush_interval
+            while len(self.pending) < self.batch_size and not self.closing and not self.flush_waiters:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self.condition.wait(remaining):
+                    break
+            count = min(self.batch_size, len(self.pending))
+            self.writing = count > 0
+            return [self.pending.popleft() for _ in range(count)]
+
+    def _write_batches(self):
+        try:
+            connection = self.connect()
+        except sqlite3.Error as e:
+            logger.error("Cannot open transcript database %s: %s", self.path, e)
+            with self.condition:
+                self.failed += len(self.pending)
+                self.pending.clear()
+                self.closing = True
+                self.condition.notify_all()
+            return
+
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                break
+            start = time.perf_counter()
+            try:
+                with connection:
+                    connection.executemany("INSERT INTO turns (created, session_id, request_id, source, user_text, "
+                                           "response) VALUES (?, ?, ?, ?, ?, ?)", batch)
+                failed = 0
+            except sqlite3.Error as e:
+                logger.error("Failed to write %d transcript turns: %s", len(batch), e)
+                failed = len(batch)
+            elapsed = time.perf_counter() - start
+            with self.condition:
+                self.writing = False
+                self.failed += failed
+                self.written += len(batch) - failed
+                self.batches += 1
+                self.write_time_total += elapsed
+                self.write_time_max = max(self.write_time_max, elapsed)
+                self.condition.notify_all()
+        connection.close()
+
+    def _query(self, conditions, params, since, until, limit):
+        if since is not None:
+            conditions.append("created >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append("created < ?")
+            params.append(until)
+        # Both shapes are answered from an index: (session_id, created) or (created)
+        query = f"SELECT {', '.join(COLUMNS)} FROM turns"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        # Newest first so the limit keeps the latest turns, then put back in order
+        query += " ORDER BY created DESC, id DESC LIMIT ?"
+        params.append(limit)
+        rows = self._reader().execute(query, params).fetchall()
+        return [dict(zip(COLUMNS, row)) for row in reversed(rows)]
@@ -0,0 +1,359 @@
+import heapq
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+import logging
+from audio_cache import AudioCache, VOICE_TURN_CACHE_DIR, VOICE_TURN_CACHE_MAX_BYTES
+from metrics import TTS_QUEUE_SECONDS, TTS_SYNTHESIS_SECONDS
+from logs import request_id
+
+logger = logging.getLogger(__name__)
+
+# Utterance priorities (lower is spoken first)
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+# Maximum number of utterances waiting to be spoken
+MAX_QUEUE_SIZE = 32
+
+# Speaking rate in words per minute
+SPEECH_RATE = 170
+
+# Remembers the selected voice so later starts can skip enumerating every installed voice
+VOICE_CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.voice_cache.json')
+
+
+# Function to read the voice picked on a previous start
+def load_voice_id(path=VOICE_CACHE_FILE):
+    """Return the cached voice id for this platform, or None"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    # A cache copied from another machine names a voice that does not exist here
+    if cached.get('platform') != sys.platform:
+        return None
+    return cached.get('voice_id')
+
+
+# Function to remember the selected voice
+def save_voice_id(voice_id, path=VOICE_CACHE_FILE):
+    try:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'platform': sys.platform, 'voice_id': voice_id}, f)
+    except OSError as e:
+        logger.warning("Could not save voice cache %s: %s", path, e)
+
+
+# Function to create the pyttsx3 engine with Lisa's voice
+def init_engine(rate=SPEECH_RATE, voice_cache_file=VOICE_CACHE_FILE):
+    """Initialize the text-to-speech engine and pick a female voice"""
+    # Imported here so that loading this module does not load a speech driver
+    import pyttsx3
+    engine = pyttsx3.init()
+    engine.setProperty("rate", rate)
+
+    cached_voice = load_voice_id(voice_cache_file)
+    if cached_voice:
+        try:
+            engine.setProperty('voice', cached_voice)
+            logger.info("Using cached voice: %s", cached_voice)
+            return engine
+        except Exception as e:
+            logger.warning("Cached voice %s is unavailable: %s", cached_voice, e)
+
+    # Try to configure a female voice
+    voices = engine.getProperty('voices')
+    selected_voice = None
+
+    for voice in voices:
+        if "samantha" in voice.name.lower():
+            selected_voice = voice
+            break
+
+    if not selected_voice:
+        # Default to the first female voice if Samantha isn't found
+        for voice in voices:
+            if "female" in voice.name.lower() or "zira" in voice.name.lower():
+                selected_voice = voice
+                break
+
+    if selected_voice:
+        engine.setProperty('voice', selected_voice.id)
+        logger.info("Using voice: %s", selected_voice.name)
+    else:
+        logger.info("No female voice found, using default voice.")
+
+    save_voice_id(engine.getProperty('voice'), voice_cache_file)
+    return engine
+
+
+class RenderJob:
+    """Request to synthesize text into a cached audio file instead of speaking it"""
+
+    def __init__(self, key, cache):
+        self.key = key
+        # The cache the audio ends up in; a phrase already in the main cache is taken from there
+        self.cache = cache
+        self.done = threading.Event()
+        self.ok = False
+
+
+class TTSWorker:
+    """Single thread that owns the pyttsx3 engine and speaks queued utterances in priority order"""
+
+    def __init__(self, max_queue_size=MAX_QUEUE_SIZE, rate=SPEECH_RATE, audio_cache=None,
+                 voice_cache_file=VOICE_CACHE_FILE, voice_turn_cache=None):
+        self.max_queue_size = max_queue_size
+        self.rate = rate
+        self.audio_cache = audio_cache or AudioCache()
+        self.voice_turn_cache = voice_turn_cache or AudioCache(VOICE_TURN_CACHE_DIR, VOICE_TURN_CACHE_MAX_BYTES)
+        self.voice_cache_file = voice_cache_file
+        self.engine = None
+        # With a cached voice, audio rendered on earlier runs can be served before the engine is up
+        self.voice_id = load_voice_id(voice_cache_file)
+        self.ready = threading.Event()
+        self.failed = False
+        self.queue = []
+        self.counter = itertools.count()
+        self.condition = threading.Condition()
+        self.cancel_requested = False
+        self.speaking = False
+        self.thread = None
+
+        # Metrics
+        self.spoken = 0
+        self.rendered = 0
+        self.dropped = 0
+        self.merged = 0
+        self.cancelled = 0
+        self.errors = 0
+        self.synth_time_total = 0.0
+        self.synth_time_max = 0.0
+        self.queue_wait_total = 0.0
+
+    def start(self):
+        """Start the worker thread if it is not already running"""
+        with self.condition:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="tts-worker", daemon=True)
+                self.thread.start()
+
+    def say(self, text, priority=PRIORITY_NORMAL):
+        """Queue text to be spoken, returning False if it had to be rejected"""
+        text = text.strip()
+        if not text or self.failed:
+            return False
+
+        self.start()
+        with self.condition:
+            if len(self.queue) >= self.max_queue_size:
+                if self._merge(text, priority):
+                    return True
+                if not self._evict(priority):
+                    self.dropped += 1
+                    logger.warning("TTS queue full, rejecting utterance")
+                    return False
+            heapq.heappush(self.queue, [priority, next(self.counter), time.perf_counter(), text, None, request_id.get()])
+            self.condition.notify()
+        return True
+
+    def audio_key(self, text):
+        """Return the audio cache key for text in the engine's current voice, or None if the voice is unknown"""
+        if self.voice_id is None:
+            return None
+        return AudioCache.make_key(text, self.voice_id, self.rate)
+
+    def cached_audio(self, text):
+        """Return the cache key of already-synthesized audio for text, or None"""
+        key = self.audio_key(text)
+        if key is not None and self.audio_cache.contains(key):
+            return key
+        return None
+
+    def render(self, text, priority=PRIORITY_HIGH, timeout=None):
+        """Synthesize text into the audio cache if needed and return its key, or None on failure"""
+        job = self.render_async(text, priority)
+        if job is None:
+            return None
+        if not job.done.wait(timeout):
+            logger.warning("Timed out waiting for speech synthesis")
+            return None
+        return job.key if job.ok else None
+
+    def render_async(self, text, priority=PRIORITY_LOW, cache=None):
+        """Queue text for synthesis into cache (the main audio cache by default) without waiting for it"""
+        text = text.strip()
+        if not text or self.failed:
+            return None
+
+        # Until the engine is up the voice may be unknown, in which case the worker fills in the key
+        job = RenderJob(self.audio_key(text), cache or self.audio_cache)
+        if job.key is not None and self._use_cached(job) and job.cache.get(job.key):
+            job.ok = True
+            job.done.set()
+            return job
+
+        self.start()
+        with self.condition:
+            if len(self.queue) >= self.max_queue_size and not self._evict(priority):
+                self.dropped += 1
+                logger.warning("TTS queue full, rejecting synthesis job")
+                return None
+            heapq.heappush(self.queue, [priority, next(self.counter), time.perf_counter(), text, job, request_id.get()])
+            self.condition.notify()
+        return job
+
+    def prewarm(self, phrases):
+        """Synthesize common phrases into the audio cache in the background"""
+        for phrase in phrases:
+            self.render_async(phrase, PRIORITY_LOW)
+
+    def cancel_current(self):
+        """Stop the utterance that is being spoken right now"""
+        with self.condition:
+            if self.speaking:
+                self.cancel_requested = True
+
+    def flush(self):
+        """Drop every queued utterance and stop the current one"""
+        with self.condition:
+            # Synthesis jobs are not speech, so they survive a flush
+            spoken = [item for item in self.queue if item[4] is None]
+            self.cancelled += len(spoken)
+            self.queue = [item for item in self.queue if item[4] is not None]
+            heapq.heapify(self.queue)
+            if self.speaking:
+                self.cancel_requested = True
+
+    def stats(self):
+        """Return queue depth and synthesis timing metrics"""
+        with self.condition:
+            done = (self.spoken + self.rendered) or 1
+            return {
+                'queue_depth': len(self.queue),
+                'speaking': self.speaking,
+                'spoken': self.spoken,
+                'rendered': self.rendered,
+                'dropped': self.dropped,
+                'merged': self.merged,
+                'cancelled': self.cancelled,
+                'errors': self.errors,
+                'synth_time_avg_ms': round(self.synth_time_total / done * 1000, 1),
+                'synth_time_max_ms': round(self.synth_time_max * 1000, 1),
+                'queue_wait_avg_ms': round(self.queue_wait_total / done * 1000, 1),
+                'audio_cache': self.audio_cache.stats(),
+                'voice_turn_cache': self.voice_turn_cache.stats(),
+            }
+
+    def _use_cached(self, job):
+        """Point a job at the cache already holding its audio, if any; returns True if one does"""
+        if job.cache is not self.audio_cache and self.audio_cache.contains(job.key):
+            job.cache = self.audio_cache
+        return job.cache.contains(job.key)
+
+    def _merge(self, text, priority):
+        """Append to the newest queued utterance of the same priority; lock must be held"""
+        same = [item for item in self.queue if item[0] == priority and item[4] is None]
+        if not same:
+            return False
+        newest = max(same, key=lambda item: item[1])
+        newest[3] = f"{newest[3]} {text}"
+        self.merged += 1
+        return True
+
+    def _evict(self, priority):
+        """Drop the oldest of the least important utterances; lock must be held"""
+        victim = max(self.queue, key=lambda item: (item[0], -item[1]))
+        if victim[0] < priority:
+            return False
+        self.queue.remove(victim)
+        heapq.heapify(self.queue)
+        if victim[4] is not None:
+            victim[4].done.set()
+        self.dropped += 1
+        logger.warning("TTS queue full, dropped a stale utterance")
+        return True
+
+    def _on_word(self, name, location, length):
+        # pyttsx3 only allows stop() from inside its own callbacks
+        if self.cancel_requested:
+            self.engine.stop()
+
+    def _run(self):
+        # The engine is created on this thread and never touched by any other
+        try:
+            self.engine = init_engine(self.rate, self.voice_cache_file)
+            self.engine.connect('started-word', self._on_word)
+            self.voice_id = self.engine.getProperty('voice')
+        except Exception as e:
+            logger.error("Could not initialize text-to-speech engine: %s", e)
+            with self.condition:
+                self.failed = True
+                for item in self.queue:
+                    if item[4] is not None:
+                        item[4].done.set()
+                self.queue.clear()
+            return
+        finally:
+            self.ready.set()
+
+        while True:
+            with self.condition:
+                while not self.queue:
+                    self.condition.wait()
+                priority, _, queued_at, text, job, queued_by = heapq.heappop(self.queue)
+                self.cancel_requested = False
+                self.speaking = job is None
+                waited = time.perf_counter() - queued_at
+                self.queue_wait_total += waited
+            kind = 'speak' if job is None else 'render'
+            # Log lines about this utterance carry the id of the request that queued it
+            request_id.set(queued_by)
+            TTS_QUEUE_SECONDS.labels(kind).observe(waited)
+
+            start = time.perf_counter()
+            try:
+                if job is None:
+                    self.engine.say(text)
+                    self.engine.runAndWait()
+                else:
+                    self._synthesize(text, job)
+            except Exception as e:
+                logger.error("Error in TTS worker: %s", e)
+                with self.condition:
+                    self.errors += 1
+            finally:
+                if job is not None:
+                    job.done.set()
+            elapsed = time.perf_counter() - start
+            TTS_SYNTHESIS_SECONDS.labels(kind).observe(elapsed)
+
+            with self.condition:
+                self.speaking = False
+                if self.cancel_requested:
+                    self.cancelled += 1
+                    self.cancel_requested = False
+                if job is None:
+                    self.spoken += 1
+                else:
+                    self.rendered += 1
+                self.synth_time_total += elapsed
+                self.synth_time_max = max(self.synth_time_max, elapsed)
+
+    def _synthesize(self, text, job):
+        if job.key is None:
+            job.key = self.audio_key(text)
+        # Another job may have rendered the same text while this one was queued
+        if self._use_cached(job):
+            job.ok = True
+            return
+        temp_path = job.cache.temp_path(job.key)
+        self.engine.save_to_file(text, temp_path)
+        self.engine.runAndWait()
+        job.ok = job.cache.put(job.key, temp_path) is not None
@@ -0,0 +1,148 @@
+import threading
+import time
+import logging
+import numpy as np
+import speech_recognition as sr
+
+logger = logging.getLogger(__name__)
+
+# Length of the analysis frames, in seconds
+FRAME_SECONDS = 0.03
+
+# Frames quieter than this RMS (16-bit samples) are never speech
+MIN_SPEECH_RMS = 300
+
+# Speech must be this many times louder than the background noise
+NOISE_RATIO = 3.0
+
+# Audio kept on each side of detected speech so word edges are not clipped
+PAD_SECONDS = 0.2
+
+# Voiced stretches shorter than this are treated as clicks, not speech
+MIN_SPEECH_SECONDS = 0.1
+
+# Longest segment handed to the recognizer in one piece
+MAX_SEGMENT_SECONDS = 20.0
+
+# Audio shared by the pieces of speech too long for one segment, so a word on the cut is heard whole
+SPLIT_OVERLAP_SECONDS = 0.3
+
+
+# Function to measure the loudness of every frame at once
+def frame_rms(samples, frame_length):
+    """Return the RMS of each complete frame of an int16 sample array"""
+    count = len(samples) // frame_length
+    if count == 0:
+        return np.zeros(0)
+    frames = samples[:count * frame_length].astype(np.float32).reshape(count, frame_length)
+    return np.sqrt(np.mean(frames * frames, axis=1))
+
+
+# Function to find where speech is in a recording
+def speech_regions(samples, sample_rate, min_rms=MIN_SPEECH_RMS, noise_ratio=NOISE_RATIO,
+                   pad=PAD_SECONDS, min_speech=MIN_SPEECH_SECONDS):
+    """Return (start, end) sample offsets of the voiced stretches of an int16 sample array"""
+    frame_length = max(int(sample_rate * FRAME_SECONDS), 1)
+    rms = frame_rms(samples, frame_length)
+    if len(rms) == 0:
+        return []
+
+    # Estimate the noise floor from the quietest frames, but never set the bar
+    # above half the level of the loudest ones or continuous speech would vanish
+    threshold = max(min_rms, min(np.percentile(rms, 10) * noise_ratio, np.percentile(rms, 90) * 0.5))
+    voiced = rms >= threshold
+
+    # Drop clicks, then widen what is left by the padding, which also bridges short pauses between words
+    starts, ends = _runs(voiced)
+    speech = np.zeros(len(rms), dtype=bool)
+    for start, end in zip(starts, ends):
+        if end - start >= max(int(min_speech / FRAME_SECONDS), 1):
+            speech[start:end] = True
+    pad_frames = int(pad / FRAME_SECONDS)
+    if pad_frames:
+        speech = np.convolve(speech, np.ones(2 * pad_frames + 1), mode='same') > 0
+
+    # Speech running into the last frame keeps the partial frame after it too
+    starts, ends = _runs(speech)
+    return [(int(start) * frame_length, len(samples) if end == len(rms) else int(end) * frame_length)
+            for start, end in zip(starts, ends)]
+
+
+# Function to cut speech regions down to the segment size limit
+def split_long_regions(regions, max_samples, overlap):
+    """Return regions with any longer than max_samples cut into pieces that overlap by overlap samples"""
+    step = max(max_samples - overlap, 1)
+    pieces = []
+    for begin, end in regions:
+        while end - begin > max_samples:
+            pieces.append((begin, begin + max_samples))
+            begin += step
+        pieces.append((begin, end))
+    return pieces
+
+
+# Function to find the runs of True in a boolean array
+def _runs(mask):
+    """Return arrays of start and end (exclusive) indices"""
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+
+class SilenceTrimmer:
+    """Drops silence from recordings before recognition and splits long ones into speech segments"""
+
+    def __init__(self, max_segment_seconds=MAX_SEGMENT_SECONDS, overlap_seconds=SPLIT_OVERLAP_SECONDS):
+        self.max_segment_seconds = max_segment_seconds
+        self.overlap_seconds = overlap_seconds
+        self.lock = threading.Lock()
+
+        # Metrics
+        self.calls = 0
+        self.silent = 0
+        self.seconds_in = 0.0
+        self.seconds_kept = 0.0
+        self.time_total = 0.0
+
+    def split(self, audio_data):
+        """Return the speech in audio_data as a list of AudioData segments, empty if it is all silence"""
+        start = time.perf_counter()
+        raw = audio_data.get_raw_data(convert_width=2)
+        samples = np.frombuffer(raw, dtype='<i2')
+        rate = audio_data.sample_rate
+        regions = speech_regions(samples, rate)
+
+        # Cut speech with no pause long enough to split at, then group neighbouring
+        # regions so each segment stays under the size limit
+        max_samples = int(self.max_segment_seconds * rate)
+        groups = []
+        for region in split_long_regions(regions, max_samples, int(self.overlap_seconds * rate)):
+            if groups and region[1] - groups[-1][0][0] <= max_samples:
+                groups[-1].append(region)
+            else:
+                groups.append([region])
+        segments = [sr.AudioData(b''.join(raw[begin * 2:end * 2] for begin, end in group), rate, 2)
+                    for group in groups]
+
+        kept = sum(end - begin for begin, end in regions)
+        elapsed = time.perf_counter() - start
+        with self.lock:
+            self.calls += 1
+            self.silent += not segments
+            self.seconds_in += len(samples) / rate
+            self.seconds_kept += kept / rate
+            self.time_total += elapsed
+        logger.info("Kept %.1fs of %.1fs of audio in %d segments (%.1f ms)",
+                    kept / rate, len(samples) / rate, len(segments), elapsed * 1000)
+        return segments
+
+    def stats(self):
+        """Return how much audio was trimmed away"""
+        with self.lock:
+            return {
+                'calls': self.calls,
+                'silent_rejected': self.silent,
+                'audio_seconds_in': round(self.seconds_in, 1),
+                'audio_seconds_kept': round(self.seconds_kept, 1),
+                'saved_ratio': round(1 - self.seconds_kept / self.seconds_in, 3) if self.seconds_in else 0.0,
+                'latency_avg_ms': round(self.time_total / self.calls * 1000, 2) if self.calls else 0.0,
+            }
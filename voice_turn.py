@@ -0,0 +1,145 @@
+import queue
+import struct
+import threading
+import time
+import wave
+import logging
+
+from speech_pipeline import SentencePipeline
+from tts import PRIORITY_HIGH
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait for one sentence to be synthesized before skipping it
+RENDER_TIMEOUT = 30.0
+
+# Bytes of PCM per chunk of the response body
+CHUNK_BYTES = 16384
+
+
+# Function to build a WAV header for audio of unknown length
+def streaming_wav_header(channels, sample_width, sample_rate):
+    """Return a RIFF header with maximal sizes; players read until the connection closes"""
+    block_align = channels * sample_width
+    fmt = struct.pack('<HHIIHH', 1, channels, sample_rate, sample_rate * block_align, block_align, sample_width * 8)
+    return (b'RIFF' + struct.pack('<I', 0xFFFFFFFF) + b'WAVE' +
+            b'fmt ' + struct.pack('<I', len(fmt)) + fmt +
+            b'data' + struct.pack('<I', 0xFFFFFFFF))
+
+
+# Function to format stage durations for the Server-Timing header
+def server_timing(stages):
+    """Encode a {stage: milliseconds} dict, skipping stages that did not run"""
+    return ", ".join(f"{name};dur={ms:.1f}" for name, ms in stages.items() if ms is not None)
+
+
+class VoiceTurn:
+    """One spoken answer: sentences are synthesized as the model writes them and streamed out in order as one WAV"""
+
+    def __init__(self, tts_worker, render_timeout=RENDER_TIMEOUT):
+        self.tts_worker = tts_worker
+        self.render_timeout = render_timeout
+        # (sentence, render job) in answer order, then None once the answer is complete
+        self.jobs = queue.Queue()
+        self.pipeline = SentencePipeline(self._render)
+        self.parts = []
+        self.finished = threading.Event()
+        # Audio of the first sentence, fetched early so timing headers can be sent with it
+        self.first = None
+
+        # Stage boundaries, as perf_counter() readings
+        self.started_at = time.perf_counter()
+        self.first_sentence_at = None
+        self.first_audio_at = None
+        self.llm_done_at = None
+
+    def feed(self, token):
+        """Add generated text; every completed sentence is queued for synthesis right away"""
+        self.parts.append(token)
+        self.pipeline.feed(token)
+
+    def finish(self):
+        """Mark the answer as complete"""
+        self.pipeline.close()
+        self.llm_done_at = time.perf_counter()
+        self.jobs.put(None)
+        self.finished.set()
+
+    def run(self, tokens):
+        """Feed a whole token stream; meant to run on a producer thread"""
+        try:
+            for token in tokens:
+                self.feed(token)
+        except Exception as e:
+            logger.error("Error generating voice answer: %s", e)
+        finally:
+            self.finish()
+
+    @property
+    def response(self):
+        return ''.join(self.parts)
+
+    def first_audio(self):
+        """Block until the first sentence is synthesized; return False if no audio could be produced"""
+        if self.first_audio_at is None:
+            self.first = self._next_audio()
+            self.first_audio_at = time.perf_counter()
+        return self.first is not None
+
+    def audio(self):
+        """Yield the answer as a streaming WAV, one sentence after another"""
+        if not self.first_audio():
+            return
+        item, self.first = self.first, None
+        params = item[0]
+        yield streaming_wav_header(*params)
+        sentences = 0
+        while item is not None:
+            if item[0] == params:
+                sentences += 1
+                frames = item[1]
+                for offset in range(0, len(frames), CHUNK_BYTES):
+                    yield frames[offset:offset + CHUNK_BYTES]
+            else:
+                logger.warning("Skipping a sentence rendered as %s instead of %s", item[0], params)
+            item = self._next_audio()
+        logger.info("Voice turn streamed %d sentences in %.0f ms", sentences,
+                    (time.perf_counter() - self.started_at) * 1000)
+
+    def stages(self):
+        """Return the duration of each stage reached so far, in milliseconds"""
+        def span(start, end):
+            return (end - start) * 1000 if start is not None and end is not None else None
+        return {
+            'llm': span(self.started_at, self.first_sentence_at),
+            'tts': span(self.first_sentence_at, self.first_audio_at),
+        }
+
+    def _render(self, sentence):
+        if self.first_sentence_at is None:
+            self.first_sentence_at = time.perf_counter()
+        # The user is waiting on this audio, so it goes ahead of background renders; one-off
+        # sentences go to their own cache so they cannot evict the prewarmed phrases
+        self.jobs.put((sentence, self.tts_worker.render_async(sentence, PRIORITY_HIGH, self.tts_worker.voice_turn_cache)))
+
+    def _next_audio(self):
+        """Return ((channels, width, rate), frames) for the next sentence, or None at the end"""
+        while True:
+            item = self.jobs.get()
+            if item is None:
+                # Leave the marker for any later caller
+                self.jobs.put(None)
+                return None
+            sentence, job = item
+            if job is None or not job.done.wait(self.render_timeout) or not job.ok:
+                logger.warning("Could not synthesize sentence for voice turn: %r", sentence[:40])
+                continue
+            path = job.cache.get(job.key)
+            if path is None:
+                continue
+            try:
+                with wave.open(path, 'rb') as wav:
+                    params = (wav.getnchannels(), wav.getsampwidth(), wav.getframerate())
+                    return params, wav.readframes(wav.getnframes())
+            except (OSError, EOFError, wave.Error) as e:
+                logger.warning("Could not read synthesized audio %s: %s", path, e)